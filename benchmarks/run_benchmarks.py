@@ -0,0 +1,315 @@
+"""Throughput benchmarks for fake-vcf.
+
+Measures rows/s and MB/s of VCF generation, plain, bgzipped, BCF, Parquet and Arrow
+file output and reference import, and writes the results to a JSON file so runs can
+be compared.
+MB/s is measured on the produced data: the rendered text for generate, the written
+file for write and the fasta file for import_reference, where the rows are bases.
+
+Usage:
+    python benchmarks/run_benchmarks.py run --output results.json
+    python benchmarks/run_benchmarks.py compare baseline.json results.json
+"""
+
+from __future__ import annotations
+
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Keep progress bars out of the measurements
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import typer  # noqa: E402
+
+import fake_vcf  # noqa: E402
+from fake_vcf.vcf_faker import VirtualVCF  # noqa: E402
+from fake_vcf.vcf_generator import fake_vcf_data  # noqa: E402
+from fake_vcf.vcf_reference import import_reference  # noqa: E402
+
+app = typer.Typer(
+    name="fake-vcf-benchmarks",
+    help="Throughput benchmarks for fake-vcf.",
+    add_completion=False,
+)
+
+BENCHMARK_CHROMOSOME = "chr1"
+FASTA_LINE_WIDTH = 60
+
+# Parameter matrices, the quick matrices are for checking a change in seconds
+GENERATE_MATRIX = {
+    "num_rows": [10_000, 100_000],
+    "num_samples": [10, 100, 1000],
+    "large_format": [False, True],
+    "phased": [False, True],
+    "reference": [False, True],
+}
+QUICK_GENERATE_MATRIX = {
+    "num_rows": [10_000],
+    "num_samples": [100],
+    "large_format": [False, True],
+    "phased": [True],
+    "reference": [False, True],
+}
+WRITE_MATRIX = {
+    "num_rows": [100_000],
+    "num_samples": [100, 1000],
+    "suffix": [".vcf", ".vcf.gz", ".bcf", ".parquet", ".arrow"],
+}
+QUICK_WRITE_MATRIX = {
+    "num_rows": [10_000],
+    "num_samples": [100],
+    "suffix": [".vcf", ".vcf.gz", ".bcf", ".parquet", ".arrow"],
+}
+IMPORT_MATRIX = {
+    "sequence_length": [10_000_000],
+    "reference_format": ["bytes", "parquet"],
+}
+QUICK_IMPORT_MATRIX = {
+    "sequence_length": [1_000_000],
+    "reference_format": ["bytes", "parquet"],
+}
+
+
+def iter_params(matrix: dict):
+    """
+    Iterates over all combinations of the parameters of a matrix.
+    """
+    for values in itertools.product(*matrix.values()):
+        yield dict(zip(matrix.keys(), values))
+
+
+def best_time(benchmark, repeat: int):
+    """
+    Runs a benchmark repeat times.
+
+    Args:
+        benchmark: Function running the benchmark once and returning the nr of
+            bytes it produced.
+        repeat (int): Nr of runs.
+
+    Returns:
+        tuple[float, int]: The fastest run time in seconds and the nr of bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        num_bytes = benchmark()
+        times.append(time.perf_counter() - start_time)
+    return min(times), num_bytes
+
+
+def write_synthetic_fasta(fasta_path: Path, sequence_lengths: dict, seed=42) -> None:
+    """
+    Writes a fasta file with random bases.
+
+    Args:
+        fasta_path (Path): Path to the fasta file.
+        sequence_lengths (dict[str, int]): Length of each sequence.
+        seed (int): Random seed.
+    """
+    rng = random.Random(seed)
+    with open(fasta_path, "w") as fasta_file:
+        for sequence_id, sequence_length in sequence_lengths.items():
+            fasta_file.write(f">{sequence_id}\n")
+            for start in range(0, sequence_length, FASTA_LINE_WIDTH):
+                line_length = min(FASTA_LINE_WIDTH, sequence_length - start)
+                fasta_file.write("".join(rng.choices("ACGT", k=line_length)) + "\n")
+
+
+def benchmark_generate(params: dict, reference_dir: Path, repeat: int) -> dict:
+    """
+    Measures rendering the rows of a VirtualVCF without writing them.
+    """
+
+    def generate():
+        virtual_vcf = VirtualVCF(
+            num_rows=params["num_rows"],
+            num_samples=params["num_samples"],
+            chromosome=BENCHMARK_CHROMOSOME,
+            random_seed=42,
+            phased=params["phased"],
+            large_format=params["large_format"],
+            reference_dir=reference_dir if params["reference"] else None,
+        )
+        with virtual_vcf as v_vcf:
+            return sum(len(block) for block in v_vcf.blocks(encoded=True))
+
+    seconds, num_bytes = best_time(generate, repeat)
+    return result("generate", params, seconds, params["num_rows"], num_bytes)
+
+
+def benchmark_write(params: dict, output_dir: Path, repeat: int) -> dict:
+    """
+    Measures writing a plain or bgzipped VCF file, a BCF file or a columnar file.
+    """
+    output_path = output_dir / f"benchmark{params['suffix']}"
+
+    def write():
+        with contextlib.redirect_stdout(None):
+            fake_vcf_data(
+                fake_vcf_path=output_path,
+                num_rows=params["num_rows"],
+                num_samples=params["num_samples"],
+                chromosome=BENCHMARK_CHROMOSOME,
+                seed=42,
+                sample_prefix="SAMPLE",
+                phased=True,
+                large_format=True,
+                reference_dir_path=None,
+            )
+        return output_path.stat().st_size
+
+    seconds, num_bytes = best_time(write, repeat)
+    output_path.unlink()
+    return result("write", params, seconds, params["num_rows"], num_bytes)
+
+
+def benchmark_import(params: dict, work_dir: Path, repeat: int) -> dict:
+    """
+    Measures importing a synthetic fasta file.
+    """
+    fasta_path = work_dir / f"synthetic_{params['sequence_length']}.fa"
+    if not fasta_path.exists():
+        write_synthetic_fasta(
+            fasta_path, {BENCHMARK_CHROMOSOME: params["sequence_length"]}
+        )
+
+    def import_fasta():
+        with contextlib.redirect_stdout(None):
+            import_reference(
+                file_path=fasta_path,
+                output_dir=work_dir / "imported",
+                reference_format=params["reference_format"],
+            )
+        return fasta_path.stat().st_size
+
+    seconds, num_bytes = best_time(import_fasta, repeat)
+    return result(
+        "import_reference", params, seconds, params["sequence_length"], num_bytes
+    )
+
+
+def result(
+    benchmark: str, params: dict, seconds: float, num_rows: int, num_bytes: int
+) -> dict:
+    """
+    Creates the result of a benchmark, for import_reference the rows are bases.
+    """
+    benchmark_result = {
+        "benchmark": benchmark,
+        "params": params,
+        "seconds": round(seconds, 6),
+        "rows_per_s": round(num_rows / seconds, 1),
+        "mb_per_s": round(num_bytes / seconds / 1e6, 3),
+    }
+    print(
+        f"{benchmark:<17} {json.dumps(params):<100} "
+        f"{benchmark_result['rows_per_s']:>14,.0f} rows/s "
+        f"{benchmark_result['mb_per_s']:>10,.1f} MB/s"
+    )
+    return benchmark_result
+
+
+def result_key(benchmark_result: dict) -> str:
+    """
+    Identifies a benchmark and its parameters across runs.
+    """
+    return f"{benchmark_result['benchmark']} {json.dumps(benchmark_result['params'], sort_keys=True)}"
+
+
+@app.command(name="run")
+def run(
+    output: Path = typer.Option(
+        Path("benchmarks/results/benchmark.json"),
+        "--output",
+        "-o",
+        help="Path to the JSON result file.",
+    ),
+    repeat: int = typer.Option(
+        3,
+        "--repeat",
+        "-n",
+        min=1,
+        help="Nr of runs per benchmark, the fastest is kept.",
+    ),
+    quick: bool = typer.Option(False, "--quick", help="Run a small set of benchmarks."),
+) -> None:
+    """
+    Runs the benchmarks and writes the results to a JSON file.
+    """
+    generate_matrix = QUICK_GENERATE_MATRIX if quick else GENERATE_MATRIX
+    write_matrix = QUICK_WRITE_MATRIX if quick else WRITE_MATRIX
+    import_matrix = QUICK_IMPORT_MATRIX if quick else IMPORT_MATRIX
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = Path(tmp_dir)
+
+        # The reference has to fit the positions of the largest benchmark
+        reference_dir = work_dir / "reference"
+        reference_fasta = work_dir / "reference.fa"
+        write_synthetic_fasta(
+            reference_fasta,
+            {BENCHMARK_CHROMOSOME: max(generate_matrix["num_rows"]) * 100},
+        )
+        with contextlib.redirect_stdout(None):
+            import_reference(file_path=reference_fasta, output_dir=reference_dir)
+
+        for params in iter_params(generate_matrix):
+            results.append(benchmark_generate(params, reference_dir, repeat))
+        for params in iter_params(write_matrix):
+            results.append(benchmark_write(params, work_dir, repeat))
+        for params in iter_params(import_matrix):
+            results.append(benchmark_import(params, work_dir, repeat))
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(
+            {
+                "fake-vcf-version": fake_vcf.version,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "repeat": repeat,
+                "results": results,
+            },
+            output_file,
+            indent=4,
+        )
+    print(f"Results written to {output}")
+
+
+@app.command(name="compare")
+def compare(
+    baseline: Path = typer.Argument(help="JSON result file of the baseline run."),
+    current: Path = typer.Argument(help="JSON result file of the current run."),
+) -> None:
+    """
+    Compares the throughput of two benchmark runs.
+    """
+    with open(baseline) as baseline_file:
+        baseline_results = {
+            result_key(r): r for r in json.load(baseline_file)["results"]
+        }
+    with open(current) as current_file:
+        current_results = json.load(current_file)["results"]
+
+    for current_result in current_results:
+        baseline_result = baseline_results.get(result_key(current_result))
+        if baseline_result is None:
+            continue
+        speedup = current_result["rows_per_s"] / baseline_result["rows_per_s"]
+        print(f"{result_key(current_result):<120} {speedup:>6.2f}x")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,14 +1,31 @@
-from typing import List
+from typing import List, Optional
 
 import time
+from contextlib import nullcontext
 from pathlib import Path
 
 import typer
 from rich.console import Console
 
 from fake_vcf import version
-from fake_vcf.vcf_generator import fake_vcf_data
-from fake_vcf.vcf_reference import import_reference
+from fake_vcf.vcf_bgzf import DEFAULT_COMPRESS_LEVEL
+from fake_vcf.vcf_metrics import (
+    DEFAULT_METRICS_INTERVAL,
+    MetricsFormat,
+    MetricsReporter,
+    ProfileMode,
+    profiled,
+)
+from fake_vcf.vcf_options import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_SAMPLES_CHUNK_SIZE,
+    DEFAULT_VARIANTS_CHUNK_SIZE,
+    FormatModel,
+    GenotypeLayout,
+    GenotypeModel,
+    IndexFormat,
+    ReferenceFormat,
+)
 
 app = typer.Typer(
     name="fake-vcf",
@@ -33,10 +50,41 @@ def version_callback(print_version: bool) -> None:
         raise typer.Exit()
 
 
+def metrics_reporter(
+    metrics_file: Optional[Path],
+    metrics_format: MetricsFormat,
+    metrics_interval: float,
+    command: str,
+    unit: str,
+) -> Optional[MetricsReporter]:
+    """
+    Creates the metrics reporter of a command if a metrics file is given.
+
+    Args:
+        metrics_file (Optional[Path]): Path to the metrics file.
+        metrics_format (MetricsFormat): Format of the metrics file.
+        metrics_interval (float): Seconds between reports.
+        command (str): Name of the command.
+        unit (str): Name of the items counted.
+
+    Returns:
+        Optional[MetricsReporter]: The reporter, None without a metrics file.
+    """
+    if metrics_file is None:
+        return None
+    return MetricsReporter(
+        metrics_file,
+        metrics_format=metrics_format,
+        command=command,
+        unit=unit,
+        interval=metrics_interval,
+    )
+
+
 @app.command(name="import-reference")
 def vcf_reference_import(
     reference_file_path: Path = typer.Argument(
-        help="Path to reference fasta file.",
+        help="Path to reference fasta file, plain or gzip/bgzip compressed.",
     ),
     reference_storage_path: Path = typer.Argument(
         help="Where to store the references.",
@@ -47,15 +95,67 @@ def vcf_reference_import(
         "-c",
         help="List of chromosomes to extract from reference, if not specified all will be imported",
     ),
+    reference_format: ReferenceFormat = typer.Option(
+        ReferenceFormat.BYTES,
+        "--reference-format",
+        help="Storage format of the imported reference. bytes is memory mapped when used, parquet is smaller on disk.",
+    ),
+    chunk_size: int = typer.Option(
+        DEFAULT_CHUNK_SIZE,
+        "--chunk-size",
+        min=1,
+        help="Nr of bytes of sequence kept in memory at a time while importing.",
+    ),
+    workers: int = typer.Option(
+        1,
+        "--workers",
+        "-w",
+        min=1,
+        help="Nr of worker processes importing chromosomes in parallel. Uses the fasta index (.fai), which is built if missing.",
+    ),
+    profile: Optional[ProfileMode] = typer.Option(
+        None,
+        "--profile",
+        help="Profile the command with cProfile (time per function, in the main thread and the writer and compression threads) or tracemalloc (memory per line, close to the peak). The top entries are printed to standard error, worker processes are not profiled.",
+    ),
+    profile_file: Optional[Path] = typer.Option(
+        None,
+        "--profile-file",
+        help="Where to write the profile, default fake-vcf-<command>.prof for cprofile, which pstats and snakeviz read, or fake-vcf-<command>.tracemalloc.txt.",
+    ),
+    metrics_file: Optional[Path] = typer.Option(
+        None,
+        "--metrics-file",
+        help="Write the progress, rates, peak RSS and stage times to this file every --metrics-interval seconds and when done.",
+    ),
+    metrics_format: MetricsFormat = typer.Option(
+        MetricsFormat.JSON,
+        "--metrics-format",
+        help="Format of the metrics file, a JSON object per line (json) or a Prometheus textfile rewritten with each report (prometheus).",
+    ),
+    metrics_interval: float = typer.Option(
+        DEFAULT_METRICS_INTERVAL,
+        "--metrics-interval",
+        min=0.01,
+        help="Seconds between the reports written to the metrics file.",
+    ),
 ) -> None:
     """
     Import reference fasta file and extract specified chromosomes if provided.
 
     Parameters:
-        reference_file_path (Path): Path to reference fasta file.
+        reference_file_path (Path): Path to reference fasta file, plain or gzip/bgzip compressed.
         reference_storage_path (Path): Where to store the references.
         included_chromosomes (Optional[List[str]], optional): List of chromosomes
             to extract from reference. If not specified, all will be imported.
+        reference_format (ReferenceFormat): Storage format of the imported reference.
+        chunk_size (int): Nr of bytes of sequence kept in memory at a time while importing.
+        workers (int): Nr of worker processes importing chromosomes in parallel.
+        profile (Optional[ProfileMode]): Profile the import.
+        profile_file (Optional[Path]): Where to write the profile.
+        metrics_file (Optional[Path]): Path to write the metrics of the import to.
+        metrics_format (MetricsFormat): Format of the metrics file.
+        metrics_interval (float): Seconds between the reports of the metrics file.
 
     Example:
         To import a reference file and extract specific chromosomes:
@@ -77,12 +177,29 @@ def vcf_reference_import(
     else:
         print(f"Importing all chromosomes from reference {reference_file_path}")
 
+    # Imported here, numpy and the readers are only needed by this command
+    from fake_vcf.vcf_reference import import_reference
+
     start_time = time.time()
-    import_reference(
-        file_path=reference_file_path,
-        output_dir=reference_storage_path,
-        include_sequences=included_chromosomes,
+    metrics = metrics_reporter(
+        metrics_file,
+        metrics_format,
+        metrics_interval,
+        command="import-reference",
+        unit="bases",
     )
+    with profiled(profile, profile_file, command="import-reference"), (
+        metrics or nullcontext()
+    ):
+        import_reference(
+            file_path=reference_file_path,
+            output_dir=reference_storage_path,
+            include_sequences=included_chromosomes,
+            reference_format=reference_format,
+            chunk_size=chunk_size,
+            workers=workers,
+            metrics=metrics,
+        )
     end_time = time.time()
 
     print(f"Reference imported in {end_time - start_time:.2f} seconds.")
@@ -94,7 +211,7 @@ def main(
         None,
         "--fake_vcf_path",
         "-o",
-        help="Path to fake vcf file. If the path ends with .gz the file will be gzipped.",
+        help="Path to fake vcf file. If the path ends with .gz the file will be bgzipped, if it ends with .bcf it will be written as BCF and if it ends with .parquet or .arrow it will be written as a columnar Parquet or Arrow IPC file and if it ends with .zarr it will be written as a VCF Zarr store.",
     ),
     num_rows: int = typer.Option(
         10, "--num_rows", "-r", help="Nr rows to generate (variants)"
@@ -102,8 +219,11 @@ def main(
     num_samples: int = typer.Option(
         10, "--num_samples", "-s", help="Nr of num_samples to generate."
     ),
-    chromosome: str = typer.Option(
-        "chr1", "--chromosome", "-c", help="chromosome default chr1"
+    chromosomes: List[str] = typer.Option(
+        ["chr1"],
+        "--chromosome",
+        "-c",
+        help="Chromosome, default chr1. Repeat to generate several chromosomes in one file, or use all for all contigs in the reference dir. The rows are split over the chromosomes by their length in the reference.",
     ),
     seed: int = typer.Option(None, "--seed", help="Random seed to use, default none."),
     sample_prefix: str = typer.Option(
@@ -129,6 +249,110 @@ def main(
         help="Path to imported refernce directory.",
         exists=True,
     ),
+    workers: int = typer.Option(
+        1,
+        "--workers",
+        "-w",
+        min=1,
+        help="Nr of worker processes, the rows are split in one contiguous shard per worker.",
+    ),
+    compress_level: int = typer.Option(
+        DEFAULT_COMPRESS_LEVEL,
+        "--compress-level",
+        min=0,
+        max=9,
+        help="Compression level used when writing bgzip files.",
+    ),
+    compress_threads: int = typer.Option(
+        1,
+        "--compress-threads",
+        min=1,
+        help="Nr of threads used to compress bgzip files.",
+    ),
+    index_format: Optional[IndexFormat] = typer.Option(
+        None,
+        "--index",
+        help="Write a tabix (tbi) or CSI (csi) index next to the bgzipped output while writing it. BCF files can only be indexed with csi.",
+    ),
+    genotype_layout: GenotypeLayout = typer.Option(
+        GenotypeLayout.LONG,
+        "--genotype-layout",
+        help="Genotype layout of Parquet and Arrow output, a GT list per variant (long) or a column per sample (wide).",
+    ),
+    variants_chunk_size: int = typer.Option(
+        DEFAULT_VARIANTS_CHUNK_SIZE,
+        "--variants-chunk-size",
+        min=1,
+        help="Nr of variants per chunk of Zarr output, each chunk of variants is generated by one worker.",
+    ),
+    samples_chunk_size: int = typer.Option(
+        DEFAULT_SAMPLES_CHUNK_SIZE,
+        "--samples-chunk-size",
+        min=1,
+        help="Nr of samples per chunk of Zarr output.",
+    ),
+    genotype_model: GenotypeModel = typer.Option(
+        GenotypeModel.ROTATION,
+        "--genotype-model",
+        help="How the genotypes are drawn, the same samples rotated for every variant (rotation) or from an allele frequency drawn per site (af), which also sets the AF, AC and AN INFO values.",
+    ),
+    format_model: FormatModel = typer.Option(
+        FormatModel.FIXED,
+        "--format-model",
+        help="How the AD, DP, GQ and PL values of large format output are generated, a few fixed values per genotype (fixed) or drawn for every sample and variant from simulated reads of its genotype (reads).",
+    ),
+    multiallelic_rate: float = typer.Option(
+        0.0,
+        "--multiallelic-rate",
+        min=0.0,
+        max=1.0,
+        help="Fraction of the sites with 2 or 3 alt alleles.",
+    ),
+    insertion_rate: float = typer.Option(
+        0.0,
+        "--insertion-rate",
+        min=0.0,
+        max=1.0,
+        help="Fraction of the sites that are insertions of up to 10 bases.",
+    ),
+    deletion_rate: float = typer.Option(
+        0.0,
+        "--deletion-rate",
+        min=0.0,
+        max=1.0,
+        help="Fraction of the sites that are deletions of up to 10 bases, the deleted bases are taken from the reference if one is given. The insertion and deletion rates can't add up to more than 1.",
+    ),
+    region: str = typer.Option(
+        None,
+        "--region",
+        help="Only write the rows in a region, ex: chr1:1000000-2000000. The rows are the same as in the whole output with the same seed.",
+    ),
+    profile: Optional[ProfileMode] = typer.Option(
+        None,
+        "--profile",
+        help="Profile the command with cProfile (time per function, in the main thread and the writer and compression threads) or tracemalloc (memory per line, close to the peak). The top entries are printed to standard error, worker processes are not profiled.",
+    ),
+    profile_file: Optional[Path] = typer.Option(
+        None,
+        "--profile-file",
+        help="Where to write the profile, default fake-vcf-<command>.prof for cprofile, which pstats and snakeviz read, or fake-vcf-<command>.tracemalloc.txt.",
+    ),
+    metrics_file: Optional[Path] = typer.Option(
+        None,
+        "--metrics-file",
+        help="Write the progress, rates, peak RSS and stage times to this file every --metrics-interval seconds and when done.",
+    ),
+    metrics_format: MetricsFormat = typer.Option(
+        MetricsFormat.JSON,
+        "--metrics-format",
+        help="Format of the metrics file, a JSON object per line (json) or a Prometheus textfile rewritten with each report (prometheus).",
+    ),
+    metrics_interval: float = typer.Option(
+        DEFAULT_METRICS_INTERVAL,
+        "--metrics-interval",
+        min=0.01,
+        help="Seconds between the reports written to the metrics file.",
+    ),
 ) -> None:
     """
     Generate fake VCF data
@@ -137,25 +361,64 @@ def main(
         fake_vcf_path (Path): Path to fake VCF file or None to write to standard output.
         num_rows (int): Number of rows.
         num_samples (int): Number of samples.
-        chromosome (str): Chromosome identifier.
+        chromosomes (List[str]): Chromosome identifiers in output order, or all.
         seed (int): Random seed for reproducibility.
         sample_prefix (str): Prefix for sample names.
         phased (bool): Simulate phased genotypes.
         large_format (bool): Write large format VCF.
         print_version (bool): Flag to print the version of the fake-vcf package.
         reference_dir (Path): Path to directory containing imported reference_data.
+        workers (int): Nr of worker processes generating the data.
+        compress_level (int): Compression level used when writing bgzip files.
+        compress_threads (int): Nr of threads used to compress bgzip files.
+        index_format (Optional[IndexFormat]): Index the bgzipped output while writing it.
+        genotype_layout (GenotypeLayout): Genotype layout of Parquet and Arrow output.
+        variants_chunk_size (int): Nr of variants per chunk of Zarr output.
+        samples_chunk_size (int): Nr of samples per chunk of Zarr output.
+        genotype_model (GenotypeModel): How the genotypes are drawn.
+        format_model (FormatModel): How the FORMAT values are generated.
+        multiallelic_rate (float): Fraction of multi-allelic sites.
+        insertion_rate (float): Fraction of insertions.
+        deletion_rate (float): Fraction of deletions.
+        region (str): Only write the rows in this region.
+        profile (Optional[ProfileMode]): Profile the generation.
+        profile_file (Optional[Path]): Where to write the profile.
+        metrics_file (Optional[Path]): Path to write the metrics of the generation to.
+        metrics_format (MetricsFormat): Format of the metrics file.
+        metrics_interval (float): Seconds between the reports of the metrics file.
     """
-    fake_vcf_data(
-        fake_vcf_path=fake_vcf_path,
-        num_rows=num_rows,
-        num_samples=num_samples,
-        chromosome=chromosome,
-        seed=seed,
-        sample_prefix=sample_prefix,
-        phased=phased,
-        large_format=large_format,
-        reference_dir_path=reference_dir,
+    # Imported here, numpy and the writers are only needed by this command
+    from fake_vcf.vcf_generator import fake_vcf_data
+
+    metrics = metrics_reporter(
+        metrics_file, metrics_format, metrics_interval, command="generate", unit="rows"
     )
+    with profiled(profile, profile_file, command="generate"), metrics or nullcontext():
+        fake_vcf_data(
+            fake_vcf_path=fake_vcf_path,
+            num_rows=num_rows,
+            num_samples=num_samples,
+            chromosome=chromosomes,
+            seed=seed,
+            sample_prefix=sample_prefix,
+            phased=phased,
+            large_format=large_format,
+            reference_dir_path=reference_dir,
+            workers=workers,
+            compress_level=compress_level,
+            compress_threads=compress_threads,
+            index_format=index_format,
+            genotype_layout=genotype_layout,
+            variants_chunk_size=variants_chunk_size,
+            samples_chunk_size=samples_chunk_size,
+            genotype_model=genotype_model,
+            multiallelic_rate=multiallelic_rate,
+            insertion_rate=insertion_rate,
+            deletion_rate=deletion_rate,
+            region=region,
+            format_model=format_model,
+            metrics=metrics,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,269 @@
+"""Columnar Parquet and Arrow IPC output of VirtualVCF rows."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from pathlib import Path
+
+import numpy as np
+
+from fake_vcf.vcf_faker import RowValues, VirtualVCF
+from fake_vcf.vcf_options import GenotypeLayout
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Output file suffixes written as columnar files and their format
+ARROW_SUFFIXES = {".parquet": "parquet", ".arrow": "arrow"}
+
+# Parquet row groups are filled up to about this many genotypes
+ROW_GROUP_GENOTYPES = 16 * 1024 * 1024
+MAX_ROW_GROUP_ROWS = 1024 * 1024
+
+
+def is_arrow_path(file_path) -> bool:
+    """
+    Checks if a file is written as Parquet or Arrow IPC based on its suffix.
+    """
+    return file_path is not None and Path(file_path).suffix in ARROW_SUFFIXES
+
+
+def allele_array(alleles) -> pa.Array:
+    """
+    Builds a string array of alleles, single base alleles straight from their bytes.
+
+    Args:
+        alleles (str or Sequence[str]): The alleles, a str has one base per allele.
+
+    Returns:
+        pa.Array: The alleles.
+    """
+    import pyarrow as pa
+
+    joined = "".join(alleles)
+    if len(joined) != len(alleles):
+        return pa.array(list(alleles), type=pa.string())
+    offsets = np.arange(len(alleles) + 1, dtype=np.int32)
+    return pa.StringArray.from_buffers(
+        len(alleles), pa.py_buffer(offsets), pa.py_buffer(joined.encode("ascii"))
+    )
+
+
+class ArrowVcfWriter:
+    """
+    Writes the rows of a VirtualVCF to a Parquet or Arrow IPC file block by block.
+
+    The genotypes are dictionary encoded and no genotype text is formatted. With
+    the rotation genotype model the sample columns of every row are a rotation of
+    the same samples, so the codes of a block are one gather from the codes of the
+    samples kept twice in a row. With the allele frequency model they are one
+    gather by the genotype codes of the rows.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        virtual_vcf: VirtualVCF,
+        layout: GenotypeLayout = GenotypeLayout.LONG,
+    ):
+        """
+        Initialize ArrowVcfWriter object.
+
+        Args:
+            file_path (str or Path): Path to the .parquet or .arrow file.
+            virtual_vcf (VirtualVCF): The VirtualVCF to write the rows of.
+            layout (GenotypeLayout): Layout of the genotypes. Defaults to LONG.
+
+        Raises:
+            ValueError: If the file suffix is not a columnar format.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.file_path = Path(file_path)
+        if self.file_path.suffix not in ARROW_SUFFIXES:
+            raise ValueError(f"Unknown columnar file suffix {self.file_path.suffix}")
+        self.layout = GenotypeLayout(layout)
+        self.chromosome = virtual_vcf.chromosome
+        self.num_samples = virtual_vcf.num_samples
+        self.sample_names = virtual_vcf.sample_names()
+
+        value_genotypes = [value.split(":")[0] for value in virtual_vcf.sample_values]
+        self.genotype_values = pa.array(sorted(set(value_genotypes)), type=pa.string())
+        genotype_codes = {
+            genotype: code
+            for code, genotype in enumerate(self.genotype_values.to_pylist())
+        }
+        genotypes = [sample.split(":")[0] for sample in virtual_vcf.available_samples]
+        self._doubled_codes = np.array(
+            [genotype_codes[genotype] for genotype in genotypes] * 2, dtype=np.int8
+        )
+        # The dictionary code of each sample value
+        self._value_codes = np.array(
+            [genotype_codes[genotype] for genotype in value_genotypes], dtype=np.int8
+        )
+
+        genotype_type = pa.dictionary(pa.int8(), pa.string())
+        fields = [
+            ("CHROM", pa.string()),
+            ("POS", pa.int64()),
+            ("ID", pa.string()),
+            ("REF", pa.string()),
+            ("ALT", pa.string()),
+            ("QUAL", pa.float32()),
+        ]
+        if self.layout == GenotypeLayout.LONG:
+            fields.append(("GT", pa.list_(genotype_type)))
+        else:
+            fields.extend((name, genotype_type) for name in self.sample_names)
+        self.schema = pa.schema(fields)
+
+        self.num_rows = 0
+        self._pending_batches = []
+        self._pending_rows = 0
+        self.row_group_rows = max(
+            1, min(MAX_ROW_GROUP_ROWS, ROW_GROUP_GENOTYPES // self.num_samples)
+        )
+        if ARROW_SUFFIXES[self.file_path.suffix] == "parquet":
+            self._ipc_writer = None
+            self._parquet_writer = pq.ParquetWriter(
+                self.file_path, self.schema, compression="zstd"
+            )
+        else:
+            self._parquet_writer = None
+            self._ipc_writer = pa.ipc.new_file(self.file_path, self.schema)
+
+    def record_batch(
+        self, row_values: RowValues, chromosome: str | None = None
+    ) -> pa.RecordBatch:
+        """
+        Builds the columns of a block of rows.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+            chromosome (str, optional): Chromosome of the rows. Defaults to the
+                chromosome of the VirtualVCF.
+
+        Returns:
+            pa.RecordBatch: The rows.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        num_rows = len(row_values.positions)
+        num_samples = self.num_samples
+        columns = [
+            pa.repeat(pa.scalar(chromosome or self.chromosome, pa.string()), num_rows),
+            pa.array(row_values.positions, type=pa.int64()),
+            pc.binary_join_element_wise(
+                "rs", pc.cast(pa.array(row_values.ids), pa.string()), ""
+            ),
+            allele_array(row_values.refs),
+            allele_array(row_values.alts),
+            pa.array(row_values.quals, type=pa.float32()),
+        ]
+
+        if row_values.genotype_codes is not None:
+            row_codes = self._value_codes[row_values.genotype_codes]
+        else:
+            # Row i has the samples from num_samples - rotation of the doubled
+            # samples
+            sample_starts = num_samples - np.asarray(row_values.rotations)
+        if self.layout == GenotypeLayout.LONG:
+            if row_values.genotype_codes is not None:
+                codes = row_codes
+            else:
+                codes = self._doubled_codes[
+                    sample_starts[:, np.newaxis] + np.arange(num_samples)
+                ]
+            genotypes = pa.DictionaryArray.from_arrays(
+                pa.array(codes.ravel()), self.genotype_values
+            )
+            offsets = np.arange(num_rows + 1, dtype=np.int32) * num_samples
+            columns.append(pa.ListArray.from_arrays(pa.array(offsets), genotypes))
+        else:
+            if row_values.genotype_codes is not None:
+                codes = np.ascontiguousarray(row_codes.T)
+            else:
+                codes = self._doubled_codes[
+                    np.arange(num_samples)[:, np.newaxis] + sample_starts
+                ]
+            columns.extend(
+                pa.DictionaryArray.from_arrays(
+                    pa.array(sample_codes), self.genotype_values
+                )
+                for sample_codes in codes
+            )
+        return pa.record_batch(columns, schema=self.schema)
+
+    def write(self, row_values: RowValues, chromosome: str | None = None) -> None:
+        """
+        Appends a block of rows to the file.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+            chromosome (str, optional): Chromosome of the rows. Defaults to the
+                chromosome of the VirtualVCF.
+        """
+        batch = self.record_batch(row_values, chromosome=chromosome)
+        self.num_rows += batch.num_rows
+        if self._ipc_writer is not None:
+            self._ipc_writer.write_batch(batch)
+            return
+        self._pending_batches.append(batch)
+        self._pending_rows += batch.num_rows
+        if self._pending_rows >= self.row_group_rows:
+            self._flush_row_group()
+
+    def _flush_row_group(self) -> None:
+        """
+        Writes the pending blocks to the Parquet file as one row group.
+        """
+        if not self._pending_batches:
+            return
+        import pyarrow as pa
+
+        self._parquet_writer.write_table(
+            pa.Table.from_batches(self._pending_batches),
+            row_group_size=self._pending_rows,
+        )
+        self._pending_batches = []
+        self._pending_rows = 0
+
+    def close(self) -> None:
+        """
+        Writes any pending rows and closes the file.
+        """
+        if self._ipc_writer is not None:
+            self._ipc_writer.close()
+        else:
+            self._flush_row_group()
+            self._parquet_writer.close()
+
+    def __enter__(self):
+        """
+        Enters the context.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exits the context and closes the file.
+        """
+        self.close()
+
+
+def arrow_blocks(virtual_vcf: VirtualVCF):
+    """
+    Iterates over the values of the row blocks of a VirtualVCF, skipping the header.
+
+    Args:
+        virtual_vcf (VirtualVCF): The VirtualVCF to iterate over.
+
+    Yields:
+        RowValues: The values of the next block.
+    """
+    for block in virtual_vcf.blocks(row_values=True):
+        if not isinstance(block, str):
+            yield block
@@ -0,0 +1,470 @@
+"""Encoding of VirtualVCF rows as BCF2.2 (binary VCF) records."""
+
+from __future__ import annotations
+
+import re
+import struct
+
+import numpy as np
+
+from fake_vcf.vcf_faker import RowValues, VirtualVCF
+
+BCF_MAGIC = b"BCF\x02\x02"
+
+# BCF2 typed value types
+BCF_INT8 = 1
+BCF_INT16 = 2
+BCF_INT32 = 3
+BCF_FLOAT = 5
+BCF_CHAR = 7
+
+# Values of each int type reserved for missing values and vector padding
+INT_TYPES = [
+    (BCF_INT8, np.dtype("<i1"), -120, 127),
+    (BCF_INT16, np.dtype("<i2"), -32760, 32767),
+    (BCF_INT32, np.dtype("<i4"), -2147483640, 2147483647),
+]
+INT_END_OF_VECTOR = {BCF_INT8: -127, BCF_INT16: -32767, BCF_INT32: -2147483647}
+# POS is stored 0-based as an int32
+BCF_MAX_POSITION = 2**31
+
+HEADER_ID_PATTERN = re.compile(r"^##(FILTER|INFO|FORMAT|contig)=<ID=([^,>]+)")
+HEADER_TYPE_PATTERN = re.compile(r"[<,]Type=([^,>]+)")
+
+
+def int_type(min_value: int, max_value: int) -> tuple:
+    """
+    Picks the smallest BCF int type that holds a range of values.
+
+    Returns:
+        tuple: The BCF type and the little endian numpy dtype.
+    """
+    for bcf_type, dtype, type_min, type_max in INT_TYPES:
+        if type_min <= min_value and max_value <= type_max:
+            return bcf_type, dtype
+    raise ValueError(f"Values {min_value}-{max_value} don't fit in a BCF int")
+
+
+def type_descriptor(bcf_type: int, count: int) -> bytes:
+    """
+    Encodes the descriptor byte of a typed value, followed by the count if it
+    doesn't fit in the descriptor.
+    """
+    if count < 15:
+        return bytes([count << 4 | bcf_type])
+    return bytes([15 << 4 | bcf_type]) + typed_ints([count])
+
+
+def typed_ints(values: list) -> bytes:
+    """
+    Encodes a typed vector of ints using the smallest int type.
+    """
+    bcf_type, dtype = int_type(min(values, default=0), max(values, default=0))
+    return (
+        type_descriptor(bcf_type, len(values)) + np.array(values, dtype=dtype).tobytes()
+    )
+
+
+def typed_string(value: str) -> bytes:
+    """
+    Encodes a typed string.
+    """
+    encoded = value.encode("utf-8")
+    return type_descriptor(BCF_CHAR, len(encoded)) + encoded
+
+
+def typed_floats(values: list) -> bytes:
+    """
+    Encodes a typed vector of floats.
+    """
+    return type_descriptor(BCF_FLOAT, len(values)) + struct.pack(
+        f"<{len(values)}f", *values
+    )
+
+
+def check_bcf_position(max_position: int) -> None:
+    """
+    Checks that positions up to max_position can be encoded in BCF records.
+
+    Args:
+        max_position (int): Max position of the records.
+
+    Raises:
+        ValueError: If max_position doesn't fit in the int32 POS of a record.
+    """
+    if max_position > BCF_MAX_POSITION:
+        raise ValueError(
+            f"Max position {max_position} is too large for BCF, which stores "
+            f"positions up to {BCF_MAX_POSITION}, use VCF output"
+        )
+
+
+def encode_genotype(genotype: str) -> list:
+    """
+    Encodes a GT value like 0|1 as BCF alleles, (allele + 1) << 1 | phased.
+    """
+    alleles = re.split(r"([|/])", genotype)
+    encoded = [(int(alleles[0]) + 1) << 1]
+    for separator, allele in zip(alleles[1::2], alleles[2::2]):
+        encoded.append((int(allele) + 1) << 1 | (separator == "|"))
+    return encoded
+
+
+def parse_header_dictionaries(header: str) -> tuple:
+    """
+    Builds the BCF string and contig dictionaries of a VCF header, in the same order
+    as htslib with PASS always first.
+
+    Args:
+        header (str): The VCF header.
+
+    Returns:
+        tuple[dict[str, int], dict[str, int], dict[str, str]]: The index of each
+            FILTER/INFO/FORMAT id, the index of each contig and the type of each
+            INFO and FORMAT id.
+    """
+    strings = {"PASS": 0}
+    contigs = {}
+    value_types = {}
+    for line in header.splitlines():
+        match = HEADER_ID_PATTERN.match(line)
+        if match is None:
+            continue
+        line_type, header_id = match.groups()
+        if line_type == "contig":
+            contigs.setdefault(header_id, len(contigs))
+            continue
+        strings.setdefault(header_id, len(strings))
+        type_match = HEADER_TYPE_PATTERN.search(line)
+        if type_match is not None:
+            value_types[f"{line_type}/{header_id}"] = type_match.group(1)
+    return strings, contigs, value_types
+
+
+class BcfEncoder:
+    """
+    Encodes the rows of a VirtualVCF as BCF records.
+
+    With the rotation genotype model the sample columns of every row are a
+    rotation of the same samples, so the encoded values of each FORMAT field are
+    kept for the samples twice in a row and the values of a row are a single slice.
+    With the allele frequency model the values of each FORMAT field are encoded per
+    sample value and the values of a block are one gather by the genotype codes.
+    The values are encoded for each nr of alleles of the sites. FORMAT values drawn
+    with the reads model are encoded per block, each field in the smallest int
+    type of the rows with the same nr of alleles.
+    """
+
+    def __init__(self, virtual_vcf: VirtualVCF):
+        """
+        Initialize BcfEncoder object.
+
+        Args:
+            virtual_vcf (VirtualVCF): The VirtualVCF to encode the rows of.
+
+        Raises:
+            ValueError: If the chromosome has no contig line in the header or the
+                positions don't fit in BCF records.
+        """
+        check_bcf_position(virtual_vcf.max_position)
+        self.num_samples = virtual_vcf.num_samples
+        self.strings, self.contigs, self.value_types = parse_header_dictionaries(
+            virtual_vcf.header
+        )
+        if virtual_vcf.chromosome not in self.contigs:
+            raise ValueError(f"No contig line for {virtual_vcf.chromosome} in header")
+        self.contig = self.contigs[virtual_vcf.chromosome]
+
+        self.header_chunks = virtual_vcf.header_chunks
+        self.phased = virtual_vcf.phased
+        self.sample_format_values = virtual_vcf.sample_format_values
+        self.filter = typed_ints([self.strings["PASS"]])
+        self.row_infos = virtual_vcf.row_infos
+
+        format_keys = virtual_vcf.format.split(":")
+        self.num_format = len(format_keys)
+        self.sample_value_offsets = virtual_vcf.sample_value_offsets
+        self.formats = {}
+        self.value_formats = {}
+        for num_alleles, samples in virtual_vcf.available_samples_by_alleles.items():
+            sample_fields = [sample.split(":") for sample in samples * 2]
+            self.formats[num_alleles] = [
+                self._encode_format(key, [fields[i] for fields in sample_fields])
+                for i, key in enumerate(format_keys)
+            ]
+            value_fields = [
+                value.split(":")
+                for value in virtual_vcf.allele_sample_values(num_alleles)
+            ]
+            self.value_formats[num_alleles] = []
+            for i, key in enumerate(format_keys):
+                key_and_type, values, value_size = self._encode_format(
+                    key, [fields[i] for fields in value_fields]
+                )
+                self.value_formats[num_alleles].append(
+                    (
+                        np.frombuffer(key_and_type, dtype=np.uint8),
+                        np.frombuffer(values, dtype=np.uint8).reshape(-1, value_size),
+                    )
+                )
+
+    def header_fragments(self):
+        """
+        Encodes the BCF magic and the header of the VirtualVCF in chunks.
+
+        The header text is generated twice, first for its size, so the sample names
+        of a wide header are never held at once.
+
+        Yields:
+            bytes: The next fragment of the encoded header.
+        """
+        header_size = sum(len(chunk.encode("utf-8")) for chunk in self.header_chunks())
+        yield BCF_MAGIC + struct.pack("<I", header_size + 1)
+        for chunk in self.header_chunks():
+            yield chunk.encode("utf-8")
+        yield b"\x00"
+
+    def encode_rows(self, row_values: RowValues) -> bytes:
+        """
+        Encodes a block of rows as BCF records.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+
+        Returns:
+            bytes: The encoded records.
+        """
+        num_samples = self.num_samples
+        contig = self.contig
+        num_rows = len(row_values.positions)
+        if row_values.num_alleles is None:
+            num_alleles = [2] * num_rows
+        else:
+            num_alleles = row_values.num_alleles.tolist()
+        # Rows with the same INFO and nr of alleles share their encoded counts and
+        # INFO, with the rotation genotype model all rows of a site type do
+        encoded_sites = {}
+        counts, site_ends = [], []
+        for info, row_num_alleles in zip(self.row_infos(row_values), num_alleles):
+            encoded_site = encoded_sites.get((info, row_num_alleles))
+            if encoded_site is None:
+                info_fields = info.split(";")
+                encoded_site = encoded_sites[(info, row_num_alleles)] = (
+                    struct.pack(
+                        "<II",
+                        row_num_alleles << 16 | len(info_fields),
+                        self.num_format << 24 | num_samples,
+                    ),
+                    self.filter
+                    + b"".join(self._encode_info(field) for field in info_fields),
+                )
+            counts.append(encoded_site[0])
+            site_ends.append(encoded_site[1])
+
+        records = []
+        for position, vid, ref, alt, qual, row_counts, site_end, individual in zip(
+            row_values.positions.tolist(),
+            row_values.ids.tolist(),
+            row_values.refs,
+            row_values.alts,
+            row_values.quals.tolist(),
+            counts,
+            site_ends,
+            self._individual_data(row_values),
+        ):
+            shared = b"".join(
+                [
+                    struct.pack("<iiif", contig, position - 1, len(ref), qual),
+                    row_counts,
+                    typed_string(f"rs{vid}"),
+                    typed_string(ref),
+                    *(typed_string(allele) for allele in alt.split(",")),
+                    site_end,
+                ]
+            )
+            records.append(
+                struct.pack("<II", len(shared), len(individual)) + shared + individual
+            )
+        return b"".join(records)
+
+    def _individual_data(self, row_values: RowValues) -> list:
+        """
+        Encodes the FORMAT fields of the samples of each row in a block.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+
+        Returns:
+            list[bytes]: The encoded FORMAT fields of each row.
+        """
+        num_samples = self.num_samples
+        num_rows = len(row_values.positions)
+        individual_data = [None] * num_rows
+        for num_alleles, offset in self.sample_value_offsets.items():
+            if row_values.num_alleles is None:
+                rows = np.arange(num_rows)
+            else:
+                rows = np.flatnonzero(row_values.num_alleles == num_alleles)
+            if not len(rows):
+                continue
+            if row_values.format_draws is not None:
+                columns = self._drawn_format_columns(row_values, rows, num_alleles)
+            elif row_values.genotype_codes is None:
+                formats = self.formats[num_alleles]
+                for row, start in zip(
+                    rows.tolist(), (num_samples - row_values.rotations[rows]).tolist()
+                ):
+                    individual_data[row] = b"".join(
+                        key_and_type
+                        + doubled_values[
+                            start * value_size : (start + num_samples) * value_size
+                        ]
+                        for key_and_type, doubled_values, value_size in formats
+                    )
+                continue
+            else:
+                codes = row_values.genotype_codes[rows] - offset
+                columns = []
+                for key_and_type, value_table in self.value_formats[num_alleles]:
+                    columns.append(
+                        np.broadcast_to(key_and_type, (len(rows), len(key_and_type)))
+                    )
+                    columns.append(value_table[codes].reshape(len(rows), -1))
+            individual = np.concatenate(columns, axis=1)
+            data = individual.tobytes()
+            row_size = individual.shape[1]
+            for row, start in zip(rows.tolist(), range(0, len(data), row_size)):
+                individual_data[row] = data[start : start + row_size]
+        return individual_data
+
+    def _drawn_format_columns(
+        self, row_values: RowValues, rows: np.ndarray, num_alleles: int
+    ) -> list:
+        """
+        Encodes the FORMAT values drawn with the reads model for rows with the same
+        nr of alleles.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+            rows (np.ndarray): Index of each row in the block.
+            num_alleles (int): Nr of alleles of the rows.
+
+        Returns:
+            list[np.ndarray]: The encoded bytes of the rows as columns of uint8,
+                the key and type of each field followed by its values.
+        """
+        alleles, format_values = self.sample_format_values(
+            row_values, rows, num_alleles
+        )
+        genotypes = (alleles.astype(np.int64) + 1) << 1
+        genotypes[..., 1] |= bool(self.phased)
+        columns = []
+        for key, values in [
+            ("GT", genotypes),
+            ("AD", format_values.allele_depths),
+            ("DP", format_values.depths[..., np.newaxis]),
+            ("GQ", format_values.genotype_qualities[..., np.newaxis]),
+            ("PL", format_values.likelihoods),
+        ]:
+            bcf_type, dtype = int_type(0, int(values.max(initial=0)))
+            key_and_type = np.frombuffer(
+                typed_ints([self.strings[key]])
+                + type_descriptor(bcf_type, values.shape[-1]),
+                dtype=np.uint8,
+            )
+            columns.append(
+                np.broadcast_to(key_and_type, (len(rows), len(key_and_type)))
+            )
+            columns.append(values.astype(dtype).view(np.uint8).reshape(len(rows), -1))
+        return columns
+
+    def _encode_info(self, field: str) -> bytes:
+        """
+        Encodes an INFO key and value.
+        """
+        key, _, value = field.partition("=")
+        key_bytes = typed_ints([self.strings[key]])
+        value_type = self.value_types.get(f"INFO/{key}", "String")
+        if value_type == "Flag":
+            return key_bytes + type_descriptor(BCF_INT8, 0)
+        if value_type == "Integer":
+            return key_bytes + typed_ints([int(v) for v in value.split(",")])
+        if value_type == "Float":
+            return key_bytes + typed_floats([float(v) for v in value.split(",")])
+        return key_bytes + typed_string(value)
+
+    def _encode_format(self, key: str, values: list) -> tuple:
+        """
+        Encodes the values of a FORMAT field for the samples twice in a row.
+
+        Args:
+            key (str): The FORMAT key.
+            values (list[str]): The value of each sample.
+
+        Returns:
+            tuple[bytes, bytes, int]: The encoded key and type descriptor, the
+                encoded values and the size of the values of one sample.
+        """
+        if key == "GT":
+            sample_values = [encode_genotype(value) for value in values]
+        elif self.value_types.get(f"FORMAT/{key}") == "Integer":
+            sample_values = [[int(v) for v in value.split(",")] for value in values]
+        else:
+            raise ValueError(f"FORMAT field {key} can't be encoded in BCF")
+
+        count = max(len(value) for value in sample_values)
+        flat_values = [v for value in sample_values for v in value]
+        bcf_type, dtype = int_type(min(flat_values), max(flat_values))
+        # Shorter vectors are padded with the end of vector value
+        padded_values = np.full(
+            (len(sample_values), count), INT_END_OF_VECTOR[bcf_type], dtype=dtype
+        )
+        for i, value in enumerate(sample_values):
+            padded_values[i, : len(value)] = value
+
+        return (
+            typed_ints([self.strings[key]]) + type_descriptor(bcf_type, count),
+            padded_values.tobytes(),
+            count * dtype.itemsize,
+        )
+
+
+def bcf_fragment_blocks(virtual_vcf: VirtualVCF):
+    """
+    Iterates over the VCF data of a VirtualVCF encoded as BCF, each block of up to
+    block_size rows as an iterator of byte fragments.
+
+    The header is yielded as the first block if the VirtualVCF includes it, in
+    chunks of sample names. The blocks are uncompressed and have to be written in
+    BGZF blocks.
+
+    Args:
+        virtual_vcf (VirtualVCF): The VirtualVCF to encode.
+
+    Yields:
+        Iterator[bytes]: The fragments of the next block.
+    """
+    encoder = BcfEncoder(virtual_vcf)
+    for block in virtual_vcf.blocks(row_values=True, header_chunks=True):
+        if isinstance(block, RowValues):
+            yield iter([encoder.encode_rows(block)])
+        else:
+            yield encoder.header_fragments()
+
+
+def bcf_blocks(virtual_vcf: VirtualVCF):
+    """
+    Iterates over the VCF data of a VirtualVCF encoded as BCF, in blocks of up to
+    block_size rows.
+
+    The header is yielded as the first block if the VirtualVCF includes it. The
+    blocks are uncompressed and have to be written in BGZF blocks.
+
+    Args:
+        virtual_vcf (VirtualVCF): The VirtualVCF to encode.
+
+    Yields:
+        bytes: The next block.
+    """
+    for fragments in bcf_fragment_blocks(virtual_vcf):
+        yield b"".join(fragments)
@@ -0,0 +1,569 @@
+"""Reading and writing of BGZF (blocked gzip) files, as used by bgzip and tabix."""
+
+from __future__ import annotations
+
+import bisect
+import struct
+import time
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# bgzip never puts more than this many uncompressed bytes in one block, which makes
+# sure that a block always fits in 64 KiB even when it can't be compressed.
+MAX_BLOCK_DATA_SIZE = 0xFF00
+MAX_BLOCK_SIZE = 0x10000
+BLOCK_HEADER_SIZE = 18
+BLOCK_FOOTER_SIZE = 8
+
+DEFAULT_COMPRESS_LEVEL = 6
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Empty BGZF block that marks the end of a bgzip file
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def compress_block(data: bytes, compress_level: int = DEFAULT_COMPRESS_LEVEL) -> bytes:
+    """
+    Compresses data into a single BGZF block.
+
+    Args:
+        data (bytes): Uncompressed data, at most MAX_BLOCK_DATA_SIZE bytes.
+        compress_level (int): zlib compression level 0-9.
+
+    Returns:
+        bytes: The BGZF block.
+    """
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+    compressed_data = compressor.compress(data) + compressor.flush()
+    block_size = BLOCK_HEADER_SIZE + len(compressed_data) + BLOCK_FOOTER_SIZE
+    if block_size > MAX_BLOCK_SIZE:
+        # Incompressible data, store it as it is
+        return compress_block(data, compress_level=0)
+
+    header = struct.pack(
+        "<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, block_size - 1
+    )
+    footer = struct.pack("<2I", zlib.crc32(data), len(data))
+    return header + compressed_data + footer
+
+
+def _timed_compress_block(data: bytes, compress_level: int) -> tuple:
+    """
+    Compresses data into a single BGZF block and times the compression.
+
+    Returns:
+        tuple[bytes, float]: The BGZF block and the seconds it took.
+    """
+    start = time.perf_counter()
+    block = compress_block(data, compress_level)
+    return block, time.perf_counter() - start
+
+
+class BgzfBlockOffsets:
+    """
+    The compressed and uncompressed offsets of the blocks of a BGZF file, for
+    converting offsets in the uncompressed data to BGZF virtual offsets.
+    """
+
+    def __init__(self):
+        """
+        Initialize BgzfBlockOffsets object.
+        """
+        self.compressed_starts = array("Q")
+        self.uncompressed_starts = array("Q")
+        self.compressed_size = 0
+        self.uncompressed_size = 0
+
+    def add_block(self, compressed_size: int, uncompressed_size: int) -> None:
+        """
+        Adds the next block, empty blocks are left out.
+        """
+        if uncompressed_size == 0:
+            self.compressed_size += compressed_size
+            return
+        self.compressed_starts.append(self.compressed_size)
+        self.uncompressed_starts.append(self.uncompressed_size)
+        self.compressed_size += compressed_size
+        self.uncompressed_size += uncompressed_size
+
+    def extend(self, block_offsets: BgzfBlockOffsets) -> None:
+        """
+        Adds the blocks of a BGZF file that is appended to this one.
+        """
+        self.compressed_starts.extend(
+            offset + self.compressed_size for offset in block_offsets.compressed_starts
+        )
+        self.uncompressed_starts.extend(
+            offset + self.uncompressed_size
+            for offset in block_offsets.uncompressed_starts
+        )
+        self.compressed_size += block_offsets.compressed_size
+        self.uncompressed_size += block_offsets.uncompressed_size
+
+    def virtual_offset(self, offset: int) -> int:
+        """
+        Converts an offset in the uncompressed data to a virtual offset, the offset
+        of the block in the file shifted 16 bits left plus the offset in the block.
+
+        Args:
+            offset (int): Offset in the uncompressed data.
+
+        Returns:
+            int: The virtual offset.
+        """
+        if offset >= self.uncompressed_size:
+            return self.compressed_size << 16
+        block = bisect.bisect_right(self.uncompressed_starts, offset) - 1
+        return self.compressed_starts[block] << 16 | (
+            offset - self.uncompressed_starts[block]
+        )
+
+
+class BgzfWriter:
+    """
+    Writes BGZF files, compressing the blocks on a pool of threads.
+
+    The data is cut in blocks of MAX_BLOCK_DATA_SIZE bytes. zlib releases the GIL
+    while compressing, so the blocks are compressed in parallel and then written
+    to the file in order. The offsets of the written blocks are kept in
+    block_offsets for indexing and the time spent compressing, summed over the
+    threads, in compress_seconds.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        compress_level: int = DEFAULT_COMPRESS_LEVEL,
+        threads: int = 1,
+    ):
+        """
+        Initialize BgzfWriter object.
+
+        Args:
+            file_path (str or Path): Path to the file to write.
+            compress_level (int, optional): zlib compression level 0-9. Defaults to 6.
+            threads (int, optional): Nr of compression threads. Defaults to 1.
+
+        Raises:
+            ValueError: If compress_level is not 0-9 or threads is less than 1.
+        """
+        if not 0 <= compress_level <= 9:
+            raise ValueError("Compression level must be between 0 and 9")
+        if threads < 1:
+            raise ValueError("Nr of compression threads must be greater or equal to 1")
+
+        self.compress_level = compress_level
+        self.threads = threads
+        self._buffer = bytearray()
+        self._uncompressed_offset = 0
+        self.block_offsets = BgzfBlockOffsets()
+        self.compress_seconds = 0.0
+        self._pending_blocks = deque()
+        self._executor = ThreadPoolExecutor(threads) if threads > 1 else None
+        self._file = open(file_path, "wb")
+
+    def write(self, data: str | bytes) -> None:
+        """
+        Writes data to the file.
+
+        Args:
+            data (str or bytes): Data to write, text is written as UTF-8.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._buffer += data
+        self._uncompressed_offset += len(data)
+        if len(self._buffer) >= MAX_BLOCK_DATA_SIZE:
+            self._compress_buffer(full_blocks_only=True)
+
+    def writelines(self, fragments) -> None:
+        """
+        Writes byte fragments to the file in order.
+
+        The fragments are cut in blocks as they are buffered, so an iterator over
+        many fragments or a large fragment is never buffered at once.
+
+        Args:
+            fragments (Iterable[bytes or memoryview]): The fragments.
+        """
+        buffer = self._buffer
+        for fragment in fragments:
+            if len(fragment) > MAX_BLOCK_DATA_SIZE:
+                fragment = memoryview(fragment)
+                self.writelines(
+                    fragment[start : start + MAX_BLOCK_DATA_SIZE]
+                    for start in range(0, len(fragment), MAX_BLOCK_DATA_SIZE)
+                )
+                continue
+            buffer += fragment
+            self._uncompressed_offset += len(fragment)
+            if len(buffer) >= MAX_BLOCK_DATA_SIZE:
+                self._compress_buffer(full_blocks_only=True)
+
+    def tell(self) -> int:
+        """
+        Returns the offset in the uncompressed data of the next write.
+        """
+        return self._uncompressed_offset
+
+    def flush(self) -> None:
+        """
+        Compresses and writes all buffered data to the file.
+        """
+        self._compress_buffer(full_blocks_only=False)
+        self._write_blocks(wait=True)
+        self._file.flush()
+
+    def close(self) -> None:
+        """
+        Writes all buffered data and the BGZF end of file marker and closes the file.
+        """
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.write(BGZF_EOF)
+        self._file.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _compress_buffer(self, full_blocks_only: bool) -> None:
+        """
+        Cuts the buffered data in blocks and hands them to the compressors.
+
+        Args:
+            full_blocks_only (bool): Keep the last partial block in the buffer.
+        """
+        buffer = self._buffer
+        num_blocks = len(buffer) // MAX_BLOCK_DATA_SIZE
+        if not full_blocks_only and len(buffer) % MAX_BLOCK_DATA_SIZE:
+            num_blocks += 1
+
+        for start in range(0, num_blocks * MAX_BLOCK_DATA_SIZE, MAX_BLOCK_DATA_SIZE):
+            block_data = bytes(buffer[start : start + MAX_BLOCK_DATA_SIZE])
+            if self._executor is None:
+                self._write_block(
+                    _timed_compress_block(block_data, self.compress_level),
+                    len(block_data),
+                )
+            else:
+                self._pending_blocks.append(
+                    (
+                        self._executor.submit(
+                            _timed_compress_block, block_data, self.compress_level
+                        ),
+                        len(block_data),
+                    )
+                )
+                # Limit the nr of blocks in flight to keep the memory use bounded
+                if len(self._pending_blocks) >= 4 * self.threads:
+                    self._write_blocks(wait=False)
+
+        del buffer[: num_blocks * MAX_BLOCK_DATA_SIZE]
+
+    def _write_blocks(self, wait: bool) -> None:
+        """
+        Writes compressed blocks to the file in order.
+
+        Args:
+            wait (bool): Wait for all blocks, otherwise only the finished blocks at
+                the front of the queue and the oldest block are written.
+        """
+        pending_blocks = self._pending_blocks
+        if pending_blocks and not wait:
+            block, data_size = pending_blocks.popleft()
+            self._write_block(block.result(), data_size)
+        while pending_blocks and (wait or pending_blocks[0][0].done()):
+            block, data_size = pending_blocks.popleft()
+            self._write_block(block.result(), data_size)
+
+    def _write_block(self, compressed: tuple, data_size: int) -> None:
+        """
+        Writes a compressed block to the file.
+
+        Args:
+            compressed (tuple[bytes, float]): The compressed block and the seconds
+                the compression took.
+            data_size (int): Size of the uncompressed data of the block.
+        """
+        block, compress_seconds = compressed
+        self.compress_seconds += compress_seconds
+        self._file.write(block)
+        self.block_offsets.add_block(len(block), data_size)
+
+    def __enter__(self):
+        """
+        Enters the context.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exits the context and closes the file.
+        """
+        self.close()
+
+
+def is_gzipped(file_path) -> bool:
+    """
+    Checks if a file is gzip compressed, BGZF files are gzip files too.
+    """
+    with open(file_path, "rb") as gzip_file:
+        return gzip_file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+
+
+def _read_block_header(bgzf_file) -> tuple | None:
+    """
+    Reads the header of the BGZF block at the current position of the file.
+
+    Args:
+        bgzf_file: The BGZF file opened in binary mode.
+
+    Returns:
+        tuple[int, int] or None: The total block size and the size of the header,
+            None at the end of the file.
+
+    Raises:
+        ValueError: If the block is not a BGZF block.
+    """
+    header = bgzf_file.read(12)
+    if not header:
+        return None
+    if len(header) < 12 or header[:2] != GZIP_MAGIC or not header[3] & 4:
+        raise ValueError("Not a BGZF block")
+
+    extra_length = struct.unpack("<H", header[10:12])[0]
+    extra = bgzf_file.read(extra_length)
+    position = 0
+    while position + 4 <= len(extra):
+        subfield_id = extra[position : position + 2]
+        subfield_length = struct.unpack("<H", extra[position + 2 : position + 4])[0]
+        if subfield_id == b"BC" and subfield_length == 2:
+            block_size = struct.unpack("<H", extra[position + 4 : position + 6])[0]
+            return block_size + 1, 12 + extra_length
+        position += 4 + subfield_length
+    raise ValueError("Not a BGZF block")
+
+
+def is_bgzf(file_path) -> bool:
+    """
+    Checks if a file is BGZF compressed.
+    """
+    with open(file_path, "rb") as bgzf_file:
+        try:
+            return _read_block_header(bgzf_file) is not None
+        except ValueError:
+            return False
+
+
+def gzi_index_path(file_path) -> Path:
+    """
+    Returns the path of the BGZF index (.gzi) of a BGZF file.
+    """
+    file_path = Path(file_path)
+    return file_path.with_name(f"{file_path.name}.gzi")
+
+
+def read_gzi_index(index_path) -> list:
+    """
+    Reads a BGZF index (.gzi) file, as written by bgzip -i and samtools faidx.
+
+    Args:
+        index_path (str or Path): Path to the .gzi file.
+
+    Returns:
+        list[tuple[int, int]]: Compressed and uncompressed offset of the start of
+            every block, including the first block.
+    """
+    with open(index_path, "rb") as index_file:
+        (num_entries,) = struct.unpack("<Q", index_file.read(8))
+        offsets = struct.unpack(
+            f"<{2 * num_entries}Q", index_file.read(16 * num_entries)
+        )
+    return [(0, 0)] + list(zip(offsets[::2], offsets[1::2]))
+
+
+def write_gzi_index(block_offsets: list, index_path) -> None:
+    """
+    Writes a BGZF index (.gzi) file.
+
+    Args:
+        block_offsets (list[tuple[int, int]]): Compressed and uncompressed offset of
+            the start of every block, the first block is not written.
+        index_path (str or Path): Path to the .gzi file.
+    """
+    block_offsets = [offsets for offsets in block_offsets if offsets != (0, 0)]
+    with open(index_path, "wb") as index_file:
+        index_file.write(struct.pack("<Q", len(block_offsets)))
+        for compressed_offset, uncompressed_offset in block_offsets:
+            index_file.write(struct.pack("<2Q", compressed_offset, uncompressed_offset))
+
+
+def build_gzi_index(file_path) -> list:
+    """
+    Builds the BGZF index of a BGZF file from the block headers, without
+    decompressing the blocks.
+
+    Args:
+        file_path (str or Path): Path to the BGZF file.
+
+    Returns:
+        list[tuple[int, int]]: Compressed and uncompressed offset of the start of
+            every block, including the first block.
+    """
+    block_offsets = []
+    compressed_offset = uncompressed_offset = 0
+    with open(file_path, "rb") as bgzf_file:
+        while (block_header := _read_block_header(bgzf_file)) is not None:
+            block_size, _ = block_header
+            bgzf_file.seek(compressed_offset + block_size - 4)
+            (data_size,) = struct.unpack("<I", bgzf_file.read(4))
+            if data_size or not block_offsets:
+                # Empty blocks like the end of file marker are left out, as bgzip does
+                block_offsets.append((compressed_offset, uncompressed_offset))
+            compressed_offset += block_size
+            uncompressed_offset += data_size
+    return block_offsets
+
+
+def load_gzi_index(file_path) -> list:
+    """
+    Loads the BGZF index next to a BGZF file, building it and writing it next to
+    the file if possible when there is no .gzi file.
+
+    Args:
+        file_path (str or Path): Path to the BGZF file.
+
+    Returns:
+        list[tuple[int, int]]: Compressed and uncompressed offset of the start of
+            every block, including the first block.
+    """
+    index_path = gzi_index_path(file_path)
+    if index_path.exists():
+        return read_gzi_index(index_path)
+
+    print(f"Building BGZF index for {file_path}")
+    block_offsets = build_gzi_index(file_path)
+    try:
+        write_gzi_index(block_offsets, index_path)
+    except OSError:
+        print(f"Could not write BGZF index to {index_path}")
+    return block_offsets
+
+
+class BgzfReader:
+    """
+    Reads BGZF files with random access on the uncompressed offsets.
+
+    Seeking uses the offsets of the blocks from the BGZF index, so only the block
+    holding the offset is decompressed.
+    """
+
+    def __init__(self, file_path, block_offsets: list | None = None):
+        """
+        Initialize BgzfReader object.
+
+        Args:
+            file_path (str or Path): Path to the file to read.
+            block_offsets (list[tuple[int, int]], optional): Compressed and
+                uncompressed offset of the start of every block. Loaded from the
+                .gzi file or built if not given.
+        """
+        if block_offsets is None:
+            block_offsets = load_gzi_index(file_path)
+        self._block_offsets = block_offsets
+        self._uncompressed_offsets = [offsets[1] for offsets in block_offsets]
+        self._block_data = b""
+        self._block_position = 0
+        self._file = open(file_path, "rb")
+
+    def seek(self, offset: int) -> None:
+        """
+        Moves to an offset in the uncompressed data.
+
+        Args:
+            offset (int): Offset in the uncompressed data.
+        """
+        block = max(bisect.bisect_right(self._uncompressed_offsets, offset) - 1, 0)
+        compressed_offset, uncompressed_offset = (
+            self._block_offsets[block] if self._block_offsets else (0, 0)
+        )
+        self._file.seek(compressed_offset)
+        self._block_data = b""
+        self._block_position = 0
+        self._skip(offset - uncompressed_offset)
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Reads uncompressed data.
+
+        Args:
+            size (int, optional): Nr of bytes to read, everything if negative.
+
+        Returns:
+            bytes: The data, shorter than size only at the end of the file.
+        """
+        chunks = []
+        while size != 0:
+            if self._block_position >= len(self._block_data):
+                if not self._read_block():
+                    break
+            block_data = self._block_data
+            end = len(block_data) if size < 0 else self._block_position + size
+            chunk = block_data[self._block_position : end]
+            self._block_position += len(chunk)
+            if size > 0:
+                size -= len(chunk)
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def _skip(self, size: int) -> None:
+        """
+        Skips uncompressed data.
+
+        Args:
+            size (int): Nr of bytes to skip.
+        """
+        while size > 0 and self._read_block():
+            skipped = min(size, len(self._block_data))
+            self._block_position = skipped
+            size -= skipped
+
+    def _read_block(self) -> bool:
+        """
+        Reads and decompresses the next block.
+
+        Returns:
+            bool: False at the end of the file.
+        """
+        block_header = _read_block_header(self._file)
+        if block_header is None:
+            return False
+        block_size, header_size = block_header
+        compressed_data = self._file.read(block_size - header_size)
+        self._block_data = zlib.decompress(
+            compressed_data[:-BLOCK_FOOTER_SIZE], wbits=-15
+        )
+        self._block_position = 0
+        return True
+
+    def __enter__(self):
+        """
+        Enters the context.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exits the context and closes the file.
+        """
+        self.close()
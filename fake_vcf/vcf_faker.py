@@ -1,11 +1,300 @@
 from __future__ import annotations
 
+from typing import NamedTuple, Sequence
+
 import json
 import random
 from collections import deque
 from pathlib import Path
 
-from fake_vcf import vcf_reference, version
+import numpy as np
+
+from fake_vcf import vcf_format, vcf_reference, version
+from fake_vcf.vcf_options import FormatModel, GenotypeModel
+
+# Upper bound for the size of a rendered block, used to pick the default block size
+TARGET_BLOCK_BYTES = 8 * 1024 * 1024
+MAX_BLOCK_SIZE = 4096
+
+# Wide outputs write the sample names of the header and render the sample columns of
+# a row this many samples at a time
+SAMPLE_CHUNK_SIZE = 65536
+
+# Each row field draws from its own random streams so the output does not depend on
+# the block size.
+ROW_FIELDS = (
+    "position",
+    "ref",
+    "alt",
+    "id",
+    "qual",
+    "rotation",
+    "allele_frequency",
+    "genotype",
+    "variant_type",
+    "multiallelic",
+    "indel_length",
+    "indel_bases",
+    "alt_allele",
+    "format",
+)
+
+# The row fields are drawn in windows of rows, each window of each field from its own
+# random stream keyed by the seed, the field and the window. Row i only depends on
+# the seed and i, so any range of rows can be generated without the rows before it
+# and only one window of positions is kept in memory.
+ROW_WINDOW_ROWS = 65536
+# Row fields drawn for every sample, two float32 per sample and row. They use one
+# 64 bit output of their stream per sample and row, so the rows before a range are
+# skipped by advancing the stream instead of drawing them.
+SAMPLE_ROW_FIELDS = ("genotype", "alt_allele", "format")
+# Average distance between the positions of two rows
+POSITION_SPACING = 100
+
+# Shape of the beta distribution the alt allele frequency of each site is drawn
+# from, most sites are rare like in the site frequency spectrum of a real cohort.
+ALLELE_FREQUENCY_ALPHA = 0.2
+ALLELE_FREQUENCY_BETA = 1.0
+
+# Multi-allelic sites have up to this many alleles, including the reference
+MAX_ALLELES = 4
+# Max nr of bases inserted or deleted by an indel
+MAX_INDEL_LENGTH = 10
+
+# Types of the variants
+SNV = 0
+INSERTION = 1
+DELETION = 2
+
+ALLELES = ["A", "C", "G", "T"]
+# Index in ALLELES of each ASCII code, -1 for codes that are not an allele
+ALLELE_INDEXES = np.full(256, -1, dtype=np.int64)
+ALLELE_INDEXES[[ord(allele) for allele in ALLELES]] = range(len(ALLELES))
+ALLELE_CODES = np.frombuffer("".join(ALLELES).encode("ascii"), dtype=np.uint8)
+
+
+def contig_rows(num_rows: int, contigs: dict) -> dict:
+    """
+    Splits the rows over contigs in proportion to their lengths.
+
+    The rows are rounded with the largest remainder so they add up to num_rows.
+
+    Args:
+        num_rows (int): Number of rows of all contigs.
+        contigs (dict[str, int or None]): The contigs and their lengths, the rows are
+            split evenly if any length is unknown.
+
+    Returns:
+        dict[str, int]: The nr of rows of each contig.
+    """
+    weights = list(contigs.values())
+    if any(weight is None for weight in weights):
+        weights = [1] * len(weights)
+    total_weight = sum(weights)
+    shares = [num_rows * weight / total_weight for weight in weights]
+    rows = [int(share) for share in shares]
+    remainders = sorted(range(len(shares)), key=lambda i: rows[i] - shares[i])[
+        : num_rows - sum(rows)
+    ]
+    for i in remainders:
+        rows[i] += 1
+    return dict(zip(contigs, rows))
+
+
+def contig_vcf_args(vcf_args: dict, num_rows: int) -> list:
+    """
+    Creates the VirtualVCF arguments of each contig of an output with rows.
+
+    The rows are split over the contigs by contig_rows. The first contig keeps the
+    row seed of the output and the others get one derived from it and the contig,
+    so the rows of a contig don't depend on how it is split in shards or chunks.
+
+    Args:
+        vcf_args (dict): Arguments for VirtualVCF for the whole output, without
+            num_rows and with a random_seed.
+        num_rows (int): Number of rows of all contigs.
+
+    Returns:
+        list[tuple[int, int, dict]]: The index of the contig, its first row in the
+            output and its VirtualVCF arguments.
+    """
+    contigs = vcf_args.get("contigs") or {vcf_args["chromosome"]: None}
+    row_seed = vcf_args.get("row_seed")
+    seed = abs(vcf_args["random_seed"] if row_seed is None else row_seed)
+    contig_args = []
+    first_row = 0
+    for contig_index, (chromosome, rows) in enumerate(
+        contig_rows(num_rows, contigs).items()
+    ):
+        if rows:
+            contig_args.append(
+                (
+                    contig_index,
+                    first_row,
+                    {
+                        **vcf_args,
+                        "chromosome": chromosome,
+                        "num_rows": rows,
+                        "row_seed": (
+                            row_seed
+                            if contig_index == 0
+                            else int(
+                                np.random.SeedSequence(
+                                    [seed, contig_index]
+                                ).generate_state(1)[0]
+                            )
+                        ),
+                    },
+                )
+            )
+        first_row += rows
+    return contig_args
+
+
+def window_rng(seed_sequence: np.random.SeedSequence, window: int):
+    """
+    Creates the random stream of a window of rows of a row field.
+
+    Args:
+        seed_sequence (np.random.SeedSequence): The seed of the row field.
+        window (int): Index of the window.
+
+    Returns:
+        np.random.Generator: The random stream.
+    """
+    return np.random.default_rng(
+        np.random.SeedSequence(
+            seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (window,)
+        )
+    )
+
+
+def encode_doubled_samples(samples: Sequence[str]) -> tuple:
+    """
+    Encodes the sample columns twice in a row, each sample followed by a tab.
+
+    Args:
+        samples (Sequence[str]): The sample columns.
+
+    Returns:
+        tuple[bytes, np.ndarray]: The encoded samples and the offset of each of the
+            doubled samples, with the length of the bytes as the last offset.
+    """
+    encoded = "\t".join(samples).encode("utf-8") + b"\t"
+    sample_lengths = np.array(
+        [len(sample.encode("utf-8")) + 1 for sample in samples], dtype=np.int64
+    )
+    offsets = np.zeros(2 * len(samples) + 1, dtype=np.int64)
+    np.cumsum(np.tile(sample_lengths, 2), out=offsets[1:])
+    return encoded * 2, offsets
+
+
+def genotype_index(first, second, num_alleles: int, phased: bool):
+    """
+    Gets the index of diploid genotypes among the sample values of a nr of alleles.
+
+    Phased genotypes are ordered by first + num_alleles * second, unphased ones in
+    the VCF order of Number=G values, high * (high + 1) / 2 + low.
+
+    Args:
+        first (int or np.ndarray): The first allele.
+        second (int or np.ndarray): The second allele.
+        num_alleles (int): Nr of alleles of the site.
+        phased (bool): The genotypes are phased.
+
+    Returns:
+        int or np.ndarray: The index of each genotype.
+    """
+    if phased:
+        return first + num_alleles * second
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    return high * (high + 1) // 2 + low
+
+
+def expand_sample_value(
+    sample_value: str, num_alleles: int, alt_allele: int = 1
+) -> str:
+    """
+    Expands the AD (Number=R) and PL (Number=G) values of a biallelic sample value to
+    a site with more alleles.
+
+    The alt values of the sample value are moved to alt_allele, the other alleles
+    have no reads and the genotypes with them get the highest PL of the sample.
+
+    Args:
+        sample_value (str): A sample value like 0|1:0,30:30:89:913,89,0.
+        num_alleles (int): Nr of alleles of the site.
+        alt_allele (int, optional): The alt allele the values are for. Defaults
+            to 1.
+
+    Returns:
+        str: The sample value with AD and PL values for all alleles.
+    """
+    fields = sample_value.split(":")
+    if len(fields) == 1 or (num_alleles == 2 and alt_allele == 1):
+        return sample_value
+    genotype, allele_depths, depth, quality, likelihoods = fields
+    ref_depth, alt_depth = allele_depths.split(",")
+    depths = [ref_depth] + ["0"] * (num_alleles - 1)
+    depths[alt_allele] = alt_depth
+    likelihood_values = likelihoods.split(",")
+    expanded_likelihoods = [max(likelihood_values, key=int)] * (
+        num_alleles * (num_alleles + 1) // 2
+    )
+    # The biallelic PL values are for 0/0, 0/1 and 1/1
+    for (first, second), likelihood in zip(
+        [(0, 0), (0, alt_allele), (alt_allele, alt_allele)], likelihood_values
+    ):
+        expanded_likelihoods[
+            int(genotype_index(first, second, num_alleles, phased=False))
+        ] = likelihood
+    return ":".join(
+        [genotype, ",".join(depths), depth, quality, ",".join(expanded_likelihoods)]
+    )
+
+
+def encode_sample_values(sample_values: Sequence[str]) -> np.ndarray:
+    """
+    Encodes sample values of the same length, each followed by a tab.
+
+    Args:
+        sample_values (Sequence[str]): The sample values.
+
+    Returns:
+        np.ndarray: The encoded values as uint8 with shape (values, length + 1).
+
+    Raises:
+        ValueError: If the sample values differ in length.
+    """
+    encoded = [f"{value}\t".encode("utf-8") for value in sample_values]
+    if len({len(value) for value in encoded}) != 1:
+        raise ValueError("Sample values must have the same length")
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8).reshape(len(encoded), -1)
+
+
+class RowValues(NamedTuple):
+    """
+    The values of a block of VCF rows.
+
+    With the rotation genotype model the sample columns of a row are the
+    available samples rotated right by the rotation of the row. With the allele
+    frequency model each sample column is the sample value with the index in
+    genotype_codes and allele_counts has the nr of each alt allele of each row.
+    Multi-allelic rows have their alt alleles comma separated in alts and their
+    nr of alleles, including the reference, in num_alleles. With the reads FORMAT
+    model format_draws has the draws of the FORMAT values of each row and sample.
+    """
+
+    positions: np.ndarray
+    ids: np.ndarray
+    refs: Sequence[str]
+    alts: Sequence[str]
+    quals: np.ndarray
+    rotations: np.ndarray | None
+    genotype_codes: np.ndarray | None = None
+    allele_counts: np.ndarray | None = None
+    num_alleles: np.ndarray | None = None
+    format_draws: np.ndarray | None = None
 
 
 class VirtualVCF:
@@ -19,6 +308,18 @@ class VirtualVCF:
         phased: bool | None = True,
         large_format: bool | None = True,
         reference_dir: str | Path | None = None,
+        block_size: int | None = None,
+        position_offset: int = 0,
+        include_header: bool = True,
+        row_seed: int | None = None,
+        contigs: dict | None = None,
+        genotype_model: GenotypeModel = GenotypeModel.ROTATION,
+        multiallelic_rate: float = 0.0,
+        insertion_rate: float = 0.0,
+        deletion_rate: float = 0.0,
+        start_row: int = 0,
+        stop_row: int | None = None,
+        format_model: FormatModel = FormatModel.FIXED,
     ):
         """
         Initialize VirtualVCF object.
@@ -32,18 +333,81 @@ class VirtualVCF:
             phased (bool, optional): Phased or unphased genotypes. Defaults to True.
             large_format (bool, optional): Use large format VCF. Defaults to True.
             reference_dir (str or Path, optional): Path to reference file directory.
+            block_size (int, optional): Nr of rows generated per block. Defaults to a size
+                based on the number of samples.
+            position_offset (int, optional): Offset added to all generated positions.
+                Defaults to 0.
+            include_header (bool, optional): Start with the VCF header. Defaults to True.
+            row_seed (int, optional): Random seed for the row values, used to generate
+                different rows for the same samples. Defaults to random_seed.
+            contigs (dict[str, int or None], optional): The contigs of the whole
+                output and their lengths, written as the contig lines of the header.
+                Defaults to only the chromosome.
+            genotype_model (GenotypeModel, optional): How the genotypes of the
+                samples are drawn. Defaults to ROTATION.
+            multiallelic_rate (float, optional): Fraction of the sites with 2 to
+                MAX_ALLELES - 1 alt alleles. Defaults to 0.
+            insertion_rate (float, optional): Fraction of the sites that are
+                insertions. Defaults to 0.
+            deletion_rate (float, optional): Fraction of the sites that are
+                deletions, with the deleted bases from the reference if there is
+                one. Defaults to 0.
+            start_row (int, optional): First row to generate, the rows are the same
+                as those rows of the whole VCF. Defaults to 0.
+            stop_row (int, optional): Row after the last row to generate. Defaults
+                to num_rows.
+            format_model (FormatModel, optional): How the AD, DP, GQ and PL values
+                of the samples are generated in large format. Defaults to FIXED.
 
         Raises:
-            ValueError: If num_samples or num_rows is less than 1.
+            ValueError: If num_samples or num_rows is less than 1, the variant
+                rates are not fractions or the rows to generate are not rows of
+                the VCF.
         """
         self.num_rows = num_rows
-        self.rows_remaining = num_rows + 1  # One for the header
+        self.start_row = start_row
+        self.stop_row = num_rows if stop_row is None else stop_row
+        self.include_header = include_header
+        self._header_pending = include_header
+        # One for the header
+        self.rows_remaining = self.stop_row - start_row + int(include_header)
         self.num_samples = num_samples
         self.chromosome = chromosome
+        self.contigs = dict(contigs) if contigs else {chromosome: None}
         self.sample_prefix = sample_prefix
         self.phased = phased
+        self.genotype_model = GenotypeModel(genotype_model)
+        self.format_model = FormatModel(format_model)
+        if not (
+            0 <= multiallelic_rate <= 1
+            and 0 <= insertion_rate
+            and 0 <= deletion_rate
+            and insertion_rate + deletion_rate <= 1
+        ):
+            raise ValueError(
+                "Multi-allelic, insertion and deletion rates must be fractions and "
+                "the indel rates can't add up to more than 1"
+            )
+        self.multiallelic_rate = multiallelic_rate
+        self.insertion_rate = insertion_rate
+        self.deletion_rate = deletion_rate
+        self.max_alleles = MAX_ALLELES if multiallelic_rate else 2
         # Use a per instance seed for reproducibility
         self.random = random.Random(random_seed)
+        row_seed = random_seed if row_seed is None else row_seed
+        seed_sequences = dict(
+            zip(
+                ROW_FIELDS,
+                np.random.SeedSequence(
+                    None if row_seed is None else abs(row_seed)
+                ).spawn(len(ROW_FIELDS)),
+            )
+        )
+        self._position_seed = seed_sequences.pop("position")
+        self._row_field_seeds = seed_sequences
+        # The window, next row and random stream of each row field, and the
+        # rotation of the row before the next row
+        self._row_field_states = {}
         self.large_format = large_format
         self.reference_dir = Path(reference_dir) if reference_dir else None
         self.reference_file = None
@@ -56,15 +420,31 @@ class VirtualVCF:
                 f"##source=VCFake {version}",
                 '##FILTER=<ID=PASS,Description="All filters passed">',
                 '##INFO=<ID=NS,Number=1,Type=Integer,Description="Number of Samples With Data">',
-                f"##contig=<ID={chromosome}>",
+                *(
+                    (
+                        f"##contig=<ID={contig}>"
+                        if length is None
+                        else f"##contig=<ID={contig},length={length}>"
+                    )
+                    for contig, length in self.contigs.items()
+                ),
                 f"##reference=ftp://ftp.example.com/{self.reference_metadata.get('source_reference_file', 'sample.fa')}",
                 '##INFO=<ID=AF,Number=A,Type=Float,Description="Estimated allele frequency in the range (0,1)">',
                 '##INFO=<ID=DP,Number=1,Type=Integer,Description="Approximate read depth; some reads may have been filtered">',
-                '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
                 "",
             ]
         )  # VCF file format header
 
+        if self.genotype_model == GenotypeModel.ALLELE_FREQUENCY:
+            self.header += "\n".join(
+                [
+                    '##INFO=<ID=AC,Number=A,Type=Integer,Description="Allele count in genotypes">',
+                    '##INFO=<ID=AN,Number=1,Type=Integer,Description="Total number of alleles in called genotypes">',
+                    "",
+                ]
+            )
+        self.header += '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n'
+
         if self.large_format:
             self.header += "\n".join(
                 [
@@ -140,24 +520,92 @@ class VirtualVCF:
                     "0/0", "0/1", 1
                 )
 
-        self.alleles = ["A", "C", "G", "T"]
+        # Multi-allelic sites have the same genotypes with AD and PL values for all
+        # their alleles. The sample values are kept for each nr of alleles, the
+        # index of a genotype for num_alleles alleles is sample_value_offsets[
+        # num_alleles] + genotype_index(alleles, num_alleles).
+        self.sample_value_offsets = {2: 0}
+        self.available_samples_by_alleles = {2: list(self.available_samples)}
+        for num_alleles in range(3, self.max_alleles + 1):
+            self.sample_value_offsets[num_alleles] = len(self.sample_values)
+            self.sample_values.extend(self._expanded_sample_values(num_alleles))
+            self.available_samples_by_alleles[num_alleles] = [
+                expand_sample_value(sample, num_alleles)
+                for sample in self.available_samples
+            ]
+
+        # Every row is a rotation of the available samples. They are encoded once,
+        # twice in a row and tab separated, so the sample columns of any rotation are
+        # a single slice of the bytes found with the offsets of the samples.
+        self._doubled_samples = {
+            num_alleles: encode_doubled_samples(samples)
+            for num_alleles, samples in self.available_samples_by_alleles.items()
+        }
+        self.max_rotation = (
+            int(self.num_samples / 10) if self.num_samples >= 10 else self.num_samples
+        )
+        # The allele frequency model renders the sample columns of a block with one
+        # gather from the encoded sample values
+        self._sample_value_tables = {
+            num_alleles: encode_sample_values(self.allele_sample_values(num_alleles))
+            for num_alleles in self.sample_value_offsets
+        }
 
-        # Generate and sort positions
-        self.positions = self.random.sample(
-            range(1, self.num_rows * 100), self.num_rows
+        self.alleles = list(ALLELES)
+        self.info = f"DP=10;AF=0.5;NS={self.num_samples}"
+        # The rotation genotypes only have the first alt allele
+        self._rotation_infos = {
+            num_alleles: ";".join(
+                [
+                    "DP=10",
+                    "AF=" + ",".join(["0.5"] + ["0"] * (num_alleles - 2)),
+                    f"NS={self.num_samples}",
+                ]
+            )
+            for num_alleles in self.sample_value_offsets
+        }
+        self.format = "GT:AD:DP:GQ:PL" if self.large_format else "GT"
+        # The reads FORMAT model draws the values of each sample from the alleles of
+        # its genotype, those of the sample values and of the doubled samples
+        self.draws_format = bool(
+            self.large_format and self.format_model == FormatModel.READS
         )
-        self.positions.sort()
+        if self.draws_format:
+            self._value_alleles = np.array(
+                [[int(value[0]), int(value[2])] for value in self.sample_values],
+                dtype=np.int8,
+            )
+            self._doubled_sample_alleles = np.array(
+                [[int(sample[0]), int(sample[2])] for sample in self.available_samples]
+                * 2,
+                dtype=np.int8,
+            )
+
+        self.block_size = block_size if block_size else self._default_block_size()
+        if self.block_size < 1:
+            raise ValueError("Block size must be greater or equal to 1")
+        self._pending_rows = deque()
+
+        if not 0 <= self.start_row <= self.stop_row <= num_rows:
+            raise ValueError(
+                f"Rows {self.start_row}-{self.stop_row} are not rows of the VCF"
+            )
 
-        self.current_pos = 0
+        # Positions are generated one window at a time when the rows are generated
+        self.position_offset = position_offset
+        self._position_window = (None, None)
+        self.max_position = int(self._get_positions(num_rows - 1, num_rows)[0])
+
+        self.current_pos = self.start_row
 
         self.reference_data = None
         if self.reference_dir:
             self.reference_data = vcf_reference.load_reference_data(
-                self.reference_file, memory_map=False
+                self.reference_file, memory_map=True
             )
-            if self.reference_data.shape[0] < max(self.positions):
+            if self.reference_data.shape[0] < self.max_position:
                 raise ValueError(
-                    f"""Max position size {max(self.positions)} is outside the reference which has a max of {len(self.reference_data)}"""
+                    f"""Max position size {self.max_position} is outside the reference which has a max of {len(self.reference_data)}"""
                 )
 
     def __iter__(self):
@@ -176,83 +624,998 @@ class VirtualVCF:
         self.rows_remaining -= 1
         return vcf_data
 
+    def blocks(
+        self, row_values=False, encoded=False, header_chunks=False, genotypes=True
+    ):
+        """
+        Iterates over the VCF data in text blocks of up to block_size rows.
+
+        The header is yielded as the first block. The rows are the same as when
+        iterating over the VirtualVCF row by row.
+
+        Args:
+            row_values (bool, optional): Yield the values of the rows as RowValues
+                instead of rendering them, for writers of other formats. Can't be
+                used after iterating over single rows.
+            encoded (bool, optional): Yield the blocks as UTF-8 encoded bytes, the
+                sample columns are copied straight from the encoded samples.
+            header_chunks (bool, optional): Yield the header as an iterator over
+                its text in chunks from header_chunks, so the sample names of a
+                wide header are never held at once.
+            genotypes (bool, optional): Draw the genotypes and FORMAT values of
+                the samples of the row values. Writers that draw the genotypes in
+                chunks of samples with genotype_code_chunks leave them out.
+        """
+        if row_values and self._pending_rows:
+            raise ValueError("Row values can't be generated after single rows")
+
+        while self.rows_remaining > 0:
+            if self._header_pending:
+                if header_chunks:
+                    self._header_pending = False
+                    self.rows_remaining -= 1
+                    yield self.header_chunks()
+                    continue
+                vcf_block = self._generate_vcf_header()
+                self.rows_remaining -= 1
+            elif self._pending_rows:
+                vcf_block = "".join(self._pending_rows)
+                self.rows_remaining -= len(self._pending_rows)
+                self._pending_rows.clear()
+            else:
+                block_values = self._next_row_values(genotypes)
+                self.rows_remaining -= len(block_values.positions)
+                if row_values:
+                    yield block_values
+                    continue
+                vcf_block = b"".join(self._row_fragments(block_values))
+                yield vcf_block if encoded else vcf_block.decode("utf-8")
+                continue
+            yield vcf_block.encode("utf-8") if encoded else vcf_block
+
+    def fragment_blocks(self):
+        """
+        Iterates over the VCF data as encoded fragments, one iterator per block.
+
+        The header is the first block, in chunks of sample names. The fragments of
+        the rows are the same as blocks(encoded=True) before they are joined, so
+        they can be written without copying the sample columns. The fragments are
+        generated as they are iterated over, so a writer that writes them as it goes
+        never holds a whole wide row. Can't be used after iterating over single rows.
+
+        Yields:
+            Iterator[bytes or memoryview]: The fragments of the next block.
+        """
+        for block in self.blocks(row_values=True, header_chunks=True):
+            if isinstance(block, RowValues):
+                yield self._row_fragments(block)
+            else:
+                yield (chunk.encode("utf-8") for chunk in block)
+
+    def _num_genotypes(self, num_alleles):
+        """
+        Gets the nr of genotypes of a site with num_alleles alleles.
+        """
+        if self.phased:
+            return num_alleles * num_alleles
+        return num_alleles * (num_alleles + 1) // 2
+
+    def allele_sample_values(self, num_alleles):
+        """
+        Gets the sample values of sites with num_alleles alleles.
+
+        Args:
+            num_alleles (int): Nr of alleles of the site, including the reference.
+
+        Returns:
+            list[str]: The sample values ordered by genotype_index.
+        """
+        offset = self.sample_value_offsets[num_alleles]
+        return self.sample_values[offset : offset + self._num_genotypes(num_alleles)]
+
+    def _expanded_sample_values(self, num_alleles):
+        """
+        Creates the sample values of the genotypes of a site with num_alleles
+        alleles, ordered by genotype_index.
+
+        The FORMAT values of each genotype are those of the biallelic sample value
+        with the alt alleles as 1, expanded to all alleles with the reads of the
+        highest alt allele of the genotype.
+
+        Args:
+            num_alleles (int): Nr of alleles of the site.
+
+        Returns:
+            list[str]: The sample values.
+        """
+        separator = "|" if self.phased else "/"
+        genotypes = [
+            (first, second)
+            for second in range(num_alleles)
+            for first in range(num_alleles)
+            if self.phased or first <= second
+        ]
+        sample_values = [None] * len(genotypes)
+        for first, second in genotypes:
+            biallelic_value = self.sample_values[
+                genotype_index(min(first, 1), min(second, 1), 2, self.phased)
+            ]
+            sample_values[genotype_index(first, second, num_alleles, self.phased)] = (
+                expand_sample_value(
+                    f"{first}{separator}{second}{biallelic_value[3:]}",
+                    num_alleles,
+                    alt_allele=max(first, second, 1),
+                )
+            )
+        return sample_values
+
+    def _default_block_size(self):
+        """
+        Picks a block size that keeps a rendered block around TARGET_BLOCK_BYTES.
+        """
+        sample_width = 24 if self.large_format else 4
+        if self.draws_format:
+            # The FORMAT values are drawn and formatted in arrays several times the
+            # size of their text
+            sample_width = 96
+        row_width = 64 + self.num_samples * sample_width
+        return max(1, min(MAX_BLOCK_SIZE, TARGET_BLOCK_BYTES // row_width))
+
+    def sample_names(self):
+        """
+        Gets the names of the samples in the order of the sample columns.
+
+        Returns:
+            list[str]: The sample names.
+        """
+        return [f"{self.sample_prefix}{i:07d}" for i in range(1, self.num_samples + 1)]
+
+    def header_chunks(self):
+        """
+        Generates the text of the VCF header in chunks.
+
+        The first chunk is the meta-information lines and the fixed columns of the
+        #CHROM line, the sample names follow in chunks of SAMPLE_CHUNK_SIZE names
+        and the last chunk ends the line.
+
+        Yields:
+            str: The next chunk of the header.
+        """
+        yield self.header + "\t".join(
+            ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"]
+        )
+        for start in range(1, self.num_samples + 1, SAMPLE_CHUNK_SIZE):
+            yield "".join(
+                f"\t{self.sample_prefix}{i:07d}"
+                for i in range(
+                    start, min(start + SAMPLE_CHUNK_SIZE, self.num_samples + 1)
+                )
+            )
+        yield "\n"
+
     def _generate_vcf_header(self):
         """
         Generates the VCF header.
         """
-        # Create a list of column names
-        columns = [
-            "#CHROM",
-            "POS",
-            "ID",
-            "REF",
-            "ALT",
-            "QUAL",
-            "FILTER",
-            "INFO",
-            "FORMAT",
-        ]
+        self._header_pending = False
+        return "".join(self.header_chunks())
+
+    def rows(self, start, stop):
+        """
+        Generates a range of rows without generating the rows before them.
+
+        The rows are the same as rows start to stop - 1 when iterating over the
+        whole VCF, and iterating over the VirtualVCF is not affected.
+
+        Args:
+            start (int): Index of the first row.
+            stop (int): Index after the last row.
+
+        Yields:
+            str: The next row.
+
+        Raises:
+            ValueError: If the range is not rows of the VCF.
+        """
+        if not 0 <= start <= stop <= self.num_rows:
+            raise ValueError(f"Rows {start}-{stop} are not rows of the VCF")
+        for block_start in range(start, stop, self.block_size):
+            yield from self._render_vcf_rows(
+                self._generate_row_values(
+                    block_start, min(block_start + self.block_size, stop)
+                )
+            )
+
+    def region_rows(self, start_position, stop_position):
+        """
+        Finds the range of rows with positions in a region.
+
+        Only the windows of positions with the ends of the region are generated.
+
+        Args:
+            start_position (int): First position of the region.
+            stop_position (int): Last position of the region.
+
+        Returns:
+            tuple[int, int]: The first row in the region and the row after the
+                last one, the same row if no row is in the region.
+        """
+        window_length = ROW_WINDOW_ROWS * POSITION_SPACING
+        num_windows = -(-self.num_rows // ROW_WINDOW_ROWS)
 
-        # Add sample names to the column list
-        for i in range(1, self.num_samples + 1):
-            columns.append(f"{self.sample_prefix}{i:07d}")
+        def first_row_from(position):
+            # The positions of window w are after w * window_length
+            window = (position - 1 - self.position_offset) // window_length
+            if window < 0:
+                return 0
+            if window >= num_windows:
+                return self.num_rows
+            return window * ROW_WINDOW_ROWS + int(
+                np.searchsorted(self._window_positions(window), position)
+            )
 
-        self.header += "\t".join(columns) + "\n"
+        start_row = first_row_from(start_position)
+        return start_row, max(start_row, first_row_from(stop_position + 1))
 
-        return self.header
+    def _next_row_values(self, genotypes=True):
+        """
+        Generates the values of the next block of rows to iterate over.
+        """
+        start = self.current_pos
+        self.current_pos = min(start + self.block_size, self.stop_row)
+        return self._generate_row_values(start, self.current_pos, genotypes)
 
-    def _get_ref_at_pos(self, position, ref_index):
+    def _draw_row_field(self, field, rng, num_rows):
         """
-        Retrieves the reference value at a given position if it exists in reference data
-        or returns the allele at the given index.
+        Draws the values of a row field for a nr of rows from a random stream.
+
+        Args:
+            field (str): The row field.
+            rng (np.random.Generator): The stream of the field.
+            num_rows (int): Nr of rows.
+
+        Returns:
+            np.ndarray: The values of the rows.
         """
-        if self.reference_data:
-            reference_value = vcf_reference.get_ref_at_pos(
-                self.reference_data, position - 1
+        if field == "ref":
+            return rng.integers(0, 4, size=num_rows)
+        if field == "alt":
+            return rng.integers(1, 4, size=num_rows)
+        if field == "id":
+            return rng.integers(1, 1001, size=num_rows)
+        if field == "qual":
+            return rng.integers(10, 101, size=num_rows)
+        if field == "rotation":
+            return rng.integers(1, self.max_rotation + 1, size=num_rows)
+        if field == "allele_frequency":
+            return rng.beta(
+                ALLELE_FREQUENCY_ALPHA, ALLELE_FREQUENCY_BETA, size=num_rows
             )
-        else:
-            reference_value = self.alleles[ref_index]
-        return reference_value
+        if field in SAMPLE_ROW_FIELDS:
+            return rng.random((num_rows, self.num_samples, 2), dtype=np.float32)
+        if field == "indel_length":
+            return rng.integers(1, MAX_INDEL_LENGTH + 1, size=num_rows)
+        if field == "indel_bases":
+            return rng.integers(0, len(ALLELES), size=(num_rows, MAX_INDEL_LENGTH))
+        # The variant type and multi-allelic draws
+        return rng.random(num_rows)
 
-    def _generate_vcf_row(self):
+    def _row_field(self, field, start, stop):
         """
-        Generates a VCF row.
+        Draws the values of a row field for a range of rows, window by window.
+
+        A range right after the last range of the field continues the stream of
+        its window, other ranges skip the rows before them in their window.
+
+        The rotation field gives the rotation of each row, the rotation of the row
+        before plus a random step, starting from 0 before each window.
+
+        Args:
+            field (str): The row field.
+            start (int): Index of the first row.
+            stop (int): Index after the last row.
+
+        Returns:
+            np.ndarray: The values of the rows.
         """
-        ref_index = self.random.randint(0, 3)
+        window_values = []
+        for window in range(
+            start // ROW_WINDOW_ROWS, (stop - 1) // ROW_WINDOW_ROWS + 1
+        ):
+            window_start = window * ROW_WINDOW_ROWS
+            range_start = max(start, window_start)
+            range_stop = min(stop, window_start + ROW_WINDOW_ROWS)
+            state = self._row_field_states.get(field)
+            if state is not None and state[:2] == (window, range_start):
+                rng, rotation = state[2:]
+            else:
+                rng = window_rng(self._row_field_seeds[field], window)
+                rotation = 0
+                skipped_rows = range_start - window_start
+                if field in SAMPLE_ROW_FIELDS:
+                    rng.bit_generator.advance(skipped_rows * self.num_samples)
+                elif skipped_rows:
+                    skipped = self._draw_row_field(field, rng, skipped_rows)
+                    if field == "rotation":
+                        rotation = int(skipped.sum() % self.num_samples)
+            values = self._draw_row_field(field, rng, range_stop - range_start)
+            if field == "rotation":
+                values = (rotation + np.cumsum(values)) % self.num_samples
+                rotation = int(values[-1])
+            self._row_field_states[field] = (window, range_stop, rng, rotation)
+            window_values.append(values)
+        if len(window_values) == 1:
+            return window_values[0]
+        return np.concatenate(window_values)
 
-        position = self.positions[self.current_pos]
-        # Generate random values for each field in the VCF row
-        pos = f"{position}"
-        vid = f"rs{self.random.randint(1, 1000)}"
-        ref = self._get_ref_at_pos(position, ref_index)
-        if ref in self.alleles:
-            alt = self.alleles[self.alleles.index(ref) - self.random.randint(1, 3)]
+    def _generate_row_values(self, start, stop, genotypes=True):
+        """
+        Generates the values of a block of VCF rows.
+
+        All random values for the block are drawn at once as arrays.
+
+        Args:
+            start (int): Index of the first row in the block.
+            stop (int): Index after the last row in the block.
+            genotypes (bool, optional): Draw the genotype codes, allele counts and
+                FORMAT draws of the allele frequency and reads models.
+
+        Returns:
+            RowValues: The values of the rows.
+        """
+        positions = self._get_positions(start, stop)
+        ref_indexes = self._row_field("ref", start, stop)
+        alt_shifts = self._row_field("alt", start, stop)
+        vids = self._row_field("id", start, stop)
+        quals = self._row_field("qual", start, stop)
+
+        num_alleles, variant_types, indel_lengths, indel_bases = (
+            self._generate_variant_types(start, stop)
+        )
+
+        rotations = genotype_codes = allele_counts = None
+        if self.genotype_model == GenotypeModel.ALLELE_FREQUENCY:
+            if genotypes:
+                genotype_codes, allele_counts = self._generate_genotypes(
+                    start, stop, num_alleles
+                )
         else:
-            alt = self.alleles[ref_index - self.random.randint(1, 3)]
-        qual = f"{self.random.randint(10, 100)}"
-        filt = self.random.choice(["PASS"])
-        info = f"DP=10;AF=0.5;NS={self.num_samples}"
-        if self.large_format:
-            fmt = "GT:AD:DP:GQ:PL"
+            # Every row rotates the sample list a random step from the previous row
+            rotations = self._row_field("rotation", start, stop)
+        format_draws = None
+        if self.draws_format and genotypes:
+            format_draws = self._row_field("format", start, stop)
+
+        alleles = self.alleles
+        if self.reference_data is not None:
+            ref_bases = vcf_reference.get_ref_at_positions(
+                self.reference_data, positions - 1
+            )
+            # Use the reference base for the alt allele if it is one of the alleles
+            ref_allele_indexes = ALLELE_INDEXES[ref_bases]
+            ref_indexes = np.where(
+                ref_allele_indexes >= 0, ref_allele_indexes, ref_indexes
+            )
+            refs = ref_bases.tobytes().decode("ascii")
         else:
-            fmt = "GT"
+            refs = [alleles[ref_index] for ref_index in ref_indexes.tolist()]
+        alts = [alleles[i] for i in ((ref_indexes - alt_shifts) % 4).tolist()]
+        if (num_alleles > 2).any() or (variant_types != SNV).any():
+            refs, alts = self._variant_alleles(
+                positions,
+                refs,
+                alts,
+                ref_indexes,
+                alt_shifts,
+                num_alleles,
+                variant_types,
+                indel_lengths,
+                indel_bases,
+            )
 
-        # Generate random values for each sample by rotating the sample list randomly
-        max_rotation = (
-            int(self.num_samples / 10) if self.num_samples >= 10 else self.num_samples
+        return RowValues(
+            positions=positions,
+            ids=vids,
+            refs=refs,
+            alts=alts,
+            quals=quals,
+            rotations=rotations,
+            genotype_codes=genotype_codes,
+            allele_counts=allele_counts,
+            num_alleles=num_alleles,
+            format_draws=format_draws,
         )
-        self.available_samples.rotate(self.random.randint(1, max_rotation))
-        samples = self.available_samples.copy()
 
-        row = (
-            "\t".join((self.chromosome, pos, vid, ref, alt, qual, filt, info, fmt))
-            + "\t"
+    def _generate_variant_types(self, start, stop):
+        """
+        Draws the nr of alleles and the type of the variants of a block of sites.
+
+        Each kind of value is only drawn if its rate is set, so the rows are the
+        same as without multi-allelic sites and indels when the rates are 0.
+
+        Args:
+            start (int): Index of the first row in the block.
+            stop (int): Index after the last row in the block.
+
+        Returns:
+            tuple: The nr of alleles of each site including the reference, the
+                type of each variant (SNV, INSERTION or DELETION), the length of
+                each indel and MAX_INDEL_LENGTH ASCII bases for each indel. The
+                indel values are None without indels.
+        """
+        num_rows = stop - start
+        num_alleles = np.full(num_rows, 2, dtype=np.int64)
+        if self.multiallelic_rate:
+            draws = self._row_field("multiallelic", start, stop)
+            multiallelic = draws < self.multiallelic_rate
+            # Multi-allelic sites have 2 to MAX_ALLELES - 1 alt alleles
+            num_alleles[multiallelic] = 3 + (
+                draws[multiallelic] / self.multiallelic_rate * (MAX_ALLELES - 2)
+            ).astype(np.int64)
+        variant_types = np.full(num_rows, SNV, dtype=np.int8)
+        if self.insertion_rate or self.deletion_rate:
+            draws = self._row_field("variant_type", start, stop)
+            variant_types[draws < self.deletion_rate + self.insertion_rate] = INSERTION
+            variant_types[draws < self.deletion_rate] = DELETION
+            indel_lengths = self._row_field("indel_length", start, stop)
+            indel_bases = ALLELE_CODES[self._row_field("indel_bases", start, stop)]
+            return num_alleles, variant_types, indel_lengths, indel_bases
+        return num_alleles, variant_types, None, None
+
+    def _variant_alleles(
+        self,
+        positions,
+        refs,
+        alts,
+        ref_indexes,
+        alt_shifts,
+        num_alleles,
+        variant_types,
+        indel_lengths,
+        indel_bases,
+    ):
+        """
+        Builds the alleles of the multi-allelic sites and indels of a block.
+
+        Insertions add bases after the reference base, deletions remove the bases
+        after it, taken from the reference if there is one. The alt alleles after
+        the first one substitute the first base of REF with the other bases.
+
+        Args:
+            positions (np.ndarray): The positions of the rows.
+            refs (Sequence[str]): The single base REF of each row.
+            alts (Sequence[str]): The single base alt allele of each row.
+            ref_indexes (np.ndarray): Index in ALLELES of the REF of each row.
+            alt_shifts (np.ndarray): Shift from the REF to the alt allele, 1 to 3.
+            num_alleles (np.ndarray): The nr of alleles of each row.
+            variant_types (np.ndarray): The variant type of each row.
+            indel_lengths (np.ndarray or None): The length of each indel.
+            indel_bases (np.ndarray or None): The inserted or deleted ASCII bases of
+                each indel, deletions get the bases of the reference if there is
+                one.
+
+        Returns:
+            tuple[list[str], list[str]]: The REF and ALT column of each row.
+        """
+        refs, alts = list(refs), list(alts)
+        deletions = np.flatnonzero(variant_types == DELETION)
+        if self.reference_data is not None and len(deletions):
+            # The deleted bases of all deletions are fetched in one call
+            reference_length = len(self.reference_data)
+            deleted_positions = positions[deletions][:, np.newaxis] + np.arange(
+                MAX_INDEL_LENGTH
+            )
+            deleted_bases = vcf_reference.get_ref_at_positions(
+                self.reference_data,
+                np.minimum(deleted_positions, reference_length - 1).ravel(),
+            ).reshape(len(deletions), MAX_INDEL_LENGTH)
+            indel_bases[deletions] = deleted_bases
+            # Deletions can't go past the end of the reference, a deletion at its
+            # last base is an SNV
+            indel_lengths[deletions] = np.minimum(
+                indel_lengths[deletions], reference_length - positions[deletions]
+            )
+            variant_types = np.where(
+                (variant_types == DELETION) & (indel_lengths < 1), SNV, variant_types
+            )
+
+        for row in np.flatnonzero((num_alleles > 2) | (variant_types != SNV)).tolist():
+            ref = refs[row]
+            variant_type = variant_types[row]
+            if variant_type != SNV:
+                bases = indel_bases[row, : indel_lengths[row]].tobytes().decode("ascii")
+                if variant_type == INSERTION:
+                    alts[row] = ref + bases
+                else:
+                    ref = refs[row] = ref + bases
+                    alts[row] = ref[0]
+            row_alts = [alts[row]]
+            alt_shift = int(alt_shifts[row])
+            for _ in range(num_alleles[row] - 2):
+                alt_shift = alt_shift % 3 + 1
+                row_alts.append(
+                    self.alleles[(ref_indexes[row] - alt_shift) % 4] + ref[1:]
+                )
+            alts[row] = ",".join(row_alts)
+        return refs, alts
+
+    def _generate_genotypes(self, start, stop, num_alleles):
+        """
+        Draws the genotypes of a block of sites from an alt allele frequency per site.
+
+        Every site has at least one alt allele, a site without any gets it for the
+        allele with the lowest draw. The alt alleles of multi-allelic sites are
+        split evenly between their alts.
+
+        Args:
+            start (int): Index of the first row in the block.
+            stop (int): Index after the last row in the block.
+            num_alleles (np.ndarray): The nr of alleles of each site.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The index in sample_values of the genotype
+                of each row and sample, and the count of each alt allele of each
+                row, max_alleles - 1 counts per row.
+        """
+        num_rows = stop - start
+        allele_frequencies = self._row_field("allele_frequency", start, stop)
+        draws = self._row_field("genotype", start, stop)
+        alleles = (draws < allele_frequencies[:, np.newaxis, np.newaxis]).view(np.int8)
+        allele_counts = alleles.sum(axis=(1, 2), dtype=np.int64)
+        monomorphic = np.flatnonzero(allele_counts == 0)
+        site_alleles = alleles.reshape(num_rows, -1)
+        site_alleles[
+            monomorphic, draws.reshape(num_rows, -1)[monomorphic].argmin(axis=1)
+        ] = 1
+
+        alt_draws = None
+        if self.max_alleles > 2:
+            alt_draws = self._row_field("alt_allele", start, stop)
+        return self._genotype_codes(alleles, alt_draws, num_alleles)
+
+    def genotype_code_chunks(self, start, stop, num_alleles, samples_chunk_size):
+        """
+        Draws the genotype codes of a block of sites in chunks of samples.
+
+        The codes are those of the allele frequency model for the same rows, but
+        the draws of each chunk of samples are made on their own, so a block is
+        never held for all samples. The sites that get their alt allele from their
+        lowest draw are found first, drawing only the rows without an alt allele
+        in the chunks before, which are few after the first chunk.
+
+        Args:
+            start (int): Index of the first row in the block.
+            stop (int): Index after the last row in the block.
+            num_alleles (np.ndarray): The nr of alleles of each site.
+            samples_chunk_size (int): Nr of samples per chunk.
+
+        Yields:
+            np.ndarray: The index in sample_values of the genotype of each row and
+                sample of the next chunk of samples.
+        """
+        rows = np.arange(start, stop)
+        allele_frequencies = self._row_field("allele_frequency", start, stop)
+        sample_starts = range(0, self.num_samples, samples_chunk_size)
+        first_draws = None
+        # The rows without an alt allele in the chunks so far, their lowest draw
+        # and its index among the draws of all samples of the row
+        monomorphic = np.arange(len(rows))
+        lowest_draws = np.full(len(rows), np.inf, dtype=np.float32)
+        lowest_indexes = np.zeros(len(rows), dtype=np.int64)
+        for sample_start in sample_starts:
+            if not len(monomorphic):
+                break
+            sample_stop = min(sample_start + samples_chunk_size, self.num_samples)
+            draws = self._sample_row_field(
+                "genotype", rows[monomorphic], sample_start, sample_stop
+            ).reshape(len(monomorphic), -1)
+            if first_draws is None:
+                first_draws = draws
+            has_alt = (draws < allele_frequencies[monomorphic, np.newaxis]).any(axis=1)
+            chunk_indexes = draws.argmin(axis=1)
+            chunk_lowest = draws[np.arange(len(monomorphic)), chunk_indexes]
+            lower = chunk_lowest < lowest_draws[monomorphic]
+            lowest_draws[monomorphic[lower]] = chunk_lowest[lower]
+            lowest_indexes[monomorphic[lower]] = 2 * sample_start + chunk_indexes[lower]
+            monomorphic = monomorphic[~has_alt]
+
+        for sample_start in sample_starts:
+            sample_stop = min(sample_start + samples_chunk_size, self.num_samples)
+            if sample_start == 0:
+                draws = first_draws.reshape(len(rows), -1, 2)
+            else:
+                draws = self._sample_row_field(
+                    "genotype", rows, sample_start, sample_stop
+                )
+            alleles = (draws < allele_frequencies[:, np.newaxis, np.newaxis]).view(
+                np.int8
+            )
+            site_alleles = alleles.reshape(len(rows), -1)
+            chunk_indexes = lowest_indexes[monomorphic] - 2 * sample_start
+            in_chunk = (chunk_indexes >= 0) & (chunk_indexes < site_alleles.shape[1])
+            site_alleles[monomorphic[in_chunk], chunk_indexes[in_chunk]] = 1
+
+            alt_draws = None
+            if self.max_alleles > 2:
+                alt_draws = self._sample_row_field(
+                    "alt_allele", rows, sample_start, sample_stop
+                )
+            yield self._genotype_codes(alleles, alt_draws, num_alleles)[0]
+
+    def _sample_row_field(self, field, rows, sample_start, sample_stop):
+        """
+        Draws the values of a row field drawn for every sample, for some rows and
+        a range of samples.
+
+        The stream of the window of each row is advanced to the first sample of
+        the range, so the values are those of the same rows and samples drawn by
+        _row_field without drawing the other samples.
+
+        Args:
+            field (str): One of SAMPLE_ROW_FIELDS.
+            rows (np.ndarray): Indexes of the rows, in increasing order.
+            sample_start (int): Index of the first sample.
+            sample_stop (int): Index after the last sample.
+
+        Returns:
+            np.ndarray: The values of each row and sample.
+        """
+        values = np.empty((len(rows), sample_stop - sample_start, 2), dtype=np.float32)
+        window = rng = None
+        for row_values, row in zip(values, rows.tolist()):
+            row_window, window_row = divmod(row, ROW_WINDOW_ROWS)
+            if row_window != window:
+                window = row_window
+                rng = window_rng(self._row_field_seeds[field], window)
+                drawn = 0
+            first = window_row * self.num_samples + sample_start
+            rng.bit_generator.advance(first - drawn)
+            rng.random(out=row_values, dtype=np.float32)
+            drawn = first + len(row_values)
+        return values
+
+    def _genotype_codes(self, alleles, alt_draws, num_alleles):
+        """
+        Gets the genotype codes of the alleles drawn for some rows and samples.
+
+        Args:
+            alleles (np.ndarray): 1 for each alt allele of each row and sample.
+            alt_draws (np.ndarray or None): The draws of which alt allele each alt
+                allele is, None without multi-allelic sites.
+            num_alleles (np.ndarray): The nr of alleles of each row.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The index in sample_values of the genotype
+                of each row and sample, and the count of each alt allele of each
+                row, max_alleles - 1 counts per row.
+        """
+        site_num_alleles = 2
+        if alt_draws is not None:
+            alleles = alleles * (
+                1
+                + (alt_draws * (num_alleles - 1)[:, np.newaxis, np.newaxis]).astype(
+                    np.int8
+                )
+            )
+            allele_counts = np.stack(
+                [
+                    (alleles == allele).sum(axis=(1, 2), dtype=np.int64)
+                    for allele in range(1, self.max_alleles)
+                ],
+                axis=1,
+            )
+            # The codes of the genotypes of each nr of alleles start at their offset
+            site_num_alleles = num_alleles.astype(np.int8)[:, np.newaxis]
+            offsets = np.array(
+                [self.sample_value_offsets.get(n, 0) for n in range(MAX_ALLELES + 1)],
+                dtype=np.int8,
+            )[site_num_alleles]
+        else:
+            allele_counts = alleles.sum(axis=(1, 2), dtype=np.int64)[:, np.newaxis]
+            offsets = 0
+
+        genotype_codes = offsets + genotype_index(
+            alleles[:, :, 0], alleles[:, :, 1], site_num_alleles, self.phased
         )
-        row += "\t".join(samples) + "\n"
+        return genotype_codes, allele_counts
 
-        self.current_pos += 1
+    def row_infos(self, row_values):
+        """
+        Gets the INFO column of each row.
 
-        return row
+        Args:
+            row_values (RowValues): The values of the rows.
+
+        Returns:
+            list[str]: The INFO column of each row.
+        """
+        if row_values.allele_counts is None:
+            if self.max_alleles == 2:
+                return [self.info] * len(row_values.positions)
+            return [
+                self._rotation_infos[num_alleles]
+                for num_alleles in row_values.num_alleles.tolist()
+            ]
+        total_alleles = 2 * self.num_samples
+        if self.max_alleles == 2:
+            return [
+                f"DP=10;AF={allele_count / total_alleles:.4g};AC={allele_count};"
+                f"AN={total_alleles};NS={self.num_samples}"
+                for allele_count in row_values.allele_counts[:, 0].tolist()
+            ]
+        return [
+            f"DP=10;AF={','.join(f'{count / total_alleles:.4g}' for count in counts)};"
+            f"AC={','.join(str(count) for count in counts)};"
+            f"AN={total_alleles};NS={self.num_samples}"
+            for counts in (
+                allele_counts[: num_alleles - 1]
+                for allele_counts, num_alleles in zip(
+                    row_values.allele_counts.tolist(), row_values.num_alleles.tolist()
+                )
+            )
+        ]
+
+    def _row_fragments(self, row_values):
+        """
+        Renders VCF rows from their values as encoded fragments.
+
+        Each row is its fixed columns, a memoryview of its sample columns in the
+        encoded samples and a newline, so the cost of a row does not depend on the
+        number of samples until the fragments are joined or written. The sample
+        columns of rows wider than SAMPLE_CHUNK_SIZE samples with the allele
+        frequency model are rendered a chunk of samples at a time as the fragments
+        are iterated over.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+
+        Yields:
+            bytes or memoryview: The fragments of the rows in order.
+        """
+        for position, vid, ref, alt, qual, info, sample_columns in zip(
+            row_values.positions.tolist(),
+            row_values.ids.tolist(),
+            row_values.refs,
+            row_values.alts,
+            row_values.quals.tolist(),
+            self.row_infos(row_values),
+            self._sample_columns(row_values),
+        ):
+            row_start = (
+                f"{self.chromosome}\t{position}\trs{vid}\t{ref}\t{alt}\t{qual}\t"
+            )
+            yield f"{row_start}PASS\t{info}\t{self.format}\t".encode("utf-8")
+            if isinstance(sample_columns, memoryview):
+                yield sample_columns
+            else:
+                yield from sample_columns
+            yield b"\n"
+
+    def _sample_columns(self, row_values):
+        """
+        Gets the encoded sample columns of each row, without a tab or newline at the
+        end.
+
+        The rows with the same nr of alleles share the encoded samples the columns
+        are slices of.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+
+        Returns:
+            list[memoryview or Iterator[memoryview]]: The sample columns of each
+                row, in chunks for wide rows with the allele frequency model or
+                drawn FORMAT values.
+        """
+        num_rows = len(row_values.positions)
+        sample_columns = [None] * num_rows
+        for num_alleles in self.sample_value_offsets:
+            if self.max_alleles == 2:
+                rows = np.arange(num_rows)
+            else:
+                rows = np.flatnonzero(row_values.num_alleles == num_alleles)
+            if row_values.format_draws is not None:
+                if self.num_samples > SAMPLE_CHUNK_SIZE:
+                    for row in rows.tolist():
+                        sample_columns[row] = self._format_column_chunks(
+                            row_values, row, num_alleles
+                        )
+                    continue
+                alleles, format_values = self.sample_format_values(
+                    row_values, rows, num_alleles
+                )
+                text, row_sizes = vcf_format.render_sample_columns(
+                    alleles, format_values, self.phased
+                )
+                samples = memoryview(text)
+                sample_stops = np.cumsum(row_sizes)
+                sample_starts = sample_stops - row_sizes
+                sample_stops -= 1
+            elif row_values.genotype_codes is None:
+                doubled_samples, sample_offsets = self._doubled_samples[num_alleles]
+                samples = memoryview(doubled_samples)
+                rotations = row_values.rotations[rows]
+                # Row i has the samples from num_samples - rotation of the doubled
+                # samples, leaving out the tab after its last sample
+                sample_starts = sample_offsets[self.num_samples - rotations]
+                sample_stops = sample_offsets[2 * self.num_samples - rotations] - 1
+            elif self.num_samples > SAMPLE_CHUNK_SIZE:
+                for row in rows.tolist():
+                    sample_columns[row] = self._sample_column_chunks(
+                        self._sample_value_tables[num_alleles],
+                        row_values.genotype_codes[row],
+                        self.sample_value_offsets[num_alleles],
+                    )
+                continue
+            else:
+                sample_value_table = self._sample_value_tables[num_alleles]
+                samples = memoryview(
+                    sample_value_table[
+                        row_values.genotype_codes[rows]
+                        - self.sample_value_offsets[num_alleles]
+                    ].tobytes()
+                )
+                row_width = self.num_samples * sample_value_table.shape[1]
+                sample_starts = np.arange(len(rows)) * row_width
+                sample_stops = sample_starts + row_width - 1
+            for row, sample_start, sample_stop in zip(
+                rows.tolist(), sample_starts.tolist(), sample_stops.tolist()
+            ):
+                sample_columns[row] = samples[sample_start:sample_stop]
+        return sample_columns
+
+    def sample_format_values(
+        self, row_values, rows, num_alleles, sample_start=0, sample_stop=None
+    ):
+        """
+        Draws the FORMAT values of a range of samples of rows from their genotypes,
+        with the reads FORMAT model.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+            rows (np.ndarray): Index of each row in the block, all with num_alleles
+                alleles.
+            num_alleles (int): Nr of alleles of the rows.
+            sample_start (int, optional): Index of the first sample. Defaults to 0.
+            sample_stop (int, optional): Index after the last sample. Defaults to
+                num_samples.
+
+        Returns:
+            tuple[np.ndarray, vcf_format.FormatValues]: The two alleles of the
+                genotype of each row and sample and their FORMAT values.
+        """
+        if sample_stop is None:
+            sample_stop = self.num_samples
+        if row_values.genotype_codes is None:
+            # Row i has the samples from num_samples - rotation of the doubled
+            # samples
+            alleles = self._doubled_sample_alleles[
+                (self.num_samples - row_values.rotations[rows])[:, np.newaxis]
+                + np.arange(sample_start, sample_stop)
+            ]
+        else:
+            alleles = self._value_alleles[
+                row_values.genotype_codes[rows, sample_start:sample_stop]
+            ]
+        return alleles, vcf_format.draw_format_values(
+            alleles,
+            row_values.format_draws[rows, sample_start:sample_stop],
+            num_alleles,
+        )
+
+    def _format_column_chunks(self, row_values, row, num_alleles):
+        """
+        Renders the sample columns of a row from drawn FORMAT values,
+        SAMPLE_CHUNK_SIZE samples at a time, without the tab at the end.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+            row (int): Index of the row in the block.
+            num_alleles (int): Nr of alleles of the row.
+
+        Yields:
+            memoryview: The sample columns of the next chunk of samples.
+        """
+        for start in range(0, self.num_samples, SAMPLE_CHUNK_SIZE):
+            stop = min(start + SAMPLE_CHUNK_SIZE, self.num_samples)
+            alleles, format_values = self.sample_format_values(
+                row_values, np.array([row]), num_alleles, start, stop
+            )
+            chunk = memoryview(
+                vcf_format.render_sample_columns(alleles, format_values, self.phased)[0]
+            )
+            yield chunk if stop < self.num_samples else chunk[:-1]
+
+    def _sample_column_chunks(self, sample_value_table, genotype_codes, offset):
+        """
+        Renders the sample columns of a row from the genotype codes of its samples,
+        SAMPLE_CHUNK_SIZE samples at a time, without the tab at the end.
+
+        Args:
+            sample_value_table (np.ndarray): The encoded sample values of the nr of
+                alleles of the row.
+            genotype_codes (np.ndarray): The index in sample_values of the genotype
+                of each sample.
+            offset (int): Index in sample_values of the first value of the table.
+
+        Yields:
+            memoryview: The sample columns of the next chunk of samples.
+        """
+        for start in range(0, self.num_samples, SAMPLE_CHUNK_SIZE):
+            chunk = memoryview(
+                sample_value_table[
+                    genotype_codes[start : start + SAMPLE_CHUNK_SIZE] - offset
+                ].tobytes()
+            )
+            yield chunk if start + SAMPLE_CHUNK_SIZE < self.num_samples else chunk[:-1]
+
+    def _render_vcf_rows(self, row_values):
+        """
+        Renders VCF rows from their values.
+
+        Args:
+            row_values (RowValues): The values of the rows.
+
+        Returns:
+            list[str]: The rendered rows.
+        """
+        rows = b"".join(self._row_fragments(row_values)).decode("utf-8").split("\n")
+        return [row + "\n" for row in rows[:-1]]
+
+    def _window_positions(self, window):
+        """
+        Generates the sorted, unique positions of a window of rows.
+
+        The rows of window w get positions in their own range starting after
+        w * ROW_WINDOW_ROWS * POSITION_SPACING, so the positions are sorted
+        and unique across windows too.
+
+        Args:
+            window (int): Index of the window.
+
+        Returns:
+            np.ndarray: The positions of the rows in the window.
+        """
+        start_row = window * ROW_WINDOW_ROWS
+        window_rows = min(ROW_WINDOW_ROWS, self.num_rows - start_row)
+        rng = window_rng(self._position_seed, window)
+        return (
+            np.sort(
+                rng.choice(
+                    window_rows * POSITION_SPACING, size=window_rows, replace=False
+                )
+            )
+            + start_row * POSITION_SPACING
+            + 1
+            + self.position_offset
+        )
+
+    def _get_positions(self, start, stop):
+        """
+        Gets the positions of a range of rows, generating their windows as needed.
+
+        Args:
+            start (int): Index of the first row.
+            stop (int): Index after the last row.
+
+        Returns:
+            np.ndarray: The positions of the rows.
+        """
+        position_chunks = []
+        for window in range(
+            start // ROW_WINDOW_ROWS, (stop - 1) // ROW_WINDOW_ROWS + 1
+        ):
+            if self._position_window[0] != window:
+                self._position_window = (window, self._window_positions(window))
+            window_start = window * ROW_WINDOW_ROWS
+            position_chunks.append(
+                self._position_window[1][
+                    max(start - window_start, 0) : stop - window_start
+                ]
+            )
+        if len(position_chunks) == 1:
+            return position_chunks[0]
+        return np.concatenate(position_chunks)
 
     def _setup_reference_data(self):
 
@@ -276,10 +1639,14 @@ class VirtualVCF:
         """
         Generates VCF data.
         """
-        if self.rows_remaining == self.num_rows + 1:
+        if self._header_pending:
             vcf_row = self._generate_vcf_header()
         else:
-            vcf_row = self._generate_vcf_row()
+            if not self._pending_rows:
+                self._pending_rows.extend(
+                    self._render_vcf_rows(self._next_row_values())
+                )
+            vcf_row = self._pending_rows.popleft()
         return vcf_row
 
     def __enter__(self):
@@ -0,0 +1,337 @@
+"""Per-sample FORMAT values drawn from simulated reads, rendered without Python loops.
+
+The read depth of each sample and site is drawn from a negative binomial
+distribution and the reads are split over the alleles of the genotype of the
+sample, with a few read errors for homozygous samples. The genotype likelihoods
+follow from the allele depths, so AD, DP, GQ and PL all agree with the genotype.
+The draws are turned into values by inverse transform sampling from precomputed
+distributions and the values are formatted as ASCII digits with array operations.
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from functools import lru_cache
+
+import numpy as np
+
+# The read depth is drawn from a negative binomial distribution with this mean and
+# size, depths above MAX_DEPTH are cut off
+MEAN_DEPTH = 30
+DEPTH_DISPERSION = 8
+MAX_DEPTH = 250
+# Fraction of the reads that show another allele than the one they were read from
+READ_ERROR_RATE = 0.01
+# GQ is capped like by GATK
+MAX_GENOTYPE_QUALITY = 99
+# Nr of bins of the guide tables used to draw from the distributions
+GUIDE_SIZE = 1024
+
+ASCII_ZERO = ord("0")
+
+
+class FormatValues(NamedTuple):
+    """
+    The AD, DP, GQ and PL values of the samples of rows with the same nr of
+    alleles, each array with a row and a sample axis first.
+    """
+
+    allele_depths: np.ndarray
+    depths: np.ndarray
+    genotype_qualities: np.ndarray
+    likelihoods: np.ndarray
+
+
+def guide_table(cdf: np.ndarray) -> np.ndarray:
+    """
+    Finds where the inverse of each distribution starts for GUIDE_SIZE evenly
+    spaced bins of draws.
+
+    Args:
+        cdf (np.ndarray): Cumulative distributions, one per row, each ending in 1.
+
+    Returns:
+        np.ndarray: The index of the first value above the start of each bin, for
+            each distribution.
+    """
+    bin_starts = np.arange(GUIDE_SIZE) / GUIDE_SIZE
+    return np.stack(
+        [np.searchsorted(row, bin_starts, side="right") for row in cdf]
+    ).astype(np.intp)
+
+
+def inverse_cdf(
+    cdf: np.ndarray, guide: np.ndarray, rows: np.ndarray, draws: np.ndarray
+) -> np.ndarray:
+    """
+    Draws values by inverse transform sampling, the smallest value of each draw
+    with a cumulative probability above the draw.
+
+    The guide table gives a value at or below the drawn value, it is stepped up
+    until it is the drawn value, which takes no step for most draws.
+
+    Args:
+        cdf (np.ndarray): Cumulative distributions, one per row.
+        guide (np.ndarray): The guide table of the distributions.
+        rows (np.ndarray): Distribution of each draw.
+        draws (np.ndarray): A uniform draw in [0, 1) for each value.
+
+    Returns:
+        np.ndarray: The drawn values.
+    """
+    flat_cdf = cdf.ravel()
+    offsets = rows * cdf.shape[1]
+    values = guide[rows, (draws * GUIDE_SIZE).astype(np.intp)]
+    below = np.flatnonzero(flat_cdf[offsets + values] <= draws)
+    while len(below):
+        values[below] += 1
+        below = below[flat_cdf[offsets[below] + values[below]] <= draws[below]]
+    return values
+
+
+@lru_cache(maxsize=None)
+def depth_distribution() -> tuple:
+    """
+    Gets the cumulative distribution of the read depth of a sample, from 0 to
+    MAX_DEPTH reads, and its guide table.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The distribution as a single row and its
+            guide table.
+    """
+    success = DEPTH_DISPERSION / (DEPTH_DISPERSION + MEAN_DEPTH)
+    depths = np.arange(MAX_DEPTH)
+    # pmf(k + 1) = pmf(k) * (k + r) / (k + 1) * (1 - p)
+    ratios = (depths + DEPTH_DISPERSION) / (depths + 1) * (1 - success)
+    cdf = np.cumsum(
+        success**DEPTH_DISPERSION * np.concatenate([[1.0], np.cumprod(ratios)])
+    )
+    cdf[-1] = 1.0
+    return cdf[np.newaxis], guide_table(cdf[np.newaxis])
+
+
+def binomial_cdf(probability: float) -> np.ndarray:
+    """
+    Gets the cumulative binomial distributions of the nr of reads of an allele out
+    of 0 to MAX_DEPTH reads.
+
+    Args:
+        probability (float): Probability that a read is of the allele.
+
+    Returns:
+        np.ndarray: The distribution for n reads in row n, MAX_DEPTH + 1 counts.
+    """
+    num_reads = np.arange(MAX_DEPTH + 1)[:, np.newaxis]
+    counts = np.arange(MAX_DEPTH + 1)
+    # pmf(k + 1) = pmf(k) * (n - k) / (k + 1) * p / (1 - p)
+    ratios = (
+        np.clip(num_reads - counts[:-1], 0, None)
+        / (counts[:-1] + 1)
+        * (probability / (1 - probability))
+    )
+    pmf = (1 - probability) ** num_reads * np.concatenate(
+        [np.ones((MAX_DEPTH + 1, 1)), np.cumprod(ratios, axis=1)], axis=1
+    )
+    return np.where(counts >= num_reads, 1.0, np.cumsum(pmf, axis=1))
+
+
+@lru_cache(maxsize=None)
+def read_count_distributions() -> tuple:
+    """
+    Gets the distributions of the nr of reads of the other allele of a sample.
+
+    Row n is the nr of error reads of a homozygous sample with n reads, row
+    MAX_DEPTH + 1 + n the nr of reads of the second allele of a heterozygous one.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The cumulative distributions and their guide
+            table.
+    """
+    cdf = np.concatenate([binomial_cdf(READ_ERROR_RATE), binomial_cdf(0.5)])
+    return cdf, guide_table(cdf)
+
+
+@lru_cache(maxsize=None)
+def read_log_probabilities(num_alleles: int) -> np.ndarray:
+    """
+    Gets the log10 probability of a read of each allele for each unphased
+    genotype, in the order of the PL values.
+
+    Args:
+        num_alleles (int): Nr of alleles of the site.
+
+    Returns:
+        np.ndarray: The probabilities with shape (alleles, genotypes).
+    """
+    genotypes = [(low, high) for high in range(num_alleles) for low in range(high + 1)]
+    copies = (
+        np.array(
+            [
+                [(allele == low) + (allele == high) for low, high in genotypes]
+                for allele in range(num_alleles)
+            ]
+        )
+        / 2
+    )
+    return np.log10(
+        copies * (1 - READ_ERROR_RATE)
+        + (1 - copies) * READ_ERROR_RATE / (num_alleles - 1)
+    )
+
+
+def draw_format_values(
+    alleles: np.ndarray, draws: np.ndarray, num_alleles: int
+) -> FormatValues:
+    """
+    Draws the FORMAT values of samples from reads of their genotypes.
+
+    The reads of a heterozygous sample are split binomially between its alleles,
+    the reads of a homozygous sample show another allele with READ_ERROR_RATE. The
+    likelihoods are made relative to the genotype of the sample, so its PL is 0 and
+    GQ is the PL of the next most likely genotype.
+
+    Args:
+        alleles (np.ndarray): The two alleles of the genotype of each row and
+            sample, with shape (rows, samples, 2).
+        draws (np.ndarray): Two uniform draws in [0, 1) for each row and sample,
+            for the depth and the split of the reads.
+        num_alleles (int): Nr of alleles of the rows.
+
+    Returns:
+        FormatValues: The values of the samples.
+    """
+    first = alleles[..., 0].astype(np.intp)
+    second = alleles[..., 1].astype(np.intp)
+    heterozygous = first != second
+    depths = inverse_cdf(
+        *depth_distribution(),
+        np.zeros(first.size, dtype=np.intp),
+        draws[..., 0].ravel(),
+    ).reshape(first.shape)
+    other_reads = inverse_cdf(
+        *read_count_distributions(),
+        (depths + heterozygous * (MAX_DEPTH + 1)).ravel(),
+        draws[..., 1].ravel(),
+    ).reshape(first.shape)
+    # Read errors of homozygous samples show the reference, or the first alt allele
+    # for homozygous reference samples, so the other allele is never the first one
+    other_alleles = np.where(heterozygous, second, first == 0)
+    allele_depths = np.zeros(first.shape + (num_alleles,), dtype=np.intp)
+    flat_depths = allele_depths.reshape(-1)
+    sample_starts = np.arange(0, allele_depths.size, num_alleles).reshape(first.shape)
+    flat_depths[sample_starts + first] = depths - other_reads
+    flat_depths[sample_starts + other_alleles] = other_reads
+
+    log_likelihoods = allele_depths @ read_log_probabilities(num_alleles)
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    called = (high * (high + 1) // 2 + low)[..., np.newaxis]
+    likelihoods = np.rint(
+        -10 * (log_likelihoods - np.take_along_axis(log_likelihoods, called, axis=-1))
+    ).clip(min=0)
+    likelihoods = likelihoods.astype(np.intp)
+    # A column at a time, reductions over the few genotypes of a sample are slow
+    genotype_qualities = np.full(first.shape, MAX_GENOTYPE_QUALITY, dtype=np.intp)
+    for genotype in range(likelihoods.shape[-1]):
+        np.minimum(
+            genotype_qualities,
+            np.where(
+                called[..., 0] == genotype,
+                MAX_GENOTYPE_QUALITY,
+                likelihoods[..., genotype],
+            ),
+            out=genotype_qualities,
+        )
+    return FormatValues(
+        allele_depths=allele_depths,
+        depths=depths,
+        genotype_qualities=genotype_qualities,
+        likelihoods=likelihoods,
+    )
+
+
+@lru_cache(maxsize=None)
+def digit_table(separator: str, width: int) -> np.ndarray:
+    """
+    Gets the ASCII digits of the integers below 10**width, each after a separator.
+
+    The text of each integer is padded with NUL bytes to the size of an unsigned
+    integer, so formatting an integer is a single gather of one item.
+
+    Args:
+        separator (str): The character before the digits.
+        width (int): Nr of digits of the largest integer.
+
+    Returns:
+        np.ndarray: The separator and digits of each integer right aligned, viewed
+            as unsigned integers of 2, 4 or 8 bytes.
+    """
+    item_size = next(size for size in (2, 4, 8) if size > width)
+    return np.frombuffer(
+        b"".join(
+            f"{separator}{value}".rjust(item_size, "\0").encode("ascii")
+            for value in range(10**width)
+        ),
+        dtype=f"u{item_size}",
+    )
+
+
+def integer_lists(values: np.ndarray, separator: str) -> np.ndarray:
+    """
+    Formats lists of non-negative integers as comma separated ASCII digits.
+
+    The integers are formatted with the digit table of the width of the largest
+    integer, the NUL bytes padding them are left out when the text is packed.
+
+    Args:
+        values (np.ndarray): The integers, the lists along the last axis.
+        separator (str): The character before each list.
+
+    Returns:
+        np.ndarray: The text of each list as uint8, padded with NUL bytes.
+    """
+    width = len(str(int(values.max(initial=0))))
+    return np.concatenate(
+        [
+            digit_table(separator, width)[values[..., :1]],
+            digit_table(",", width)[values[..., 1:]],
+        ],
+        axis=-1,
+    ).view(np.uint8)
+
+
+def render_sample_columns(
+    alleles: np.ndarray, format_values: FormatValues, phased: bool
+) -> tuple:
+    """
+    Renders the GT:AD:DP:GQ:PL sample columns of rows, each sample followed by a
+    tab.
+
+    The columns of all samples are laid out in fixed width slots padded with NUL
+    bytes, one boolean index of the bytes that are not NUL packs the text.
+
+    Args:
+        alleles (np.ndarray): The two alleles of each row and sample.
+        format_values (FormatValues): The FORMAT values of the samples.
+        phased (bool): The genotypes are phased.
+
+    Returns:
+        tuple[bytes, np.ndarray]: The sample columns of the rows one after
+            another and the nr of bytes of each row.
+    """
+    separator = np.full(alleles.shape[:2] + (1,), ord("|" if phased else "/"))
+    text = np.concatenate(
+        [
+            (alleles[..., :1] + ASCII_ZERO).astype(np.uint8),
+            separator.astype(np.uint8),
+            (alleles[..., 1:] + ASCII_ZERO).astype(np.uint8),
+            integer_lists(format_values.allele_depths, ":"),
+            integer_lists(format_values.depths[..., np.newaxis], ":"),
+            integer_lists(format_values.genotype_qualities[..., np.newaxis], ":"),
+            integer_lists(format_values.likelihoods, ":"),
+            np.full(alleles.shape[:2] + (1,), ord("\t"), dtype=np.uint8),
+        ],
+        axis=-1,
+    )
+    mask = text != 0
+    return text[mask].tobytes(), mask.sum(axis=(1, 2))
@@ -0,0 +1,153 @@
+"""Gathered writes of many small byte fragments to files and pipes."""
+
+from __future__ import annotations
+
+import io
+import os
+
+# Fragments are collected until there are about this many bytes and then written
+# with one system call.
+GATHER_BYTES = 4 * 1024 * 1024
+
+# Max nr of buffers passed to a single writev call
+IOV_MAX = 1024
+if hasattr(os, "sysconf"):
+    try:
+        IOV_MAX = max(16, os.sysconf("SC_IOV_MAX"))
+    except (OSError, ValueError):  # pragma: no cover
+        pass
+
+
+def file_descriptor(file) -> int | None:
+    """
+    Gets the file descriptor of a binary file for writing to it with os.writev.
+
+    Args:
+        file: The opened binary file.
+
+    Returns:
+        int or None: The file descriptor, None if the file has no descriptor or
+            writev is not available.
+    """
+    if not hasattr(os, "writev"):  # pragma: no cover
+        return None
+    try:
+        return file.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return None
+
+
+class GatherWriter:
+    """
+    Writes byte fragments to a binary file, gathering them into large writes.
+
+    The fragments, like the memoryviews of the sample columns of the rows, are not
+    copied into a buffer. Files with a file descriptor get all pending fragments in
+    one os.writev call, other files in one write of the joined fragments.
+    """
+
+    def __init__(self, file, close_file: bool = True, gather_bytes=GATHER_BYTES):
+        """
+        Initialize GatherWriter object.
+
+        Args:
+            file: Opened binary file to write to, e.g. sys.stdout.buffer.
+            close_file (bool): Close the file when the writer is closed. Defaults to
+                True.
+            gather_bytes (int): Nr of bytes to gather before writing them.
+        """
+        self.file = file
+        self.close_file = close_file
+        self.gather_bytes = gather_bytes
+        self._fd = file_descriptor(file)
+        self._fragments = []
+        self._pending_bytes = 0
+        self._offset = 0
+        # Data the file object may already hold in its own buffer goes first
+        file.flush()
+
+    def write(self, data: bytes) -> None:
+        """
+        Writes data to the file.
+
+        Args:
+            data (bytes): Data to write.
+        """
+        self.writelines([data])
+
+    def writelines(self, fragments) -> None:
+        """
+        Writes byte fragments to the file in order.
+
+        The fragments are written as soon as gather_bytes are gathered, so an
+        iterator over many fragments is never held at once.
+
+        Args:
+            fragments (Iterable[bytes or memoryview]): The fragments, they must not
+                change until they are flushed.
+        """
+        for fragment in fragments:
+            self._fragments.append(fragment)
+            self._pending_bytes += len(fragment)
+            if self._pending_bytes >= self.gather_bytes:
+                self.flush()
+
+    def tell(self) -> int:
+        """
+        Returns the offset of the next write.
+        """
+        return self._offset + self._pending_bytes
+
+    def flush(self) -> None:
+        """
+        Writes all gathered fragments to the file.
+        """
+        fragments = [fragment for fragment in self._fragments if len(fragment)]
+        if fragments:
+            if self._fd is None:
+                self.file.write(b"".join(fragments))
+                self.file.flush()
+            else:
+                self._writev(fragments)
+        self._offset += self._pending_bytes
+        self._fragments = []
+        self._pending_bytes = 0
+
+    def _writev(self, fragments: list) -> None:
+        """
+        Writes fragments with os.writev, continuing after partial writes.
+
+        Args:
+            fragments (list[bytes or memoryview]): Non-empty fragments to write.
+        """
+        while fragments:
+            written = os.writev(self._fd, fragments[:IOV_MAX])
+            num_written = 0
+            while num_written < len(fragments) and written >= len(
+                fragments[num_written]
+            ):
+                written -= len(fragments[num_written])
+                num_written += 1
+            fragments = fragments[num_written:]
+            if written:
+                fragments[0] = memoryview(fragments[0])[written:]
+
+    def close(self) -> None:
+        """
+        Writes all gathered fragments and closes the file if the writer owns it.
+        """
+        self.flush()
+        if self.close_file:
+            self.file.close()
+
+    def __enter__(self):
+        """
+        Enters the context.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exits the context and closes the writer.
+        """
+        self.close()
@@ -1,52 +1,672 @@
+from __future__ import annotations
+
+import re
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-import tqdm
+import numpy as np
+
+from fake_vcf.vcf_arrow import (
+    ArrowVcfWriter,
+    GenotypeLayout,
+    arrow_blocks,
+    is_arrow_path,
+)
+from fake_vcf.vcf_bcf import (
+    bcf_fragment_blocks,
+    check_bcf_position,
+    parse_header_dictionaries,
+)
+from fake_vcf.vcf_bgzf import (
+    BGZF_EOF,
+    DEFAULT_COMPRESS_LEVEL,
+    BgzfBlockOffsets,
+    BgzfWriter,
+)
+from fake_vcf.vcf_faker import (
+    POSITION_SPACING,
+    FormatModel,
+    GenotypeModel,
+    VirtualVCF,
+    contig_vcf_args,
+)
+from fake_vcf.vcf_gather import GatherWriter
+from fake_vcf.vcf_index import IndexFormat, VcfIndexer, index_path
+from fake_vcf.vcf_metrics import MetricsReporter
+from fake_vcf.vcf_pipeline import BlockPipeline, format_stage_times, sum_stages
+from fake_vcf.vcf_reference import read_sequence_lengths
+from fake_vcf.vcf_zarr import (
+    DEFAULT_SAMPLES_CHUNK_SIZE,
+    DEFAULT_VARIANTS_CHUNK_SIZE,
+    is_zarr_path,
+    to_zarr_store,
+)
+
+# Output file suffixes written with BGZF compression
+COMPRESSED_SUFFIXES = (".gz", ".bcf")
+
+# Chromosome name selecting all contigs of the reference
+ALL_CONTIGS = "all"
+
+# A region like chr1:1,000,000-2,000,000, the positions are optional
+REGION_PATTERN = re.compile(
+    r"(?P<chromosome>[^:]+)(?::(?P<start>[\d,]+)(?:-(?P<end>[\d,]+))?)?"
+)
+
+
+def resolve_contigs(chromosomes, reference_dir_path=None) -> dict:
+    """
+    Resolves the chromosomes to generate and their lengths.
+
+    Args:
+        chromosomes (str or list[str]): The chromosomes in output order, "all" for
+            all contigs of the reference.
+        reference_dir_path (Path or None): Path to imported reference data, used for
+            the contig lengths.
+
+    Returns:
+        dict[str, int or None]: The contigs and their lengths, None if unknown.
+
+    Raises:
+        ValueError: If all contigs are requested without a reference or a
+            chromosome is given more than once.
+    """
+    if isinstance(chromosomes, str):
+        chromosomes = [chromosomes]
+    sequence_lengths = (
+        read_sequence_lengths(reference_dir_path) if reference_dir_path else {}
+    )
+    if ALL_CONTIGS in chromosomes:
+        if not reference_dir_path:
+            raise ValueError("All contigs can only be generated with a reference")
+        return sequence_lengths
+    if len(set(chromosomes)) != len(chromosomes):
+        raise ValueError("Each chromosome can only be generated once")
+    return {chromosome: sequence_lengths.get(chromosome) for chromosome in chromosomes}
+
+
+def parse_region(region: str) -> tuple:
+    """
+    Parses a region of a chromosome like chr1:1000000-2000000.
+
+    The positions are 1-based and inclusive and may have thousands separators.
+    Without an end the region goes to the end of the chromosome and without
+    positions it is the whole chromosome.
+
+    Args:
+        region (str): The region.
+
+    Returns:
+        tuple[str, int, int]: The chromosome and the first and last position.
+
+    Raises:
+        ValueError: If the region can't be parsed or ends before it starts.
+    """
+    match = REGION_PATTERN.fullmatch(region.strip())
+    if match is None:
+        raise ValueError(f"Invalid region {region}, expected chr:start-end")
+    start, end = (
+        None if value is None else int(value.replace(",", ""))
+        for value in match.group("start", "end")
+    )
+    start = 1 if start is None else start
+    end = sys.maxsize if end is None else end
+    if start < 1 or end < start:
+        raise ValueError(f"Invalid region {region}, it has no positions")
+    return match.group("chromosome"), start, end
+
+
+def _open_vcf_file(
+    fake_vcf_path: Path,
+    compressed: bool,
+    compress_level: int = DEFAULT_COMPRESS_LEVEL,
+    compress_threads: int = 1,
+):
+    """
+    Opens a VCF file for writing, bgzip compressed if compressed is set.
+
+    Args:
+        fake_vcf_path (Path): Path to the fake VCF file.
+        compressed (bool): Compress the file with bgzip.
+        compress_level (int): zlib compression level 0-9.
+        compress_threads (int): Nr of compression threads.
+
+    Returns:
+        The opened file.
+    """
+    if compressed:
+        return BgzfWriter(
+            fake_vcf_path, compress_level=compress_level, threads=compress_threads
+        )
+    return GatherWriter(open(fake_vcf_path, "wb"))
+
+
+def to_std_out(virtual_vcf: VirtualVCF, metrics: MetricsReporter | None = None) -> None:
+    """
+    Writes VirtualVCF data to standard output, the writes overlapping the
+    generation of the next rows.
+
+    Args:
+        virtual_vcf (VirtualVCF): VirtualVCF object containing the data.
+        metrics (MetricsReporter, optional): Reporter of the progress.
+    """
+    sys.stdout.flush()
+    with virtual_vcf as v_vcf, GatherWriter(
+        sys.stdout.buffer, close_file=False
+    ) as stdout, BlockPipeline(stdout) as pipeline:
+        for num_rows, num_bytes in _written_blocks(v_vcf, pipeline):
+            if metrics is not None:
+                metrics.update(num_rows, num_bytes, stages=pipeline.stages)
+
 
-from fake_vcf.vcf_faker import VirtualVCF
+def _vcf_blocks(virtual_vcf: VirtualVCF, bcf: bool):
+    """
+    Iterates over the VirtualVCF data as encoded VCF text or BCF blocks, each block
+    as an iterator of byte fragments.
+
+    Args:
+        virtual_vcf (VirtualVCF): VirtualVCF object containing the data.
+        bcf (bool): Encode the data as BCF.
+    """
+    if bcf:
+        return bcf_fragment_blocks(virtual_vcf)
+    return virtual_vcf.fragment_blocks()
 
 
-def to_std_out(virtual_vcf: VirtualVCF) -> None:
+def _create_indexer(
+    virtual_vcf: VirtualVCF, index_format: IndexFormat, bcf: bool, max_position: int
+) -> VcfIndexer:
     """
-    Writes VirtualVCF data to standard output.
+    Creates the indexer of the output of a VirtualVCF.
 
     Args:
         virtual_vcf (VirtualVCF): VirtualVCF object containing the data.
+        index_format (IndexFormat): Format of the index.
+        bcf (bool): The data is encoded as BCF.
+        max_position (int): Max position of the whole output.
+    """
+    return VcfIndexer(
+        index_format=index_format,
+        max_position=max_position,
+        bcf_contigs=(
+            list(parse_header_dictionaries(virtual_vcf.header)[1]) if bcf else None
+        ),
+    )
+
+
+def _write_fragments(
+    output_file,
+    fragments,
+    indexer: VcfIndexer | None = None,
+    header: bool = False,
+) -> None:
     """
-    with virtual_vcf as v_vcf:
-        for line in v_vcf:
-            sys.stdout.write(line)
+    Writes the fragments of a block, joining them if the block is indexed.
+
+    Args:
+        output_file: Opened BgzfWriter, GatherWriter or BlockPipeline to write to.
+        fragments (Iterable[bytes or memoryview]): The fragments of the block.
+        indexer (VcfIndexer, optional): Indexer to add the block to.
+        header (bool): The block is the header, which has no records to index.
+    """
+    if indexer is None or header:
+        output_file.writelines(fragments)
+        return
+    block = b"".join(fragments)
+    indexer.add_block(block, output_file.tell())
+    output_file.write(block)
 
 
-def to_vcf_file(virtual_vcf: VirtualVCF, fake_vcf_path: Path, num_rows: int) -> None:
+def _written_blocks(
+    virtual_vcf: VirtualVCF,
+    pipeline: BlockPipeline,
+    bcf: bool = False,
+    indexer: VcfIndexer | None = None,
+):
     """
-    Writes VirtualVCF data to a VCF file.
+    Writes the VirtualVCF data block by block to a pipeline.
+
+    Args:
+        virtual_vcf (VirtualVCF): VirtualVCF object containing the data.
+        pipeline (BlockPipeline): Pipeline to write to.
+        bcf (bool): Encode the data as BCF.
+        indexer (VcfIndexer, optional): Indexer to add the written blocks to.
+
+    Yields:
+        tuple[int, int]: Nr of rows and bytes of each written block, for the
+            progress. The header has no rows.
+    """
+    rows_remaining = virtual_vcf.rows_remaining
+    for block, fragments in enumerate(_vcf_blocks(virtual_vcf, bcf=bcf)):
+        header = block == 0 and virtual_vcf.include_header
+        offset = pipeline.tell()
+        _write_fragments(pipeline, fragments, indexer, header=header)
+        num_rows = 0 if header else rows_remaining - virtual_vcf.rows_remaining
+        yield num_rows, pipeline.tell() - offset
+        rows_remaining = virtual_vcf.rows_remaining
+
+
+def _write_blocks(
+    virtual_vcf: VirtualVCF,
+    output_file,
+    num_rows: int,
+    bcf: bool = False,
+    indexer: VcfIndexer | None = None,
+    metrics: MetricsReporter | None = None,
+) -> BlockPipeline:
+    """
+    Writes the VirtualVCF data block by block while updating a progress bar.
+
+    The blocks are written through a BlockPipeline, so the next blocks are
+    generated while the ones before them are compressed and written. The progress
+    is updated once per block.
+
+    Args:
+        virtual_vcf (VirtualVCF): VirtualVCF object containing the data.
+        output_file: Opened file to write to.
+        num_rows (int): Number of rows.
+        bcf (bool): Encode the data as BCF.
+        indexer (VcfIndexer, optional): Indexer to add the written blocks to, the
+            output file has to be a BgzfWriter.
+        metrics (MetricsReporter, optional): Reporter of the progress.
+
+    Returns:
+        BlockPipeline: The closed pipeline, with the times of its stages.
+    """
+    import tqdm
+
+    with tqdm.tqdm(total=num_rows) as pbar, BlockPipeline(output_file) as pipeline:
+        for block_rows, block_bytes in _written_blocks(
+            virtual_vcf, pipeline, bcf=bcf, indexer=indexer
+        ):
+            pbar.update(block_rows)
+            if metrics is not None:
+                metrics.update(block_rows, block_bytes, stages=pipeline.stages)
+    return pipeline
+
+
+def to_vcf_file(
+    virtual_vcf: VirtualVCF,
+    fake_vcf_path: Path,
+    num_rows: int,
+    compress_level: int = DEFAULT_COMPRESS_LEVEL,
+    compress_threads: int = 1,
+    index_format: IndexFormat | None = None,
+    metrics: MetricsReporter | None = None,
+) -> None:
+    """
+    Writes VirtualVCF data to a VCF file, or a BCF file if the suffix is .bcf.
 
     Args:
         virtual_vcf (VirtualVCF): VirtualVCF object containing the data.
         fake_vcf_path (Path): Path to the fake VCF file.
         num_rows (int): Number of rows.
+        compress_level (int): zlib compression level 0-9 for bgzip output.
+        compress_threads (int): Nr of compression threads for bgzip output.
+        index_format (IndexFormat, optional): Index the bgzipped output while
+            writing it, the index is written next to the file.
+        metrics (MetricsReporter, optional): Reporter of the progress.
+    """
+    print(f"Writing to file {fake_vcf_path}")
+
+    bcf = fake_vcf_path.suffix == ".bcf"
+    if bcf:
+        check_bcf_position(virtual_vcf.max_position)
+    compressed = fake_vcf_path.suffix in COMPRESSED_SUFFIXES
+    print("(Using compression)" if compressed else "(No compression)")
+
+    indexer = None
+    if index_format is not None:
+        indexer = _create_indexer(
+            virtual_vcf,
+            index_format=index_format,
+            bcf=bcf,
+            max_position=virtual_vcf.max_position,
+        )
+
+    with _open_vcf_file(
+        fake_vcf_path,
+        compressed=compressed,
+        compress_level=compress_level,
+        compress_threads=compress_threads,
+    ) as vcf_file, virtual_vcf as v_vcf:
+        pipeline = _write_blocks(
+            virtual_vcf=v_vcf,
+            output_file=vcf_file,
+            num_rows=num_rows,
+            bcf=bcf,
+            indexer=indexer,
+            metrics=metrics,
+        )
+
+    if indexer is not None:
+        indexer.write(index_path(fake_vcf_path, index_format), vcf_file.block_offsets)
+        print(f"Index written to {index_path(fake_vcf_path, index_format)}")
+
+    print(format_stage_times(pipeline.stages()))
+    print(f"Done, data written to {fake_vcf_path}")
+
+
+def to_arrow_file(
+    virtual_vcfs: list,
+    fake_vcf_path: Path,
+    num_rows: int,
+    genotype_layout: GenotypeLayout = GenotypeLayout.LONG,
+    metrics: MetricsReporter | None = None,
+) -> None:
+    """
+    Writes VirtualVCF data to a Parquet (.parquet) or Arrow IPC (.arrow) file.
+
+    The row values are written as columns without rendering any VCF text.
+
+    Args:
+        virtual_vcfs (list[VirtualVCF]): VirtualVCF objects containing the data in
+            output order, all with the same samples.
+        fake_vcf_path (Path): Path to the .parquet or .arrow file.
+        num_rows (int): Number of rows.
+        genotype_layout (GenotypeLayout): A list of genotypes per variant (long)
+            or a genotype column per sample (wide).
+        metrics (MetricsReporter, optional): Reporter of the progress.
     """
+    import tqdm
+
     print(f"Writing to file {fake_vcf_path}")
+    print(f"(Columnar output, {GenotypeLayout(genotype_layout).value} genotypes)")
+
+    with ArrowVcfWriter(
+        fake_vcf_path, virtual_vcfs[0], layout=genotype_layout
+    ) as arrow_file, tqdm.tqdm(total=num_rows) as pbar:
+        for virtual_vcf in virtual_vcfs:
+            with virtual_vcf as v_vcf:
+                for row_values in arrow_blocks(v_vcf):
+                    arrow_file.write(row_values, chromosome=v_vcf.chromosome)
+                    pbar.update(len(row_values.positions))
+                    if metrics is not None:
+                        metrics.update(len(row_values.positions))
+
+    print(f"Done, data written to {fake_vcf_path}")
+
+
+def shard_bounds(num_rows: int, num_shards: int) -> list:
+    """
+    Splits the rows in contiguous shards of (almost) equal size.
+
+    Args:
+        num_rows (int): Number of rows.
+        num_shards (int): Number of shards.
+
+    Returns:
+        list[tuple[int, int]]: Start and stop row of each shard.
+    """
+    num_shards = max(1, min(num_shards, num_rows))
+    bounds = [num_rows * shard // num_shards for shard in range(num_shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def plan_shards(
+    vcf_args: dict, num_rows: int, workers: int, region: tuple | None = None
+) -> list:
+    """
+    Splits the rows in contiguous shards, in output order.
+
+    The rows are split over the contigs in vcf_args by contig length and each
+    contig is split in shards so the workers get about the same nr of rows. Each
+    shard is a range of rows of its contig, so the output is the same for any nr of
+    workers.
+
+    Args:
+        vcf_args (dict): Arguments for VirtualVCF for the whole output, without
+            num_rows.
+        num_rows (int): Number of rows.
+        workers (int): Number of worker processes.
+        region (tuple[str, int, int], optional): Only generate the rows of a
+            chromosome with positions from the first to the last position of the
+            region.
+
+    Returns:
+        list[dict]: The VirtualVCF arguments of each shard.
+
+    Raises:
+        ValueError: If the chromosome of the region has no rows.
+    """
+    vcf_args = dict(vcf_args)
+    if vcf_args.get("random_seed") is None:
+        # All shards have to share the seed for the samples
+        vcf_args["random_seed"] = int(np.random.SeedSequence().generate_state(1)[0])
+
+    contig_ranges = []
+    for _, _, contig_args in contig_vcf_args(vcf_args, num_rows):
+        if region is None:
+            contig_ranges.append((contig_args, 0, contig_args["num_rows"]))
+        elif contig_args["chromosome"] == region[0]:
+            contig_ranges.append(
+                (contig_args, *VirtualVCF(**contig_args).region_rows(*region[1:]))
+            )
+    if not contig_ranges:
+        raise ValueError(f"No rows are generated for {region[0]}")
+    range_rows = sum(stop - start for _, start, stop in contig_ranges)
+
+    shards = []
+    for contig_args, start, stop in contig_ranges:
+        num_shards = max(1, round(workers * (stop - start) / max(range_rows, 1)))
+        for shard_start, shard_stop in shard_bounds(stop - start, num_shards):
+            shards.append(
+                {
+                    **contig_args,
+                    "start_row": start + shard_start,
+                    "stop_row": start + shard_stop,
+                    "include_header": not shards,
+                }
+            )
+    return shards
+
+
+def _generate_shard(
+    shard_path: Path,
+    vcf_args: dict,
+    compressed: bool,
+    compress_args: dict,
+    bcf: bool = False,
+    index_args: dict | None = None,
+) -> tuple:
+    """
+    Generates one shard in a worker process and writes it to its own file.
+
+    Args:
+        shard_path (Path): Path to write the shard to.
+        vcf_args (dict): Arguments for the VirtualVCF of the shard.
+        compressed (bool): Compress the shard.
+        compress_args (dict): Compression level and threads.
+        bcf (bool): Encode the shard as BCF.
+        index_args (dict, optional): Index format and max position of the whole
+            output to index the compressed shard.
+
+    Returns:
+        tuple[Path, tuple[VcfIndexer, BgzfBlockOffsets] or None, int,
+            list[StageTimer]]: Path to the written shard, its index and blocks if it
+            is indexed, its nr of rows and the times of the stages writing it.
+    """
+    shard_index = None
+    num_rows = 0
+    with _open_vcf_file(
+        shard_path, compressed=compressed, **compress_args
+    ) as shard_file, VirtualVCF(**vcf_args) as v_vcf, BlockPipeline(
+        shard_file
+    ) as pipeline:
+        indexer = None
+        if index_args is not None:
+            indexer = _create_indexer(v_vcf, bcf=bcf, **index_args)
+        for block_rows, _ in _written_blocks(v_vcf, pipeline, bcf=bcf, indexer=indexer):
+            num_rows += block_rows
+    if indexer is not None:
+        shard_index = (indexer, shard_file.block_offsets)
+    return shard_path, shard_index, num_rows, pipeline.stages()
+
+
+def _append_shard(output_file, shard_path: Path) -> None:
+    """
+    Appends a written shard to the output, leaving out any BGZF end of file marker
+    so the BGZF blocks of all shards form one file.
+
+    Args:
+        output_file: Opened binary file to write to.
+        shard_path (Path): Path to the shard.
+    """
+    shard_size = shard_path.stat().st_size
+    with open(shard_path, "rb") as shard_file:
+        if shard_size >= len(BGZF_EOF):
+            shard_file.seek(shard_size - len(BGZF_EOF))
+            if shard_file.read() == BGZF_EOF:
+                shard_size -= len(BGZF_EOF)
+            shard_file.seek(0)
+        while shard_size > 0:
+            chunk = shard_file.read(min(shard_size, 1 << 22))
+            output_file.write(chunk)
+            shard_size -= len(chunk)
+
 
-    if fake_vcf_path.suffix == ".gz":
-        print("(Using compression)")
-        try:
-            from Bio import bgzf as compressor
-        except ImportError:  # pragma: no cover
-            print("Biopython not installed, falling back to gzip instead of bgzip")
-            import gzip as compressor
-
-        with compressor.open(fake_vcf_path, "wt") as gz_file, virtual_vcf as v_vcf:
-            for line in tqdm.tqdm(v_vcf, total=num_rows + 1):
-                gz_file.write(line)
-    else:
-        print("(No compression)")
-        with open(
-            fake_vcf_path, "w", encoding="utf-8"
-        ) as txt_file, virtual_vcf as v_vcf:
-            for line in tqdm.tqdm(v_vcf, total=num_rows + 1):
-                txt_file.write(line)
+def _join_shards(
+    output_file, shard_futures, metrics: MetricsReporter | None = None
+) -> tuple | None:
+    """
+    Appends the shards to the output in order as they are finished.
+
+    Args:
+        output_file: Opened binary file to write to.
+        shard_futures: Futures of the shards in order.
+        metrics (MetricsReporter, optional): Reporter of the progress, updated
+            with the rows, bytes and stage times of each joined shard.
+
+    Returns:
+        tuple[VcfIndexer, BgzfBlockOffsets] or None: The index and blocks of the
+            output if the shards are indexed.
+    """
+    indexer = None
+    block_offsets = BgzfBlockOffsets()
+    shard_stages = []
+    for shard_future in shard_futures:
+        shard_path, shard_index, num_rows, stages = shard_future.result()
+        _append_shard(output_file, shard_path)
+        shard_path.unlink()
+        shard_stages.append(stages)
+        if metrics is not None:
+            metrics.update(
+                num_rows,
+                stages[0].num_bytes,
+                stages=lambda: sum_stages(shard_stages),
+            )
+        if shard_index is not None:
+            shard_indexer, shard_block_offsets = shard_index
+            if indexer is None:
+                indexer = shard_indexer
+            else:
+                indexer.merge(shard_indexer, block_offsets.uncompressed_size)
+            block_offsets.extend(shard_block_offsets)
+    if indexer is None:
+        return None
+    return indexer, block_offsets
+
+
+def to_sharded_output(
+    vcf_args: dict,
+    fake_vcf_path: Path | None,
+    workers: int,
+    compress_level: int = DEFAULT_COMPRESS_LEVEL,
+    compress_threads: int = 1,
+    index_format: IndexFormat | None = None,
+    region: tuple | None = None,
+    metrics: MetricsReporter | None = None,
+) -> None:
+    """
+    Generates the VCF data in contiguous shards on several worker processes and
+    joins the shards in order.
+
+    Each shard generates a range of rows of its contig without the rows before it,
+    so the same seed gives the same output for any number of workers. Compressed
+    shards are joined by concatenating their BGZF blocks. With several contigs in
+    vcf_args the contigs are generated concurrently and joined in order.
+
+    Args:
+        vcf_args (dict): Arguments for VirtualVCF for the whole file.
+        fake_vcf_path (Path or None): Path to the fake VCF file or None to write to
+            standard output.
+        workers (int): Number of worker processes.
+        compress_level (int): zlib compression level 0-9 for bgzip output.
+        compress_threads (int): Nr of compression threads per worker for bgzip
+            output.
+        index_format (IndexFormat, optional): Index the bgzipped output, each
+            shard is indexed while it is written and the indexes are merged.
+        region (tuple[str, int, int], optional): Only write the rows of a region,
+            see parse_region.
+        metrics (MetricsReporter, optional): Reporter of the progress.
+    """
+    vcf_args = dict(vcf_args)
+    num_rows = vcf_args.pop("num_rows")
+    shards = plan_shards(vcf_args, num_rows, workers, region=region)
+    bcf = fake_vcf_path is not None and fake_vcf_path.suffix == ".bcf"
+    if bcf:
+        check_bcf_position(
+            max(shard_args["num_rows"] for shard_args in shards) * POSITION_SPACING
+        )
+    compressed = (
+        fake_vcf_path is not None and fake_vcf_path.suffix in COMPRESSED_SUFFIXES
+    )
+    if fake_vcf_path is not None:
+        print(f"Writing to file {fake_vcf_path}")
+        print("(Using compression)" if compressed else "(No compression)")
+        print(
+            f"Generating {sum(s['stop_row'] - s['start_row'] for s in shards)} rows"
+            f" in {len(shards)} shards"
+        )
+
+    shard_dir = fake_vcf_path.parent if fake_vcf_path is not None else None
+    with tempfile.TemporaryDirectory(dir=shard_dir) as tmp_dir, ProcessPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        shard_futures = [
+            executor.submit(
+                _generate_shard,
+                shard_path=Path(tmp_dir) / f"shard_{shard:05d}.vcf",
+                compressed=compressed,
+                bcf=bcf,
+                index_args=(
+                    None
+                    if index_format is None
+                    else {
+                        "index_format": index_format,
+                        "max_position": num_rows * POSITION_SPACING,
+                    }
+                ),
+                compress_args={
+                    "compress_level": compress_level,
+                    "compress_threads": compress_threads,
+                },
+                vcf_args=shard_args,
+            )
+            for shard, shard_args in enumerate(shards)
+        ]
+
+        if fake_vcf_path is None:
+            sys.stdout.flush()
+            _join_shards(sys.stdout.buffer, shard_futures, metrics=metrics)
+            sys.stdout.buffer.flush()
+            return
+
+        import tqdm
+
+        with open(fake_vcf_path, "wb") as output_file:
+            output_index = _join_shards(
+                output_file, tqdm.tqdm(shard_futures), metrics=metrics
+            )
+            if compressed:
+                output_file.write(BGZF_EOF)
+
+    if output_index is not None:
+        indexer, block_offsets = output_index
+        indexer.write(index_path(fake_vcf_path, index_format), block_offsets)
+        print(f"Index written to {index_path(fake_vcf_path, index_format)}")
 
     print(f"Done, data written to {fake_vcf_path}")
 
@@ -61,34 +681,161 @@ def fake_vcf_data(
     phased,
     large_format,
     reference_dir_path,
+    workers=1,
+    compress_level=DEFAULT_COMPRESS_LEVEL,
+    compress_threads=1,
+    index_format=None,
+    genotype_layout=GenotypeLayout.LONG,
+    variants_chunk_size=DEFAULT_VARIANTS_CHUNK_SIZE,
+    samples_chunk_size=DEFAULT_SAMPLES_CHUNK_SIZE,
+    genotype_model=GenotypeModel.ROTATION,
+    multiallelic_rate=0.0,
+    insertion_rate=0.0,
+    deletion_rate=0.0,
+    region=None,
+    format_model=FormatModel.FIXED,
+    metrics=None,
 ):
     """
     Generates fake VCF data and writes it to either a file or standard output.
 
     Args:
         fake_vcf_path (Path or None): Path to the fake VCF file or None to write to standard output.
+            Files ending with .gz are bgzipped VCF, files ending with .bcf are BCF and files
+            ending with .parquet or .arrow are columnar Parquet or Arrow IPC files. Paths ending
+            with .zarr are written as a VCF Zarr store.
         num_rows (int): Number of rows.
         num_samples (int): Number of samples.
-        chromosome (str): Chromosome identifier.
+        chromosome (str or list[str]): Chromosome identifier, or several chromosomes
+            in output order or "all" for all contigs of the reference. The rows are
+            split over the chromosomes by their length in the reference.
         seed (int): Random seed for reproducibility.
         sample_prefix (str): Prefix for sample names.
         phased (bool): Phased or unphased genotypes.
         large_format (bool): Use large format VCF.
         reference_dir_path (Path or None): Path to imported reference data.
+        workers (int): Number of worker processes generating the data. Defaults to 1.
+        compress_level (int): zlib compression level 0-9 for bgzip output. Defaults to 6.
+        compress_threads (int): Nr of compression threads for bgzip output. Defaults to 1.
+        index_format (IndexFormat, optional): Write a tabix or CSI index of the
+            bgzipped output next to it. Defaults to no index.
+        genotype_layout (GenotypeLayout): Genotype layout of Parquet and Arrow
+            output. Defaults to a list of genotypes per variant.
+        variants_chunk_size (int): Nr of variants per chunk of a Zarr store. Defaults to 10000.
+        samples_chunk_size (int): Nr of samples per chunk of a Zarr store. Defaults to 1000.
+        genotype_model (GenotypeModel): How the genotypes are drawn, the same
+            rotated samples for every row or from an allele frequency per site.
+            Defaults to rotation.
+        multiallelic_rate (float): Fraction of the sites with several alt alleles.
+            Defaults to 0.
+        insertion_rate (float): Fraction of the sites that are insertions. Defaults to 0.
+        deletion_rate (float): Fraction of the sites that are deletions. Defaults to 0.
+        region (str, optional): Only write the rows in a region like
+            chr1:1000000-2000000, the same rows as in the whole output. Defaults to
+            all rows.
+        format_model (FormatModel): How the AD, DP, GQ and PL values of large
+            format VCF and BCF output are generated, fixed values per genotype or
+            drawn from simulated reads for every sample. Defaults to fixed.
+        metrics (MetricsReporter, optional): Reporter of the rows and bytes
+            written, updated once per block. Defaults to no metrics.
+
+    Raises:
+        ValueError: If an index is requested for output that isn't bgzipped, the
+            region is invalid or a region is requested for a Zarr store.
     """
-    virtual_vcf = VirtualVCF(
+    if index_format is not None and (
+        fake_vcf_path is None or fake_vcf_path.suffix not in COMPRESSED_SUFFIXES
+    ):
+        raise ValueError("Only bgzipped output (.gz or .bcf) can be indexed")
+    if region is not None:
+        if is_zarr_path(fake_vcf_path):
+            raise ValueError("A region can't be written to a Zarr store")
+        region = parse_region(region)
+
+    contigs = resolve_contigs(chromosome, reference_dir_path)
+    vcf_args = dict(
         num_rows=num_rows,
         num_samples=num_samples,
-        chromosome=chromosome,
+        chromosome=next(iter(contigs)),
         sample_prefix=sample_prefix,
         random_seed=seed,
         phased=phased,
         large_format=large_format,
         reference_dir=reference_dir_path,
+        genotype_model=genotype_model,
+        multiallelic_rate=multiallelic_rate,
+        insertion_rate=insertion_rate,
+        deletion_rate=deletion_rate,
     )
+    if len(contigs) > 1:
+        vcf_args["contigs"] = contigs
+    # Zarr stores and columnar files only have the genotypes of the samples
+    if not (is_zarr_path(fake_vcf_path) or is_arrow_path(fake_vcf_path)):
+        vcf_args["format_model"] = format_model
+
+    if is_zarr_path(fake_vcf_path):
+        to_zarr_store(
+            vcf_args=vcf_args,
+            store_path=fake_vcf_path,
+            workers=workers,
+            variants_chunk_size=variants_chunk_size,
+            samples_chunk_size=samples_chunk_size,
+            compress_level=compress_level,
+            metrics=metrics,
+        )
+        return
+
+    if is_arrow_path(fake_vcf_path):
+        if workers > 1:
+            print("Parquet and Arrow files are written by a single worker")
+        if len(contigs) > 1 or region is not None:
+            vcf_args.pop("num_rows")
+            virtual_vcfs = [
+                VirtualVCF(**shard_args)
+                for shard_args in plan_shards(
+                    vcf_args, num_rows, workers=1, region=region
+                )
+            ]
+        else:
+            virtual_vcfs = [VirtualVCF(**vcf_args)]
+        to_arrow_file(
+            virtual_vcfs=virtual_vcfs,
+            fake_vcf_path=fake_vcf_path,
+            num_rows=sum(v_vcf.stop_row - v_vcf.start_row for v_vcf in virtual_vcfs),
+            genotype_layout=genotype_layout,
+            metrics=metrics,
+        )
+        return
+
+    if workers > 1 or len(contigs) > 1:
+        to_sharded_output(
+            vcf_args=vcf_args,
+            fake_vcf_path=fake_vcf_path,
+            workers=workers,
+            compress_level=compress_level,
+            compress_threads=compress_threads,
+            index_format=index_format,
+            region=region,
+            metrics=metrics,
+        )
+        return
+
+    if region is not None:
+        vcf_args.pop("num_rows")
+        (vcf_args,) = plan_shards(vcf_args, num_rows, workers=1, region=region)
+        num_rows = vcf_args["stop_row"] - vcf_args["start_row"]
+    virtual_vcf = VirtualVCF(**vcf_args)
 
     if fake_vcf_path is None:
-        to_std_out(virtual_vcf=virtual_vcf)
+        to_std_out(virtual_vcf=virtual_vcf, metrics=metrics)
         return
 
-    to_vcf_file(virtual_vcf=virtual_vcf, fake_vcf_path=fake_vcf_path, num_rows=num_rows)
+    to_vcf_file(
+        virtual_vcf=virtual_vcf,
+        fake_vcf_path=fake_vcf_path,
+        num_rows=num_rows,
+        compress_level=compress_level,
+        compress_threads=compress_threads,
+        index_format=index_format,
+        metrics=metrics,
+    )
@@ -0,0 +1,414 @@
+"""Building tabix (.tbi) and CSI indexes of bgzipped VCF and BCF files while they
+are written."""
+
+from __future__ import annotations
+
+import struct
+
+import numpy as np
+
+from fake_vcf.vcf_bcf import BCF_MAGIC
+from fake_vcf.vcf_bgzf import BgzfBlockOffsets, BgzfWriter
+from fake_vcf.vcf_options import IndexFormat
+
+TBI_MAGIC = b"TBI\x01"
+CSI_MAGIC = b"CSI\x01"
+
+# Size of the smallest bins and of the windows of the linear index is 2^14, the
+# bins have 6 levels. Tabix indexes always use these, CSI indexes add levels for
+# positions past 2^29.
+MIN_SHIFT = 14
+DEPTH = 5
+TBI_MAX_POSITION = 1 << (MIN_SHIFT + 3 * DEPTH)
+
+# Tabix settings for VCF: format, sequence column, begin column, end column,
+# meta character and nr of lines to skip
+TABIX_VCF_CONFIG = (2, 1, 2, 0, ord("#"), 0)
+
+
+def index_path(file_path, index_format: IndexFormat) -> str:
+    """
+    Returns the path of the index of a file.
+    """
+    return f"{file_path}.{IndexFormat(index_format).value}"
+
+
+def index_depth(max_position: int) -> int:
+    """
+    Returns the nr of bin levels below the root bin needed for a max position.
+    """
+    depth = DEPTH
+    while max_position > 1 << (MIN_SHIFT + 3 * depth):
+        depth += 1
+    return depth
+
+
+def level_first_bin(level: int) -> int:
+    """
+    Returns the number of the first bin of a level.
+    """
+    return ((1 << 3 * level) - 1) // 7
+
+
+def region_bins(begins: np.ndarray, ends: np.ndarray, depth: int) -> np.ndarray:
+    """
+    Computes the bins of regions, the smallest bins holding the whole regions.
+
+    Args:
+        begins (np.ndarray): 0-based start of each region.
+        ends (np.ndarray): 0-based end of each region, exclusive.
+        depth (int): Nr of bin levels below the root bin.
+
+    Returns:
+        np.ndarray: The bin of each region.
+    """
+    bins = np.zeros(len(begins), dtype=np.int64)
+    unset = np.ones(len(begins), dtype=bool)
+    lasts = ends - 1
+    for level in range(depth, 0, -1):
+        shift = MIN_SHIFT + 3 * (depth - level)
+        fits = unset & (begins >> shift == lasts >> shift)
+        bins[fits] = level_first_bin(level) + (begins[fits] >> shift)
+        unset &= ~fits
+    return bins
+
+
+class ReferenceIndex:
+    """
+    The bins, linear index and record counts of one sequence of an index.
+
+    All offsets are offsets in the uncompressed data, they are converted to
+    virtual offsets when the index is written.
+    """
+
+    def __init__(self):
+        """
+        Initialize ReferenceIndex object.
+        """
+        self.bins = {}
+        self.linear = {}
+        self.start = None
+        self.end = None
+        self.num_records = 0
+
+    def add_chunk(self, bin_number: int, start: int, end: int) -> None:
+        """
+        Adds a chunk of records to a bin, extending the last chunk of the bin if
+        the chunk follows it.
+        """
+        chunks = self.bins.setdefault(bin_number, [])
+        if chunks and chunks[-1][1] == start:
+            chunks[-1][1] = end
+        else:
+            chunks.append([start, end])
+
+    def merge(self, other: ReferenceIndex) -> None:
+        """
+        Adds the records of an index of records that follow these records.
+        """
+        for bin_number, chunks in other.bins.items():
+            for start, end in chunks:
+                self.add_chunk(bin_number, start, end)
+        for window, offset in other.linear.items():
+            self.linear[window] = min(offset, self.linear.get(window, offset))
+        self.start = other.start if self.start is None else self.start
+        self.end = other.end if other.end is not None else self.end
+        self.num_records += other.num_records
+
+    def shift(self, offset: int) -> None:
+        """
+        Shifts all offsets, for records appended after other data.
+        """
+        for chunks in self.bins.values():
+            for chunk in chunks:
+                chunk[0] += offset
+                chunk[1] += offset
+        self.linear = {window: start + offset for window, start in self.linear.items()}
+        if self.start is not None:
+            self.start += offset
+            self.end += offset
+
+    def linear_index(self) -> list:
+        """
+        Returns the linear index with windows without records set to the offset of
+        the window before them, or after them for the first windows.
+        """
+        if not self.linear:
+            return []
+        linear_index = [None] * (max(self.linear) + 1)
+        for window, offset in self.linear.items():
+            linear_index[window] = offset
+        previous = self.linear[min(self.linear)]
+        for window, offset in enumerate(linear_index):
+            if offset is None:
+                linear_index[window] = previous
+            previous = linear_index[window]
+        return linear_index
+
+
+class VcfIndexer:
+    """
+    Builds a tabix or CSI index from the blocks of a VCF or BCF file as they are
+    written.
+
+    Records have to be added in file order and sorted by position within each
+    sequence, the blocks have to hold whole records.
+    """
+
+    def __init__(
+        self,
+        index_format: IndexFormat = IndexFormat.TBI,
+        max_position: int = 0,
+        bcf_contigs: list | None = None,
+    ):
+        """
+        Initialize VcfIndexer object.
+
+        Args:
+            index_format (IndexFormat, optional): Format of the index. Defaults to TBI.
+            max_position (int, optional): Max position of the records, used to pick
+                the nr of bin levels of CSI indexes.
+            bcf_contigs (list[str], optional): The contigs of the header of a BCF
+                file, the blocks are BCF if given.
+
+        Raises:
+            ValueError: If the max position doesn't fit a tabix index or a BCF file
+                is indexed with tabix.
+        """
+        self.index_format = IndexFormat(index_format)
+        self.bcf = bcf_contigs is not None
+        if self.index_format == IndexFormat.TBI:
+            if self.bcf:
+                raise ValueError("BCF files can only be indexed with CSI")
+            if max_position > TBI_MAX_POSITION:
+                raise ValueError(
+                    f"Max position {max_position} is too large for a tabix index, use CSI"
+                )
+            self.depth = DEPTH
+        else:
+            self.depth = index_depth(max_position)
+        self.references = {contig: ReferenceIndex() for contig in bcf_contigs or []}
+        self._contig_names = list(bcf_contigs or [])
+
+    def add_block(self, block: bytes, offset: int) -> None:
+        """
+        Adds the records of a block.
+
+        Args:
+            block (bytes): The block as written to the file.
+            offset (int): Offset of the block in the uncompressed data.
+        """
+        if self.bcf:
+            records = self._parse_bcf_records(block)
+        else:
+            records = self._parse_vcf_records(block)
+        if not records:
+            return
+
+        contigs, begins, ends, starts = zip(*records)
+        begins = np.array(begins, dtype=np.int64)
+        ends = np.maximum(np.array(ends, dtype=np.int64), begins + 1)
+        starts = np.array(starts, dtype=np.int64) + offset
+        record_ends = np.append(starts[1:], offset + len(block))
+        bins = region_bins(begins, ends, self.depth)
+
+        # Consecutive records in the same bin and sequence form one chunk
+        run_starts = np.flatnonzero(
+            np.append(
+                True,
+                (bins[1:] != bins[:-1])
+                | np.array(
+                    [a != b for a, b in zip(contigs[1:], contigs[:-1])], dtype=bool
+                ),
+            )
+        )
+        run_ends = np.append(run_starts[1:], len(bins))
+        for run_start, run_end in zip(run_starts.tolist(), run_ends.tolist()):
+            reference_index = self.references.get(contigs[run_start])
+            if reference_index is None:
+                reference_index = self.references[contigs[run_start]] = ReferenceIndex()
+            reference_index.add_chunk(
+                int(bins[run_start]),
+                int(starts[run_start]),
+                int(record_ends[run_end - 1]),
+            )
+            if reference_index.start is None:
+                reference_index.start = int(starts[run_start])
+            reference_index.end = int(record_ends[run_end - 1])
+            reference_index.num_records += run_end - run_start
+
+            # Every window a record overlaps gets the offset of the first record
+            # overlapping it, most records overlap a single window.
+            linear = reference_index.linear
+            begin_windows = begins[run_start:run_end] >> MIN_SHIFT
+            end_windows = (ends[run_start:run_end] - 1) >> MIN_SHIFT
+            run_offsets = starts[run_start:run_end]
+            windows, first_records = np.unique(begin_windows, return_index=True)
+            for window, start in zip(
+                windows.tolist(), run_offsets[first_records].tolist()
+            ):
+                linear.setdefault(window, start)
+            for record in np.flatnonzero(end_windows > begin_windows).tolist():
+                for window in range(
+                    int(begin_windows[record]), int(end_windows[record]) + 1
+                ):
+                    linear[window] = min(
+                        int(run_offsets[record]),
+                        linear.get(window, run_offsets[record]),
+                    )
+
+    def merge(self, other: VcfIndexer, offset: int) -> None:
+        """
+        Adds the records of an index of data appended after the indexed data.
+
+        Args:
+            other (VcfIndexer): Index of the appended data.
+            offset (int): Offset of the appended data in the uncompressed data.
+        """
+        for contig, other_reference_index in other.references.items():
+            other_reference_index.shift(offset)
+            reference_index = self.references.get(contig)
+            if reference_index is None:
+                self.references[contig] = other_reference_index
+            else:
+                reference_index.merge(other_reference_index)
+
+    def write(self, file_path, block_offsets: BgzfBlockOffsets) -> None:
+        """
+        Writes the index.
+
+        Args:
+            file_path (str or Path): Path to the index file.
+            block_offsets (BgzfBlockOffsets): The blocks of the indexed file.
+        """
+        virtual_offset = block_offsets.virtual_offset
+        data = [TBI_MAGIC if self.index_format == IndexFormat.TBI else CSI_MAGIC]
+        if self.index_format == IndexFormat.CSI:
+            aux = b"" if self.bcf else self._tabix_header()
+            data.append(struct.pack("<3i", MIN_SHIFT, self.depth, len(aux)) + aux)
+            data.append(struct.pack("<i", len(self.references)))
+        else:
+            data.append(struct.pack("<i", len(self.references)) + self._tabix_header())
+
+        pseudo_bin = level_first_bin(self.depth + 1) + 1
+        for reference_index in self.references.values():
+            linear_index = reference_index.linear_index()
+            bins = []
+            for bin_number, chunks in sorted(reference_index.bins.items()):
+                bin_data = [struct.pack("<I", bin_number)]
+                if self.index_format == IndexFormat.CSI:
+                    bin_data.append(
+                        struct.pack(
+                            "<Q",
+                            virtual_offset(
+                                self._bin_linear_offset(bin_number, linear_index)
+                            ),
+                        )
+                    )
+                bin_data.append(struct.pack("<i", len(chunks)))
+                bin_data.extend(
+                    struct.pack("<2Q", virtual_offset(start), virtual_offset(end))
+                    for start, end in chunks
+                )
+                bins.append(b"".join(bin_data))
+
+            if reference_index.num_records:
+                # The pseudo bin holds the span of the sequence and the nr of records
+                bins.append(
+                    struct.pack(
+                        "<Ii" if self.index_format == IndexFormat.TBI else "<IQi",
+                        *(
+                            (pseudo_bin, 2)
+                            if self.index_format == IndexFormat.TBI
+                            else (pseudo_bin, 0, 2)
+                        ),
+                    )
+                    + struct.pack(
+                        "<4Q",
+                        virtual_offset(reference_index.start),
+                        virtual_offset(reference_index.end),
+                        reference_index.num_records,
+                        0,
+                    )
+                )
+
+            data.append(struct.pack("<i", len(bins)))
+            data.extend(bins)
+            if self.index_format == IndexFormat.TBI:
+                data.append(struct.pack("<i", len(linear_index)))
+                data.append(
+                    struct.pack(
+                        f"<{len(linear_index)}Q",
+                        *(virtual_offset(offset) for offset in linear_index),
+                    )
+                )
+        # Nr of records without a position
+        data.append(struct.pack("<Q", 0))
+
+        with BgzfWriter(file_path) as index_file:
+            index_file.write(b"".join(data))
+
+    def _tabix_header(self) -> bytes:
+        """
+        Encodes the tabix settings and sequence names.
+        """
+        names = b"".join(contig.encode() + b"\x00" for contig in self.references)
+        return (
+            struct.pack("<6i", *TABIX_VCF_CONFIG)
+            + struct.pack("<i", len(names))
+            + names
+        )
+
+    def _bin_linear_offset(self, bin_number: int, linear_index: list) -> int:
+        """
+        Returns the smallest offset of the records overlapping the start of a bin.
+        """
+        level = 0
+        while level < self.depth and bin_number >= level_first_bin(level + 1):
+            level += 1
+        bin_start = (bin_number - level_first_bin(level)) << (
+            MIN_SHIFT + 3 * (self.depth - level)
+        )
+        window = min(bin_start >> MIN_SHIFT, len(linear_index) - 1)
+        return linear_index[window]
+
+    def _parse_vcf_records(self, block: bytes) -> list:
+        """
+        Parses the sequence, begin, end and offset of the VCF rows of a block.
+        """
+        records = []
+        line_start = 0
+        block_size = len(block)
+        while line_start < block_size:
+            line_end = block.find(b"\n", line_start)
+            line_end = block_size if line_end < 0 else line_end + 1
+            if block[line_start] != ord("#"):
+                # Parse only the start of the row up to REF
+                prefix = block[line_start : min(line_end, line_start + 256)]
+                fields = prefix.split(b"\t", 4)
+                if len(fields) < 5:
+                    fields = block[line_start:line_end].split(b"\t", 4)
+                begin = int(fields[1]) - 1
+                records.append(
+                    (fields[0].decode(), begin, begin + len(fields[3]), line_start)
+                )
+            line_start = line_end
+        return records
+
+    def _parse_bcf_records(self, block: bytes) -> list:
+        """
+        Parses the sequence, begin, end and offset of the BCF records of a block.
+        """
+        records = []
+        record_start = 0
+        if block.startswith(BCF_MAGIC):
+            # The header is a block of its own
+            return records
+        contig_names = self._contig_names
+        while record_start < len(block):
+            shared_size, individual_size, contig, begin, length = struct.unpack_from(
+                "<IIiii", block, record_start
+            )
+            records.append((contig_names[contig], begin, begin + length, record_start))
+            record_start += 8 + shared_size + individual_size
+        return records
@@ -0,0 +1,412 @@
+"""Metrics and profiling of long running generate and import-reference commands."""
+
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from enum import Enum
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+# Seconds between the reports written to a metrics file
+DEFAULT_METRICS_INTERVAL = 10.0
+# Nr of functions or allocation sites printed at the end of a profiled command
+PROFILE_TOP_ENTRIES = 25
+# Seconds between the checks of the traced memory for a snapshot close to the peak
+TRACEMALLOC_INTERVAL = 0.05
+# A new snapshot is taken when the traced memory grew this much since the last one
+TRACEMALLOC_SNAPSHOT_GROWTH = 1.1
+# From Python 3.12 a cProfile profile records the calls of all threads
+PROFILE_SEES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class MetricsFormat(str, Enum):
+    """
+    Formats of metrics files.
+
+    JSON appends a JSON object per report, PROMETHEUS rewrites a textfile for the
+    textfile collector of the Prometheus node exporter with each report.
+    """
+
+    JSON = "json"
+    PROMETHEUS = "prometheus"
+
+
+class ProfileMode(str, Enum):
+    """
+    Profilers of a command.
+
+    CPROFILE records the time spent in each function, TRACEMALLOC the memory
+    allocated by each line.
+    """
+
+    CPROFILE = "cprofile"
+    TRACEMALLOC = "tracemalloc"
+
+
+def peak_rss_bytes() -> int | None:
+    """
+    Gets the peak resident set size of the process.
+
+    Returns:
+        int or None: The peak RSS in bytes, None if it can't be measured.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class MetricsReporter:
+    """
+    Writes the progress of a command to a metrics file every interval seconds and
+    when it is done.
+
+    A report has the nr of items done, like rows or bases, and bytes written, their
+    rates, the peak RSS and the time each stage of the writing spent busy and
+    waiting. Updates only check the clock, so they can be made for every block.
+    """
+
+    def __init__(
+        self,
+        metrics_file,
+        metrics_format: MetricsFormat = MetricsFormat.JSON,
+        command: str = "generate",
+        unit: str = "rows",
+        interval: float = DEFAULT_METRICS_INTERVAL,
+    ):
+        """
+        Initialize MetricsReporter object.
+
+        Args:
+            metrics_file (str or Path): Path to the metrics file.
+            metrics_format (MetricsFormat, optional): Format of the metrics file.
+                Defaults to JSON lines.
+            command (str, optional): Name of the command in the reports.
+            unit (str, optional): Name of the items counted, used in the keys and
+                metric names. Defaults to rows.
+            interval (float, optional): Seconds between reports. Defaults to 10.
+
+        Raises:
+            ValueError: If interval is not greater than 0.
+        """
+        if interval <= 0:
+            raise ValueError("Metrics interval must be greater than 0")
+        self.metrics_file = Path(metrics_file)
+        self.metrics_format = MetricsFormat(metrics_format)
+        self.command = command
+        self.unit = unit
+        self.interval = interval
+        self.count = 0
+        self.num_bytes = None
+        self._stages = None
+        self._start_time = time.perf_counter()
+        self._next_report = self._start_time + interval
+        self._json_file = None
+        if self.metrics_format == MetricsFormat.JSON:
+            self._json_file = open(self.metrics_file, "w")
+
+    def update(self, count: int, num_bytes: int | None = None, stages=None) -> None:
+        """
+        Adds the items and bytes of a block and reports them when the interval has
+        passed.
+
+        Args:
+            count (int): Nr of items done.
+            num_bytes (int, optional): Nr of bytes written.
+            stages (Callable[[], list[StageTimer]], optional): Gets the times of
+                the stages, called when a report is written.
+        """
+        self.count += count
+        if num_bytes is not None:
+            self.num_bytes = (self.num_bytes or 0) + num_bytes
+        if stages is not None:
+            self._stages = stages
+        if time.perf_counter() >= self._next_report:
+            self.report()
+
+    def metrics(self, done: bool = False) -> dict:
+        """
+        Gets the metrics so far.
+
+        Args:
+            done (bool): The command is done.
+
+        Returns:
+            dict: The metrics of a report.
+        """
+        elapsed_seconds = time.perf_counter() - self._start_time
+        metrics = {
+            "command": self.command,
+            "time": time.time(),
+            "elapsed_seconds": elapsed_seconds,
+            self.unit: self.count,
+            f"{self.unit}_per_second": self.count / max(elapsed_seconds, 1e-9),
+            "bytes": self.num_bytes,
+            "bytes_per_second": (
+                None
+                if self.num_bytes is None
+                else self.num_bytes / max(elapsed_seconds, 1e-9)
+            ),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": {},
+            "done": done,
+        }
+        for stage in self._stages() if self._stages is not None else []:
+            metrics["stages"][stage.name] = {
+                "busy_seconds": stage.busy_seconds,
+                "wait_seconds": stage.wait_seconds,
+                "bytes": stage.num_bytes,
+            }
+        return metrics
+
+    def report(self, done: bool = False) -> None:
+        """
+        Writes a report to the metrics file.
+
+        Args:
+            done (bool): The command is done.
+        """
+        metrics = self.metrics(done=done)
+        if self._json_file is not None:
+            self._json_file.write(json.dumps(metrics) + "\n")
+            self._json_file.flush()
+        else:
+            self._write_prometheus(metrics)
+        self._next_report = time.perf_counter() + self.interval
+
+    def close(self) -> None:
+        """
+        Writes the last report and closes the metrics file.
+        """
+        if self._next_report is None:
+            return
+        self.report(done=True)
+        self._next_report = None
+        if self._json_file is not None:
+            self._json_file.close()
+
+    def _write_prometheus(self, metrics: dict) -> None:
+        """
+        Rewrites the metrics file in the Prometheus text format.
+
+        The file is written next to the metrics file and renamed, so the node
+        exporter never reads half a file.
+
+        Args:
+            metrics (dict): The metrics of a report.
+        """
+        labels = f'command="{self.command}"'
+        lines = []
+
+        def add_metric(name, metric_type, help_text, values):
+            lines.append(f"# HELP fake_vcf_{name} {help_text}")
+            lines.append(f"# TYPE fake_vcf_{name} {metric_type}")
+            for metric_labels, value in values:
+                if value is not None:
+                    lines.append(f"fake_vcf_{name}{{{metric_labels}}} {value}")
+
+        add_metric(
+            f"{self.unit}_total",
+            "counter",
+            f"Nr of {self.unit} done.",
+            [(labels, metrics[self.unit])],
+        )
+        add_metric(
+            f"{self.unit}_per_second",
+            "gauge",
+            f"Mean nr of {self.unit} per second.",
+            [(labels, metrics[f"{self.unit}_per_second"])],
+        )
+        add_metric(
+            "bytes_total",
+            "counter",
+            "Nr of bytes written.",
+            [(labels, metrics["bytes"])],
+        )
+        add_metric(
+            "bytes_per_second",
+            "gauge",
+            "Mean nr of bytes written per second.",
+            [(labels, metrics["bytes_per_second"])],
+        )
+        add_metric(
+            "elapsed_seconds",
+            "gauge",
+            "Seconds since the command started.",
+            [(labels, metrics["elapsed_seconds"])],
+        )
+        add_metric(
+            "peak_rss_bytes",
+            "gauge",
+            "Peak resident set size of the process.",
+            [(labels, metrics["peak_rss_bytes"])],
+        )
+        for key, help_text in [
+            ("busy_seconds", "Seconds a stage spent working."),
+            ("wait_seconds", "Seconds a stage spent waiting for the other stages."),
+        ]:
+            add_metric(
+                f"stage_{key}",
+                "counter",
+                help_text,
+                [
+                    (f'{labels},stage="{name}"', stage[key])
+                    for name, stage in metrics["stages"].items()
+                ],
+            )
+        add_metric(
+            "done",
+            "gauge",
+            "1 when the command is done.",
+            [(labels, int(metrics["done"]))],
+        )
+
+        tmp_path = self.metrics_file.with_name(self.metrics_file.name + ".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.metrics_file)
+
+    def __enter__(self):
+        """
+        Enters the context.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exits the context and writes the last report.
+        """
+        self.close()
+
+
+def default_profile_path(profile_mode: ProfileMode, command: str) -> Path:
+    """
+    Gets the default path of the profile of a command.
+
+    Args:
+        profile_mode (ProfileMode): The profiler.
+        command (str): Name of the command.
+
+    Returns:
+        Path: fake-vcf-<command>.prof for cProfile, which pstats and snakeviz read,
+            and fake-vcf-<command>.tracemalloc.txt for tracemalloc.
+    """
+    if ProfileMode(profile_mode) == ProfileMode.CPROFILE:
+        return Path(f"fake-vcf-{command}.prof")
+    return Path(f"fake-vcf-{command}.tracemalloc.txt")
+
+
+@contextlib.contextmanager
+def profiled(profile_mode: ProfileMode | None, profile_file=None, command="generate"):
+    """
+    Profiles the code run in the context, the worker processes are not profiled.
+
+    cProfile profiles the calling thread and the threads started in the context,
+    like the writer thread of a BlockPipeline and the compression threads of a
+    BgzfWriter. Before Python 3.12 each thread gets a profile of its own and the
+    profiles of the threads that are done are merged at the end. tracemalloc
+    reports the largest allocations of a snapshot taken close to the peak of the
+    traced memory, checked every TRACEMALLOC_INTERVAL seconds.
+
+    The profile is written to profile_file and its top entries are printed to
+    standard error, standard output may be the generated VCF.
+
+    Args:
+        profile_mode (ProfileMode or None): The profiler, None to not profile.
+        profile_file (str or Path, optional): Where to write the profile, see
+            default_profile_path for the default.
+        command (str): Name of the command, used in the default path.
+    """
+    if profile_mode is None:
+        yield
+        return
+    profile_mode = ProfileMode(profile_mode)
+    if profile_file is None:
+        profile_file = default_profile_path(profile_mode, command)
+
+    if profile_mode == ProfileMode.CPROFILE:
+        thread_profiles = []
+
+        def profile_thread(frame, event, arg):
+            # Called on the first event of a new thread, its own profile takes over
+            thread_profile = cProfile.Profile()
+            thread_profiles.append((threading.current_thread(), thread_profile))
+            thread_profile.enable()
+
+        profile = cProfile.Profile()
+        if not PROFILE_SEES_ALL_THREADS:
+            threading.setprofile(profile_thread)
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            threading.setprofile(None)
+            stats = pstats.Stats(profile)
+            for thread, thread_profile in thread_profiles:
+                # A profile can only be read when its thread is done with it
+                if not thread.is_alive():
+                    stats.add(thread_profile)
+            stats.dump_stats(profile_file)
+            summary = io.StringIO()
+            stats.stream = summary
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP_ENTRIES)
+            print(summary.getvalue(), file=sys.stderr)
+            print(f"Profile written to {profile_file}", file=sys.stderr, flush=True)
+        return
+
+    tracemalloc.start()
+    peak_snapshot = [tracemalloc.take_snapshot(), 0]
+    stop_sampling = threading.Event()
+
+    def take_peak_snapshot():
+        current_size, _ = tracemalloc.get_traced_memory()
+        if current_size > peak_snapshot[1] * TRACEMALLOC_SNAPSHOT_GROWTH:
+            peak_snapshot[:] = tracemalloc.take_snapshot(), current_size
+
+    def sample_peak():
+        while not stop_sampling.wait(TRACEMALLOC_INTERVAL):
+            take_peak_snapshot()
+
+    sampler = threading.Thread(
+        target=sample_peak, name="fake-vcf-tracemalloc", daemon=True
+    )
+    sampler.start()
+    try:
+        yield
+    finally:
+        stop_sampling.set()
+        sampler.join()
+        take_peak_snapshot()
+        _, peak_size = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot, snapshot_size = peak_snapshot
+        # Leave out the memory of the snapshots themselves
+        snapshot = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        lines = [
+            f"Peak traced memory: {peak_size / 2**20:.1f} MiB",
+            f"Largest allocations at {snapshot_size / 2**20:.1f} MiB traced, close "
+            "to the peak:",
+        ]
+        lines += [
+            str(statistic)
+            for statistic in snapshot.statistics("lineno")[:PROFILE_TOP_ENTRIES]
+        ]
+        Path(profile_file).write_text("\n".join(lines) + "\n")
+        print("\n".join(lines), file=sys.stderr)
+        print(f"Profile written to {profile_file}", file=sys.stderr, flush=True)
@@ -0,0 +1,79 @@
+"""Choices and defaults of the options of the generate and import-reference commands.
+
+They are kept apart from the modules that use them, which import numpy and the
+writers, so the command line starts without importing those.
+"""
+
+from enum import Enum
+
+# Nr of bytes of a sequence kept in memory at a time when importing a reference
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+DEFAULT_VARIANTS_CHUNK_SIZE = 10_000
+DEFAULT_SAMPLES_CHUNK_SIZE = 1_000
+
+
+class GenotypeModel(str, Enum):
+    """
+    Models of the genotypes of the samples.
+
+    ROTATION draws the genotypes of the samples once and rotates them for every
+    row, so all rows have the same genotypes. ALLELE_FREQUENCY draws an alt allele
+    frequency for every site and the alleles of all samples from it, and computes
+    the AF, AC and AN INFO values from the genotypes.
+    """
+
+    ROTATION = "rotation"
+    ALLELE_FREQUENCY = "af"
+
+
+class FormatModel(str, Enum):
+    """
+    Models of the AD, DP, GQ and PL values of the samples in large format.
+
+    FIXED gives each genotype one of a few fixed sample values, so the sample
+    columns are copied from encoded values. READS draws a read depth for every
+    sample and row, splits the reads over the alleles of the genotype and computes
+    GQ and PL from the allele depths.
+    """
+
+    FIXED = "fixed"
+    READS = "reads"
+
+
+class GenotypeLayout(str, Enum):
+    """
+    Layouts of the genotypes in columnar output.
+
+    LONG stores the genotypes of a variant as a list in one GT column, in the order
+    of the samples. WIDE stores the genotypes of each sample in a column of its own
+    named after the sample.
+    """
+
+    LONG = "long"
+    WIDE = "wide"
+
+
+class IndexFormat(str, Enum):
+    """
+    Index formats of bgzipped output.
+
+    TBI is the tabix index used by most tools, CSI also supports positions past
+    2^29 and is the only index format for BCF.
+    """
+
+    TBI = "tbi"
+    CSI = "csi"
+
+
+class ReferenceFormat(str, Enum):
+    """
+    Storage formats for imported references.
+
+    BYTES stores each sequence as a raw file with one ASCII byte per base, which is
+    memory mapped when used. PARQUET stores each sequence as a Parquet table with one
+    row per base.
+    """
+
+    BYTES = "bytes"
+    PARQUET = "parquet"
@@ -0,0 +1,273 @@
+"""Pipelined writing of generated blocks, overlapping generation with compression and
+file writes."""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+
+# Fragments are passed to the writer thread in batches of about this many bytes
+BATCH_BYTES = 1024 * 1024
+# Max nr of batches waiting for the writer thread, the generating thread blocks when
+# the queue is full
+QUEUE_BATCHES = 4
+
+
+class StageTimer:
+    """
+    The wall clock time a stage of a pipeline spends working and waiting for the
+    stages next to it.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize StageTimer object.
+
+        Args:
+            name (str): Name of the stage.
+        """
+        self.name = name
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.num_bytes = 0
+
+    def __str__(self):
+        """
+        Formats the times of the stage.
+        """
+        return (
+            f"{self.name} {self.busy_seconds:.2f}s busy, "
+            f"{self.wait_seconds:.2f}s waiting"
+        )
+
+
+class BlockPipeline:
+    """
+    Writes byte fragments to a writer on a writer thread, so the next fragments are
+    generated while the writer compresses and writes the ones before them.
+
+    The fragments are passed in batches of about batch_bytes through a queue of at
+    most queue_batches batches. A full queue blocks the generating thread until the
+    writer catches up, which lets the slowest stage set the pace and bounds the
+    fragments held by the pipeline to about queue_batches + 2 batches, the one
+    being written and the one being gathered included. zlib and file writes
+    release the GIL, so the stages run in parallel and the time of a pipeline is
+    about that of its slowest stage instead of the sum of the stages. BgzfWriter
+    output compresses on its own pool of threads when it has more than one.
+
+    The pipeline has the write, writelines and tell methods of the writers, the
+    fragments must not change until they are written.
+    """
+
+    def __init__(
+        self,
+        output_file,
+        batch_bytes: int = BATCH_BYTES,
+        queue_batches: int = QUEUE_BATCHES,
+    ):
+        """
+        Initialize BlockPipeline object.
+
+        Args:
+            output_file: Opened BgzfWriter or GatherWriter to write to, it is not
+                closed with the pipeline.
+            batch_bytes (int, optional): Nr of bytes of a batch of fragments.
+            queue_batches (int, optional): Max nr of batches waiting to be written.
+
+        Raises:
+            ValueError: If batch_bytes or queue_batches is less than 1.
+        """
+        if batch_bytes < 1 or queue_batches < 1:
+            raise ValueError("Batch size and queue length must be greater than 0")
+        self.output_file = output_file
+        self.batch_bytes = batch_bytes
+        self.generate_stage = StageTimer("generate")
+        self.write_stage = StageTimer("write")
+        self._start_offset = output_file.tell()
+        self._offset = self._start_offset
+        self._batch = []
+        self._batch_bytes = 0
+        self._queue = queue.Queue(maxsize=queue_batches)
+        self._error = None
+        self._aborted = False
+        self._start_time = time.perf_counter()
+        self._end_time = None
+        self._thread = threading.Thread(
+            target=self._write_batches, name="fake-vcf-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, data: bytes) -> None:
+        """
+        Writes data to the output.
+
+        Args:
+            data (bytes): Data to write.
+        """
+        self.writelines([data])
+
+    def writelines(self, fragments) -> None:
+        """
+        Writes byte fragments to the output in order.
+
+        The fragments are taken from the iterable one at a time and the batch is
+        handed to the writer as soon as it has batch_bytes, so the fragments of a
+        wide row are never all held at once.
+
+        Args:
+            fragments (Iterable[bytes or memoryview]): The fragments.
+        """
+        for fragment in fragments:
+            self._batch.append(fragment)
+            self._batch_bytes += len(fragment)
+            if self._batch_bytes >= self.batch_bytes:
+                self._put_batch()
+
+    def tell(self) -> int:
+        """
+        Returns the offset in the output of the next write.
+        """
+        return self._offset + self._batch_bytes
+
+    def stages(self) -> list:
+        """
+        Gets the times of the stages of the pipeline, so far if it is not closed.
+
+        The compression of BgzfWriter output is a stage of its own, its busy time
+        is summed over the compression threads and part of the write stage when
+        there is only one.
+
+        Returns:
+            list[StageTimer]: The times of the stages in order.
+        """
+        end_time = self._end_time or time.perf_counter()
+        self.generate_stage.busy_seconds = (
+            end_time - self._start_time - self.generate_stage.wait_seconds
+        )
+        self.generate_stage.num_bytes = self._offset - self._start_offset
+        stages = [self.generate_stage]
+        compress_seconds = getattr(self.output_file, "compress_seconds", None)
+        if compress_seconds is not None:
+            compress_stage = StageTimer("compress")
+            compress_stage.busy_seconds = compress_seconds
+            compress_stage.num_bytes = self.write_stage.num_bytes
+            stages.append(compress_stage)
+        stages.append(self.write_stage)
+        return stages
+
+    def close(self) -> None:
+        """
+        Writes the last batch and waits for the writer thread to write everything.
+
+        Raises:
+            Exception: The error the writer raised, if any.
+        """
+        if not self._thread.is_alive():
+            return
+        if self._batch:
+            self._put_batch()
+        self._put(None)
+        self._thread.join()
+        self._end_time = time.perf_counter()
+        if self._error is not None:
+            raise self._error
+
+    def _put_batch(self) -> None:
+        """
+        Hands the gathered fragments to the writer thread, waiting while the queue
+        is full.
+
+        Raises:
+            Exception: The error the writer raised, if any.
+        """
+        if self._error is not None:
+            raise self._error
+        self._put(self._batch)
+        self._offset += self._batch_bytes
+        self._batch = []
+        self._batch_bytes = 0
+
+    def _put(self, batch) -> None:
+        """
+        Puts a batch, or None for the end, in the queue and times the wait.
+        """
+        start = time.perf_counter()
+        self._queue.put(batch)
+        self.generate_stage.wait_seconds += time.perf_counter() - start
+
+    def _write_batches(self) -> None:
+        """
+        Writes the batches of the queue until the end, on the writer thread.
+
+        After an error, or when the pipeline is aborted, the batches are taken from
+        the queue without writing them so the generating thread never blocks.
+        """
+        while True:
+            start = time.perf_counter()
+            batch = self._queue.get()
+            taken = time.perf_counter()
+            self.write_stage.wait_seconds += taken - start
+            if batch is None:
+                return
+            if self._error is not None or self._aborted:
+                continue
+            try:
+                self.output_file.writelines(batch)
+            except BaseException as error:
+                self._error = error
+            self.write_stage.num_bytes += sum(map(len, batch))
+            self.write_stage.busy_seconds += time.perf_counter() - taken
+
+    def __enter__(self):
+        """
+        Enters the context.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exits the context, writing everything or, after an error, stopping the
+        writer thread without writing the batches it has not started.
+        """
+        if exc_type is not None:
+            self._aborted = True
+            self._put(None)
+            self._thread.join()
+            return
+        self.close()
+
+
+def sum_stages(stage_lists) -> list:
+    """
+    Sums the times of the stages of several pipelines, like those of the shards
+    written by the workers.
+
+    Args:
+        stage_lists (Iterable[list[StageTimer]]): The stages of each pipeline.
+
+    Returns:
+        list[StageTimer]: The summed times of the stages by name, in order of
+            first appearance.
+    """
+    summed_stages = {}
+    for stages in stage_lists:
+        for stage in stages:
+            summed_stage = summed_stages.setdefault(stage.name, StageTimer(stage.name))
+            summed_stage.busy_seconds += stage.busy_seconds
+            summed_stage.wait_seconds += stage.wait_seconds
+            summed_stage.num_bytes += stage.num_bytes
+    return list(summed_stages.values())
+
+
+def format_stage_times(stages) -> str:
+    """
+    Formats the times of the stages of a pipeline on one line.
+
+    Args:
+        stages (list[StageTimer]): The times of the stages.
+
+    Returns:
+        str: The times.
+    """
+    return "Stage times: " + ", ".join(str(stage) for stage in stages)
@@ -1,64 +1,640 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, NamedTuple
+
+import gzip
 import json
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 
-import pyarrow as pa
-import pyarrow.parquet as pq
-from tqdm import tqdm
+import numpy as np
 
 import fake_vcf
+from fake_vcf.vcf_bgzf import BgzfReader, is_bgzf, is_gzipped, load_gzi_index
+from fake_vcf.vcf_metrics import MetricsReporter
+from fake_vcf.vcf_options import DEFAULT_CHUNK_SIZE, ReferenceFormat
+
+if TYPE_CHECKING:
+    import pyarrow as pa
 
 METADATA_FILE_NAME = "sequence_metadata.json"
 
+REFERENCE_FILE_SUFFIXES = {
+    ReferenceFormat.BYTES: ".bases",
+    ReferenceFormat.PARQUET: ".parquet",
+}
+
 
-def get_ref_at_pos(ref_data: pa.array, position):
+def get_ref_at_pos(ref_data: pa.Table | np.ndarray, position):
+    if isinstance(ref_data, np.ndarray):
+        return chr(ref_data[position])
     reference_value = ref_data.column(0)[position].as_py()
     return reference_value
 
 
+def get_ref_at_positions(ref_data: pa.Table | np.ndarray, positions) -> np.ndarray:
+    """
+    Gets the reference bases at many positions in one call.
+
+    Args:
+        ref_data (pa.Table or np.ndarray): Reference data from load_reference_data.
+        positions (np.ndarray): 0-based positions.
+
+    Returns:
+        np.ndarray: The ASCII code of the base at each position.
+    """
+    if isinstance(ref_data, np.ndarray):
+        return np.asarray(ref_data[positions])
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    bases = pc.take(ref_data.column(0), pa.array(positions)).combine_chunks()
+    # Every base is a single character, so the first byte of each string is the base
+    _, offsets_buffer, data_buffer = bases.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int32)
+    data = np.frombuffer(data_buffer, dtype=np.uint8)
+    return data[offsets[bases.offset : bases.offset + len(bases)]]
+
+
 def load_reference_data(reference_file, memory_map):
-    reference_data = pq.read_table(reference_file, memory_map=memory_map)
-    return reference_data
+    """
+    Loads the reference data of a sequence.
+
+    Args:
+        reference_file (str or Path): Path to a .parquet or .bases reference file.
+        memory_map (bool): Memory map the file instead of reading it into memory.
+
+    Returns:
+        pa.Table or np.ndarray: A table with one row per base for Parquet files, an
+            array with one ASCII byte per base otherwise.
+    """
+    if Path(reference_file).suffix == REFERENCE_FILE_SUFFIXES[ReferenceFormat.PARQUET]:
+        import pyarrow.parquet as pq
+
+        return pq.read_table(reference_file, memory_map=memory_map)
+    if memory_map:
+        return np.memmap(reference_file, dtype=np.uint8, mode="r")
+    return np.fromfile(reference_file, dtype=np.uint8)
+
+
+def read_sequence_lengths(reference_dir) -> dict:
+    """
+    Reads the imported sequences of a reference directory and their lengths.
+
+    Args:
+        reference_dir (str or Path): Path to imported reference data.
+
+    Returns:
+        dict[str, int or None]: The length of each sequence in the order they were
+            imported, None for references imported without lengths.
+    """
+    with open(Path(reference_dir) / METADATA_FILE_NAME) as metadata_file:
+        sequence_metadata = json.load(metadata_file)
+    sequence_lengths = sequence_metadata.get("sequence_lengths", {})
+    return {
+        sequence_id: sequence_lengths.get(sequence_id)
+        for sequence_id in sequence_metadata["reference_files"]
+    }
+
+
+def _clean_bases(sequence_lines: bytes | bytearray) -> bytes:
+    """
+    Removes line breaks and whitespace from sequence lines and upper cases the bases.
+    """
+    return bytes(sequence_lines.translate(None, b" \t\r\n").upper())
+
+
+def open_fasta(file_path):
+    """
+    Opens a fasta file for reading bytes, decompressing it if it is gzip compressed.
+
+    Args:
+        file_path (str or Path): Path to the fasta file, plain or gzip compressed.
+
+    Returns:
+        The opened file.
+    """
+    if is_gzipped(file_path):
+        return gzip.open(file_path, "rb")
+    return open(file_path, "rb")
+
+
+def open_indexed_fasta(file_path, block_offsets=None):
+    """
+    Opens an indexed fasta file for seeking to the offsets of the fasta index.
+
+    Args:
+        file_path (str or Path): Path to the fasta file, plain or BGZF compressed.
+        block_offsets (list[tuple[int, int]], optional): The BGZF index of a BGZF
+            compressed fasta file.
+
+    Returns:
+        The opened file.
+    """
+    if block_offsets is not None:
+        return BgzfReader(file_path, block_offsets=block_offsets)
+    return open(file_path, "rb")
+
 
+def iter_fasta_chunks(file_path, include_sequences=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams the sequences of a plain or gzip compressed fasta file in chunks of bases.
 
-def parse_fasta(file_path, include_sequences):
+    The file is read in blocks of chunk_size bytes and the headers and line breaks
+    are split off inside each block, so the memory use is bounded by the chunk size
+    and not by the length of the sequences or of their lines.
+
+    Args:
+        file_path (str or Path): Path to the plain or gzip compressed fasta file.
+        include_sequences (list[str], optional): Ids of the sequences to read, all
+            sequences are read if not given.
+        chunk_size (int, optional): Nr of bases per chunk.
+
+    Yields:
+        tuple[str, bytes]: The sequence id and the next chunk of its bases in upper
+            case. The chunks of a sequence have chunk_size bases, except the last
+            one, and every sequence ends with one chunk that may be empty.
+    """
     include_sequences = set(include_sequences) if include_sequences else None
-    sequences = []
-    with open(file_path) as fasta_file:
-        current_sequence = {"id": "", "sequence": []}
-
-        for line in tqdm(fasta_file):
-            line = line.strip()
-
-            if line.startswith(">"):  # New sequence header
-                if include_sequences is not None:
-                    parsed_sequences = {seq for seq in sequences}
-                    if parsed_sequences == include_sequences:
-                        return
-
-                if current_sequence["id"] and (
-                    include_sequences is None
-                    or current_sequence["id"] in include_sequences
-                ):
-                    sequences.append(current_sequence["id"])
-                    yield current_sequence.copy()
+    remaining_sequences = set(include_sequences) if include_sequences else None
+
+    def header_sequence_id(header: bytearray) -> str | None:
+        header_id = (header.split() or [b""])[0].decode()
+        if header_id and (include_sequences is None or header_id in include_sequences):
+            return header_id
+        return None
 
-                current_sequence = {"id": line[1:].split(" ")[0], "sequence": []}
+    with open_fasta(file_path) as fasta_file:
+        sequence_id = None
+        bases = bytearray()
+        header = None
 
-            elif current_sequence["id"] and (
-                include_sequences is None or current_sequence["id"] in include_sequences
-            ):
-                current_sequence["sequence"].extend(line.upper())
+        while block := fasta_file.read(chunk_size):
+            position = 0
+            while position < len(block):
+                if header is not None:  # Inside a sequence header
+                    header_end = block.find(b"\n", position)
+                    if header_end == -1:
+                        header += block[position:]
+                        break
+                    header += block[position:header_end]
+                    sequence_id = header_sequence_id(header)
+                    header = None
+                    position = header_end + 1
+                    continue
 
+                header_start = block.find(b">", position)
+                sequence_end = len(block) if header_start == -1 else header_start
+                if sequence_id is not None:
+                    bases += _clean_bases(block[position:sequence_end])
+                    while len(bases) >= chunk_size:
+                        yield sequence_id, bytes(bases[:chunk_size])
+                        del bases[:chunk_size]
+                if header_start == -1:
+                    break
+
+                # New sequence header
+                if sequence_id is not None:
+                    yield sequence_id, bytes(bases)
+                    bases.clear()
+                    if remaining_sequences is not None:
+                        remaining_sequences.discard(sequence_id)
+                        if not remaining_sequences:
+                            return
+                sequence_id = None
+                header = bytearray()
+                position = header_start + 1
+
+        # A header on the last line without a line break
+        if header is not None:
+            sequence_id = header_sequence_id(header)
         # Add the last sequence in the file
-        if current_sequence["id"] and (
-            include_sequences is None or current_sequence["id"] in include_sequences
+        if sequence_id is not None:
+            yield sequence_id, bytes(bases)
+
+
+class FastaIndexEntry(NamedTuple):
+    """
+    A line of a fasta index (.fai) file.
+    """
+
+    name: str
+    length: int
+    offset: int
+    line_bases: int
+    line_width: int
+
+
+def fasta_index_path(file_path) -> Path:
+    """
+    Returns the path of the fasta index (.fai) of a fasta file.
+    """
+    file_path = Path(file_path)
+    return file_path.with_name(f"{file_path.name}.fai")
+
+
+def read_fasta_index(index_path) -> dict:
+    """
+    Reads a fasta index (.fai) file.
+
+    Args:
+        index_path (str or Path): Path to the .fai file.
+
+    Returns:
+        dict[str, FastaIndexEntry]: The index entries by sequence id, in file order.
+    """
+    fasta_index = {}
+    with open(index_path) as index_file:
+        for line in index_file:
+            if not line.strip():
+                continue
+            name, length, offset, line_bases, line_width = line.split("\t")[:5]
+            fasta_index[name] = FastaIndexEntry(
+                name, int(length), int(offset), int(line_bases), int(line_width)
+            )
+    return fasta_index
+
+
+def write_fasta_index(fasta_index: dict, index_path) -> None:
+    """
+    Writes a fasta index (.fai) file.
+
+    Args:
+        fasta_index (dict[str, FastaIndexEntry]): The index entries.
+        index_path (str or Path): Path to the .fai file.
+    """
+    with open(index_path, "w") as index_file:
+        for entry in fasta_index.values():
+            index_file.write("\t".join(str(value) for value in entry) + "\n")
+
+
+def build_fasta_index(file_path) -> dict:
+    """
+    Builds the fasta index of a fasta file, the same index as samtools faidx.
+
+    The offsets of a compressed fasta file are offsets in the uncompressed data.
+
+    Args:
+        file_path (str or Path): Path to the plain or gzip compressed fasta file.
+
+    Returns:
+        dict[str, FastaIndexEntry]: The index entries by sequence id, in file order.
+
+    Raises:
+        ValueError: If the lines of a sequence have different lengths.
+    """
+    fasta_index = {}
+    sequence = None
+    offset = 0
+
+    with open_fasta(file_path) as fasta_file:
+        for line in fasta_file:
+            if line.startswith(b">"):
+                if sequence is not None:
+                    fasta_index[sequence["name"]] = FastaIndexEntry(**sequence)
+                sequence = {
+                    "name": (line[1:].split() or [b""])[0].decode(),
+                    "length": 0,
+                    "offset": offset + len(line),
+                    "line_bases": 0,
+                    "line_width": 0,
+                }
+                short_line_seen = False
+            elif sequence is not None:
+                line_bases = len(line.rstrip(b"\r\n"))
+                if sequence["line_width"] == 0:
+                    sequence["line_bases"] = line_bases
+                    sequence["line_width"] = len(line)
+                elif line_bases and (
+                    short_line_seen or line_bases > sequence["line_bases"]
+                ):
+                    # Only the last line of a sequence may be shorter
+                    raise ValueError(
+                        f"Sequence {sequence['name']} in {file_path} has lines of different lengths, it can't be indexed"
+                    )
+                short_line_seen = short_line_seen or (
+                    line_bases < sequence["line_bases"]
+                )
+                sequence["length"] += line_bases
+            offset += len(line)
+
+    if sequence is not None:
+        fasta_index[sequence["name"]] = FastaIndexEntry(**sequence)
+
+    return fasta_index
+
+
+def load_fasta_index(file_path, build=False) -> dict | None:
+    """
+    Loads the fasta index next to a fasta file, optionally building it.
+
+    A built index is written next to the fasta file if possible.
+
+    Args:
+        file_path (str or Path): Path to the fasta file.
+        build (bool, optional): Build the index if there is no .fai file.
+
+    Returns:
+        dict[str, FastaIndexEntry] or None: The index, or None if there is no index
+            and build is not set.
+    """
+    index_path = fasta_index_path(file_path)
+    if index_path.exists():
+        return read_fasta_index(index_path)
+    if not build:
+        return None
+
+    print(f"Building fasta index for {file_path}")
+    fasta_index = build_fasta_index(file_path)
+    try:
+        write_fasta_index(fasta_index, index_path)
+    except OSError:
+        print(f"Could not write fasta index to {index_path}")
+    return fasta_index
+
+
+def iter_indexed_sequence_chunks(
+    fasta_file, index_entry: FastaIndexEntry, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """
+    Reads one sequence of an indexed fasta file in chunks of bases, seeking
+    directly to the sequence.
+
+    Args:
+        fasta_file: The fasta file opened with open_indexed_fasta.
+        index_entry (FastaIndexEntry): Index entry of the sequence.
+        chunk_size (int, optional): Nr of bytes of sequence lines per chunk.
+
+    Yields:
+        bytes: The next chunk of bases in upper case. The last chunk may be empty.
+    """
+    remaining_bytes = 0
+    if index_entry.length:
+        # Up to the last base, the line break after it may be missing at the end
+        # of the file
+        last_line, last_line_bases = divmod(
+            index_entry.length - 1, max(index_entry.line_bases, 1)
+        )
+        remaining_bytes = last_line * index_entry.line_width + last_line_bases + 1
+    # Read whole lines so a line break is never split between chunks
+    read_size = max(1, chunk_size // max(index_entry.line_width, 1)) * max(
+        index_entry.line_width, 1
+    )
+
+    fasta_file.seek(index_entry.offset)
+    while remaining_bytes > 0:
+        sequence_lines = fasta_file.read(min(read_size, remaining_bytes))
+        if not sequence_lines:
+            raise ValueError(f"Sequence {index_entry.name} is truncated")
+        remaining_bytes -= len(sequence_lines)
+        yield _clean_bases(sequence_lines)
+    yield b""
+
+
+class ReferenceFileWriter:
+    """
+    Writes the bases of one sequence to a reference file chunk by chunk, in the
+    format given by the suffix of the file.
+    """
+
+    def __init__(self, sequence_id, reference_file):
+        """
+        Initialize ReferenceFileWriter object.
+
+        Args:
+            sequence_id (str): Id of the sequence.
+            reference_file (Path): Path to the .parquet or .bases reference file.
+        """
+        self.sequence_id = sequence_id
+        self.reference_file = Path(reference_file)
+        self.length = 0
+        self._bases_file = None
+        self._parquet_writer = None
+        if (
+            self.reference_file.suffix
+            == REFERENCE_FILE_SUFFIXES[ReferenceFormat.PARQUET]
+        ):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            self._parquet_writer = pq.ParquetWriter(
+                self.reference_file,
+                pa.schema([(sequence_id, pa.string())]),
+                compression="zstd",
+            )
+        else:
+            self._bases_file = open(self.reference_file, "wb")
+
+    def write(self, bases: bytes) -> None:
+        """
+        Appends bases to the reference file.
+
+        Args:
+            bases (bytes): The bases, one ASCII byte per base.
+        """
+        if not bases:
+            return
+        self.length += len(bases)
+        if self._bases_file is not None:
+            self._bases_file.write(bases)
+            return
+
+        import pyarrow as pa
+
+        # One string per base, built straight from the bytes without Python objects
+        offsets = np.arange(len(bases) + 1, dtype=np.int32)
+        bases_array = pa.StringArray.from_buffers(
+            len(bases), pa.py_buffer(offsets), pa.py_buffer(bases)
+        )
+        self._parquet_writer.write_batch(
+            pa.record_batch([bases_array], names=[self.sequence_id])
+        )
+
+    def close(self) -> None:
+        """
+        Closes the reference file.
+        """
+        if self._bases_file is not None:
+            self._bases_file.close()
+        else:
+            self._parquet_writer.close()
+
+    def __enter__(self):
+        """
+        Enters the context.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Exits the context and closes the file.
+        """
+        self.close()
+
+
+def reference_file_path(output_dir, sequence_id, reference_format) -> Path:
+    """
+    Returns the path of the reference file of a sequence.
+    """
+    return (
+        Path(output_dir)
+        / f"reference_{sequence_id}{REFERENCE_FILE_SUFFIXES[ReferenceFormat(reference_format)]}"
+    )
+
+
+def import_indexed_sequence(
+    file_path, index_entry, reference_file, chunk_size, block_offsets=None
+):
+    """
+    Imports one sequence of an indexed fasta file to a reference file.
+
+    Args:
+        file_path (str or Path): Path to the plain or BGZF compressed fasta file.
+        index_entry (FastaIndexEntry): Index entry of the sequence.
+        reference_file (Path): Path to the .parquet or .bases reference file.
+        chunk_size (int): Nr of bytes of sequence kept in memory at a time.
+        block_offsets (list[tuple[int, int]], optional): The BGZF index of a BGZF
+            compressed fasta file.
+
+    Returns:
+        int: The length of the imported sequence.
+    """
+    with open_indexed_fasta(
+        file_path, block_offsets
+    ) as fasta_file, ReferenceFileWriter(
+        sequence_id=index_entry.name, reference_file=reference_file
+    ) as reference_writer:
+        for bases in iter_indexed_sequence_chunks(fasta_file, index_entry, chunk_size):
+            reference_writer.write(bases)
+    return reference_writer.length
+
+
+def _import_streamed_sequences(
+    file_path,
+    output_dir,
+    include_sequences,
+    reference_format,
+    chunk_size,
+    metrics: MetricsReporter | None = None,
+):
+    """
+    Imports the sequences reading the fasta file from start to end, the progress
+    is updated once per chunk.
+
+    Returns:
+        dict[str, tuple[str, int]]: Reference file name and length by sequence id.
+    """
+    from tqdm import tqdm
+
+    imported_sequences = {}
+    reference_writer = None
+    with tqdm(unit="bp", unit_scale=True) as pbar:
+        for sequence_id, bases in iter_fasta_chunks(
+            file_path, include_sequences=include_sequences, chunk_size=chunk_size
         ):
-            sequences.append(current_sequence["id"])
-            yield current_sequence.copy()
+            if reference_writer is None or reference_writer.sequence_id != sequence_id:
+                if reference_writer is not None:
+                    reference_writer.close()
+                pbar.set_description(f"Processing {sequence_id}")
+                reference_writer = ReferenceFileWriter(
+                    sequence_id=sequence_id,
+                    reference_file=reference_file_path(
+                        output_dir, sequence_id, reference_format
+                    ),
+                )
+
+            reference_writer.write(bases)
+            imported_sequences[sequence_id] = (
+                reference_writer.reference_file.name,
+                reference_writer.length,
+            )
+            pbar.update(len(bases))
+            if metrics is not None:
+                metrics.update(len(bases), len(bases))
 
+    if reference_writer is not None:
+        reference_writer.close()
 
-def import_reference(file_path, output_dir, include_sequences=None):
+    return imported_sequences
+
+
+def _import_indexed_sequences(
+    file_path,
+    fasta_index,
+    output_dir,
+    include_sequences,
+    reference_format,
+    chunk_size,
+    workers,
+    block_offsets=None,
+    metrics: MetricsReporter | None = None,
+):
+    """
+    Imports the sequences seeking to each of them with the fasta index, on several
+    worker processes that each write their own reference file. The progress is
+    updated once per sequence.
+
+    BGZF compressed fasta files are read with random access using the BGZF index
+    given as block_offsets.
+
+    Returns:
+        dict[str, tuple[str, int]]: Reference file name and length by sequence id.
+    """
+    index_entries = [
+        index_entry
+        for sequence_id, index_entry in fasta_index.items()
+        if not include_sequences or sequence_id in include_sequences
+    ]
+    for sequence_id in include_sequences or []:
+        if sequence_id not in fasta_index:
+            print(f"{sequence_id} not found in {file_path}")
+
+    reference_files = [
+        reference_file_path(output_dir, index_entry.name, reference_format)
+        for index_entry in index_entries
+    ]
+    import_args = (
+        [file_path] * len(index_entries),
+        index_entries,
+        reference_files,
+        [chunk_size] * len(index_entries),
+        [block_offsets] * len(index_entries),
+    )
+    from tqdm import tqdm
+
+    sequence_lengths = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    with executor or nullcontext():
+        import_map = map if executor is None else executor.map
+        for sequence_length in tqdm(
+            import_map(import_indexed_sequence, *import_args),
+            total=len(index_entries),
+        ):
+            sequence_lengths.append(sequence_length)
+            if metrics is not None:
+                metrics.update(sequence_length, sequence_length)
+
+    return {
+        index_entry.name: (reference_file.name, sequence_length)
+        for index_entry, reference_file, sequence_length in zip(
+            index_entries, reference_files, sequence_lengths
+        )
+    }
+
+
+def import_reference(
+    file_path,
+    output_dir,
+    include_sequences=None,
+    reference_format=ReferenceFormat.BYTES,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    workers=1,
+    metrics=None,
+):
     output_dir = Path(output_dir)
+    reference_format = ReferenceFormat(reference_format)
 
     if not output_dir.exists():
         print(f"Creating output directory {output_dir}")
@@ -71,24 +647,57 @@ def import_reference(file_path, output_dir, include_sequences=None):
 
     sequence_metadata_path = output_dir / METADATA_FILE_NAME
 
-    parsed_sequences = parse_fasta(file_path, include_sequences=include_sequences)
+    # With an index the sequences can be imported in parallel and unselected
+    # sequences are skipped without reading them. Compressed fasta files can only
+    # be read with random access when compressed with bgzip.
+    fasta_index = block_offsets = None
+    if not is_gzipped(file_path):
+        fasta_index = load_fasta_index(file_path, build=workers > 1)
+    elif is_bgzf(file_path):
+        fasta_index = load_fasta_index(file_path, build=workers > 1)
+        if fasta_index is not None:
+            block_offsets = load_gzi_index(file_path)
+    elif workers > 1:
+        print(
+            f"{file_path} is not compressed with bgzip and can't be indexed, importing with one worker"
+        )
+
+    if fasta_index is None:
+        imported_sequences = _import_streamed_sequences(
+            file_path=file_path,
+            output_dir=output_dir,
+            include_sequences=include_sequences,
+            reference_format=reference_format,
+            chunk_size=chunk_size,
+            metrics=metrics,
+        )
+    else:
+        imported_sequences = _import_indexed_sequences(
+            file_path=file_path,
+            fasta_index=fasta_index,
+            output_dir=output_dir,
+            include_sequences=include_sequences,
+            reference_format=reference_format,
+            chunk_size=chunk_size,
+            workers=workers,
+            block_offsets=block_offsets,
+            metrics=metrics,
+        )
+
     sequence_metadata = {
-        "reference_file": file_path.name,
+        "reference_file": Path(file_path).name,
         "fake-vcf-version": fake_vcf.version,
-        "reference_files": {},
+        "reference_format": reference_format.value,
+        "reference_files": {
+            sequence_id: reference_file_name
+            for sequence_id, (reference_file_name, _) in imported_sequences.items()
+        },
+        "sequence_lengths": {
+            sequence_id: sequence_length
+            for sequence_id, (_, sequence_length) in imported_sequences.items()
+        },
     }
 
-    for parsed_sequence in (pbar := tqdm(parsed_sequences)):
-        pbar.set_description(f"Processing {parsed_sequence['id']}")
-        parquet_file = output_dir / f"reference_{parsed_sequence['id']}.parquet"
-        sequence_metadata["reference_files"][parsed_sequence["id"]] = parquet_file.name
-
-        table_chr = pa.Table.from_arrays(
-            [pa.array(parsed_sequence["sequence"], pa.string())],
-            names=[parsed_sequence["id"]],
-        )
-        pq.write_table(table_chr, parquet_file, compression="zstd")
-
     print(f"\nWriting sequence metadata to {sequence_metadata_path}")
     with open(sequence_metadata_path, "w") as metadata_file:
         json.dump(sequence_metadata, metadata_file, ensure_ascii=False, indent=4)
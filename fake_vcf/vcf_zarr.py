@@ -0,0 +1,573 @@
+"""VCF Zarr (sgkit compatible) genotype store output of VirtualVCF rows.
+
+The store is written as a Zarr v2 directory store without depending on zarr, the
+metadata is JSON and the chunks are zlib compressed like the numcodecs Zlib codec.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from fake_vcf import version
+from fake_vcf.vcf_bgzf import DEFAULT_COMPRESS_LEVEL
+from fake_vcf.vcf_faker import POSITION_SPACING, RowValues, VirtualVCF, contig_vcf_args
+from fake_vcf.vcf_metrics import MetricsReporter
+from fake_vcf.vcf_options import DEFAULT_SAMPLES_CHUNK_SIZE, DEFAULT_VARIANTS_CHUNK_SIZE
+
+ZARR_SUFFIX = ".zarr"
+VCF_ZARR_VERSION = "0.2"
+
+PLOIDY = 2
+# variant_position is an int32 array in the VCF Zarr spec
+MAX_POSITION = np.iinfo(np.int32).max
+
+
+def is_zarr_path(file_path) -> bool:
+    """
+    Checks if the output is a Zarr store based on its suffix.
+    """
+    return file_path is not None and Path(file_path).suffix == ZARR_SUFFIX
+
+
+def encode_vlen_utf8(values) -> bytes:
+    """
+    Encodes strings like the numcodecs VLenUTF8 codec, the nr of strings followed
+    by the length and bytes of each string.
+
+    Args:
+        values (Iterable[str]): The strings in C order.
+
+    Returns:
+        bytes: The encoded strings.
+    """
+    encoded = [value.encode("utf-8") for value in values]
+    return struct.pack("<I", len(encoded)) + b"".join(
+        struct.pack("<I", len(value)) + value for value in encoded
+    )
+
+
+def parse_genotypes(samples) -> tuple:
+    """
+    Parses the GT values of the sample columns.
+
+    Args:
+        samples (Iterable[str]): Sample values like 0|1:0,30:30:89:913,89,0.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The alleles of each sample as int8 with shape
+            (samples, ploidy) and whether each genotype is phased.
+    """
+    genotypes = [sample.split(":")[0] for sample in samples]
+    alleles = np.array(
+        [genotype.replace("|", "/").split("/") for genotype in genotypes],
+        dtype=np.int8,
+    )
+    phased = np.array(["|" in genotype for genotype in genotypes], dtype=bool)
+    return alleles, phased
+
+
+class ZarrStore:
+    """
+    Writes the arrays of a Zarr v2 directory store.
+    """
+
+    def __init__(self, store_path, compress_level: int = DEFAULT_COMPRESS_LEVEL):
+        """
+        Initialize ZarrStore object.
+
+        Args:
+            store_path (str or Path): Path to the store directory.
+            compress_level (int): zlib compression level 0-9 of the chunks.
+        """
+        self.store_path = Path(store_path)
+        self.compress_level = compress_level
+
+    def write_group(self, attributes: dict) -> None:
+        """
+        Writes the root group with its attributes.
+        """
+        self.store_path.mkdir(parents=True, exist_ok=True)
+        self._write_json(".zgroup", {"zarr_format": 2})
+        self._write_json(".zattrs", attributes)
+
+    def create_array(
+        self,
+        name: str,
+        shape: tuple,
+        chunks: tuple,
+        dtype: str,
+        dimensions: list,
+        fill_value=None,
+    ) -> None:
+        """
+        Writes the metadata of an array, named dimensions as used by xarray.
+
+        Chunks that are never written read as the fill value, so arrays with a
+        constant value only need their metadata.
+
+        Args:
+            name (str): Name of the array.
+            shape (tuple[int, ...]): Shape of the array.
+            chunks (tuple[int, ...]): Chunk shape.
+            dtype (str): Numpy dtype string, |O for strings.
+            dimensions (list[str]): Name of each dimension.
+            fill_value: Value of unwritten chunks.
+        """
+        (self.store_path / name).mkdir(parents=True, exist_ok=True)
+        self._write_json(
+            f"{name}/.zarray",
+            {
+                "zarr_format": 2,
+                "shape": list(shape),
+                "chunks": [max(1, chunk) for chunk in chunks],
+                "dtype": dtype,
+                "compressor": {"id": "zlib", "level": self.compress_level},
+                "fill_value": fill_value,
+                "order": "C",
+                "filters": [{"id": "vlen-utf8"}] if dtype == "|O" else None,
+                "dimension_separator": ".",
+            },
+        )
+        self._write_json(f"{name}/.zattrs", {"_ARRAY_DIMENSIONS": dimensions})
+
+    def write_chunk(self, name: str, chunk_index: tuple, data) -> None:
+        """
+        Writes one chunk of an array.
+
+        Edge chunks are written with the full chunk shape, the padding is cut off
+        when the array is read.
+
+        Args:
+            name (str): Name of the array.
+            chunk_index (tuple[int, ...]): Index of the chunk in each dimension.
+            data (np.ndarray or list[str]): The chunk values, strings are encoded
+                with VLenUTF8.
+        """
+        if isinstance(data, np.ndarray):
+            data = np.ascontiguousarray(data).tobytes()
+        else:
+            data = encode_vlen_utf8(data)
+        chunk_key = ".".join(str(index) for index in chunk_index)
+        with open(self.store_path / name / chunk_key, "wb") as chunk_file:
+            chunk_file.write(zlib.compress(data, self.compress_level))
+
+    def consolidate_metadata(self) -> None:
+        """
+        Writes all metadata to .zmetadata so the store opens with one read.
+        """
+        metadata = {}
+        for metadata_path in sorted(self.store_path.rglob(".z*")):
+            key = metadata_path.relative_to(self.store_path).as_posix()
+            if key != ".zmetadata":
+                metadata[key] = json.loads(metadata_path.read_text())
+        self._write_json(
+            ".zmetadata", {"zarr_consolidated_format": 1, "metadata": metadata}
+        )
+
+    def _write_json(self, key: str, value: dict) -> None:
+        """
+        Writes a metadata file of the store.
+        """
+        with open(self.store_path / key, "w") as json_file:
+            json.dump(value, json_file, indent=4)
+
+
+def pad_chunk(values: np.ndarray, chunk_size: int, fill_value) -> np.ndarray:
+    """
+    Pads the first dimension of an edge chunk to the chunk size.
+    """
+    if len(values) == chunk_size:
+        return values
+    padded = np.full((chunk_size,) + values.shape[1:], fill_value, dtype=values.dtype)
+    padded[: len(values)] = values
+    return padded
+
+
+def _concatenate(arrays: list):
+    """
+    Joins the arrays of a row value that may be None for all blocks.
+    """
+    return None if arrays[0] is None else np.concatenate(arrays)
+
+
+def concatenate_row_values(blocks) -> RowValues:
+    """
+    Joins the values of several blocks of rows.
+    """
+    blocks = list(blocks)
+    return RowValues(
+        positions=np.concatenate([block.positions for block in blocks]),
+        ids=np.concatenate([block.ids for block in blocks]),
+        refs=[ref for block in blocks for ref in block.refs],
+        alts=[alt for block in blocks for alt in block.alts],
+        quals=np.concatenate([block.quals for block in blocks]),
+        rotations=_concatenate([block.rotations for block in blocks]),
+        genotype_codes=_concatenate([block.genotype_codes for block in blocks]),
+        allele_counts=_concatenate([block.allele_counts for block in blocks]),
+        num_alleles=_concatenate([block.num_alleles for block in blocks]),
+    )
+
+
+def _variant_chunk_parts(chunk_start: int, chunk_stop: int, contigs: list) -> list:
+    """
+    Creates the VirtualVCF arguments of the contigs in a chunk of variants.
+
+    Each part of a chunk is the range of rows of its contig in the chunk, so the
+    variants don't depend on the chunk size.
+
+    Args:
+        chunk_start (int): First variant of the chunk.
+        chunk_stop (int): Last + 1 variant of the chunk.
+        contigs (list[tuple[int, int, dict]]): The contigs with rows from
+            contig_vcf_args.
+
+    Returns:
+        list[tuple[int, dict]]: The index of the contig and VirtualVCF arguments of
+            each part.
+    """
+    parts = []
+    for contig_index, contig_start, contig_args in contigs:
+        start = max(chunk_start, contig_start)
+        stop = min(chunk_stop, contig_start + contig_args["num_rows"])
+        if start >= stop:
+            continue
+        parts.append(
+            (
+                contig_index,
+                {
+                    **contig_args,
+                    "start_row": start - contig_start,
+                    "stop_row": stop - contig_start,
+                    "include_header": False,
+                },
+            )
+        )
+    return parts
+
+
+def write_variant_chunk(
+    store_path: Path,
+    chunk_parts: list,
+    chunk: int,
+    variants_chunk_size: int,
+    samples_chunk_size: int,
+    compress_level: int,
+    contig_dtype: str | None = None,
+) -> int:
+    """
+    Generates one chunk of variants and writes its chunks of all arrays, runs in a
+    worker process.
+
+    The genotypes of the allele frequency model are drawn one chunk of samples at
+    a time, so the memory used is bounded by the chunk sizes and not by the nr of
+    samples.
+
+    Args:
+        store_path (Path): Path to the store directory.
+        chunk_parts (list[tuple[int, dict]]): Index of the contig and VirtualVCF
+            arguments of each contig in the chunk.
+        chunk (int): Index of the chunk of variants.
+        variants_chunk_size (int): Nr of variants per chunk.
+        samples_chunk_size (int): Nr of samples per chunk.
+        compress_level (int): zlib compression level 0-9 of the chunks.
+        contig_dtype (str, optional): Dtype of variant_contig, which is only
+            written for stores with several contigs.
+
+    Returns:
+        int: The nr of variants in the chunk.
+    """
+    store = ZarrStore(store_path, compress_level=compress_level)
+    part_values = []
+    variant_contigs = []
+    genotype_code_chunks = []
+    for contig_index, vcf_args in chunk_parts:
+        start_row, stop_row = vcf_args["start_row"], vcf_args["stop_row"]
+        # Without the genotypes the rows of a part are small enough for one block
+        with VirtualVCF(**vcf_args, block_size=stop_row - start_row) as v_vcf:
+            values = next(v_vcf.blocks(row_values=True, genotypes=False))
+            part_values.append(values)
+            if values.rotations is None:
+                genotype_code_chunks.append(
+                    v_vcf.genotype_code_chunks(
+                        start_row, stop_row, values.num_alleles, samples_chunk_size
+                    )
+                )
+            sample_alleles, sample_phased = parse_genotypes(v_vcf.available_samples)
+            value_alleles, value_phased = parse_genotypes(v_vcf.sample_values)
+            max_alleles = v_vcf.max_alleles
+        variant_contigs.append(np.full(stop_row - start_row, contig_index))
+    row_values = concatenate_row_values(part_values)
+    num_variants = len(row_values.positions)
+    num_samples = len(sample_phased)
+
+    if contig_dtype is not None:
+        store.write_chunk(
+            "variant_contig",
+            (chunk,),
+            pad_chunk(
+                np.concatenate(variant_contigs).astype(contig_dtype),
+                variants_chunk_size,
+                -1,
+            ),
+        )
+
+    store.write_chunk(
+        "variant_position",
+        (chunk,),
+        pad_chunk(row_values.positions.astype(np.int32), variants_chunk_size, -1),
+    )
+    store.write_chunk(
+        "variant_quality",
+        (chunk,),
+        pad_chunk(row_values.quals.astype(np.float32), variants_chunk_size, np.nan),
+    )
+    padding = [""] * (variants_chunk_size - num_variants)
+    store.write_chunk(
+        "variant_id",
+        (chunk,),
+        [f"rs{vid}" for vid in row_values.ids.tolist()] + padding,
+    )
+    # Sites with fewer alleles than max_alleles are padded with empty alleles
+    store.write_chunk(
+        "variant_allele",
+        (chunk, 0),
+        [
+            allele
+            for ref, alt in zip(row_values.refs, row_values.alts)
+            for allele in itertools.islice(
+                itertools.chain([ref], alt.split(","), itertools.repeat("")),
+                max_alleles,
+            )
+        ]
+        + padding * max_alleles,
+    )
+
+    if row_values.rotations is not None:
+        # The samples of a row are the samples rotated right by the rotation of the
+        # row, so sample s of row i is sample s - rotation of the samples kept twice
+        # in a row.
+        alleles = np.concatenate([sample_alleles, sample_alleles])
+        phased = np.concatenate([sample_phased, sample_phased])
+        sample_starts = (num_samples - row_values.rotations)[:, np.newaxis]
+    else:
+        # The genotype codes index the sample values
+        alleles, phased = value_alleles, value_phased
+    for samples_chunk, sample_start in enumerate(
+        range(0, num_samples, samples_chunk_size)
+    ):
+        sample_range = np.arange(
+            sample_start, min(sample_start + samples_chunk_size, num_samples)
+        )
+        if row_values.rotations is not None:
+            sample_indexes = sample_starts + sample_range
+        else:
+            sample_indexes = np.concatenate(
+                [next(code_chunks) for code_chunks in genotype_code_chunks]
+            )
+        for name, values, fill_value in [
+            ("call_genotype", alleles[sample_indexes], -1),
+            ("call_genotype_phased", phased[sample_indexes], False),
+        ]:
+            if values.shape[1] < samples_chunk_size:
+                padded = np.full(
+                    (num_variants, samples_chunk_size) + values.shape[2:],
+                    fill_value,
+                    dtype=values.dtype,
+                )
+                padded[:, : values.shape[1]] = values
+                values = padded
+            store.write_chunk(
+                name,
+                (chunk, samples_chunk) + (0,) * (values.ndim - 2),
+                pad_chunk(values, variants_chunk_size, fill_value),
+            )
+    return num_variants
+
+
+def to_zarr_store(
+    vcf_args: dict,
+    store_path: Path,
+    workers: int = 1,
+    variants_chunk_size: int = DEFAULT_VARIANTS_CHUNK_SIZE,
+    samples_chunk_size: int = DEFAULT_SAMPLES_CHUNK_SIZE,
+    compress_level: int = DEFAULT_COMPRESS_LEVEL,
+    metrics: MetricsReporter | None = None,
+) -> None:
+    """
+    Writes the VCF data as a VCF Zarr store, readable with sgkit.load_dataset.
+
+    The genotypes are filled straight from the sample model of the VirtualVCF and
+    no VCF text is rendered. Each chunk of variants is generated by a worker
+    process, which writes the chunks of all arrays for those variants, so the same
+    seed gives the same store for any nr of workers. With several contigs in
+    vcf_args the variants are split over the contigs by their lengths.
+
+    Args:
+        vcf_args (dict): Arguments for VirtualVCF for the whole store.
+        store_path (Path): Path to the store directory.
+        workers (int): Nr of worker processes. Defaults to 1.
+        variants_chunk_size (int): Nr of variants per chunk.
+        samples_chunk_size (int): Nr of samples per chunk.
+        compress_level (int): zlib compression level 0-9 of the chunks.
+        metrics (MetricsReporter, optional): Reporter of the variants written,
+            updated once per chunk.
+
+    Raises:
+        ValueError: If a chunk size is less than 1 or the positions don't fit in
+            the int32 variant_position array.
+    """
+    if variants_chunk_size < 1 or samples_chunk_size < 1:
+        raise ValueError("Chunk sizes must be greater or equal to 1")
+
+    vcf_args = dict(vcf_args)
+    num_rows = vcf_args.pop("num_rows")
+    if vcf_args.get("random_seed") is None:
+        # All chunks have to share the seed for the samples
+        vcf_args["random_seed"] = int(np.random.SeedSequence().generate_state(1)[0])
+
+    contig_parts = contig_vcf_args(vcf_args, num_rows)
+    max_position = (
+        max(contig_args["num_rows"] for _, _, contig_args in contig_parts)
+        * POSITION_SPACING
+    )
+    if max_position > MAX_POSITION:
+        raise ValueError(
+            f"Max position {max_position} is too large for a VCF Zarr store, which "
+            f"stores positions up to {MAX_POSITION}"
+        )
+
+    contigs = vcf_args.get("contigs") or {vcf_args["chromosome"]: None}
+    # variant_contig is only metadata if all variants are on one contig
+    contig_dtype = None
+    if len(contigs) > 1:
+        contig_dtype = "|i1" if len(contigs) < 128 else "<i4"
+
+    print(f"Writing to Zarr store {store_path}")
+    virtual_vcf = VirtualVCF(num_rows=1, **vcf_args)
+    num_samples = virtual_vcf.num_samples
+    variant_chunks = (variants_chunk_size,)
+    store = ZarrStore(store_path, compress_level=compress_level)
+    store.write_group(
+        {
+            "vcf_zarr_version": VCF_ZARR_VERSION,
+            "source": f"fake-vcf {version}",
+            "vcf_header": next(virtual_vcf.blocks()),
+        }
+    )
+    for name, values, dimensions in [
+        ("sample_id", virtual_vcf.sample_names(), ["samples"]),
+        ("contig_id", list(contigs), ["contigs"]),
+        ("filter_id", ["PASS"], ["filters"]),
+    ]:
+        store.create_array(
+            name, (len(values),), (len(values),), "|O", dimensions, fill_value=0
+        )
+        store.write_chunk(name, (0,), values)
+    if None not in contigs.values():
+        store.create_array(
+            "contig_length",
+            (len(contigs),),
+            (len(contigs),),
+            "<i8",
+            ["contigs"],
+            fill_value=0,
+        )
+        store.write_chunk(
+            "contig_length", (0,), np.array(list(contigs.values()), dtype="<i8")
+        )
+
+    for name, shape, chunks, dtype, dimensions, fill_value in [
+        ("variant_position", (num_rows,), variant_chunks, "<i4", ["variants"], -1),
+        ("variant_quality", (num_rows,), variant_chunks, "<f4", ["variants"], "NaN"),
+        ("variant_id", (num_rows,), variant_chunks, "|O", ["variants"], 0),
+        (
+            "variant_allele",
+            (num_rows, virtual_vcf.max_alleles),
+            (variants_chunk_size, virtual_vcf.max_alleles),
+            "|O",
+            ["variants", "alleles"],
+            0,
+        ),
+        (
+            "call_genotype",
+            (num_rows, num_samples, PLOIDY),
+            (variants_chunk_size, samples_chunk_size, PLOIDY),
+            "|i1",
+            ["variants", "samples", "ploidy"],
+            -1,
+        ),
+        (
+            "call_genotype_phased",
+            (num_rows, num_samples),
+            (variants_chunk_size, samples_chunk_size),
+            "|b1",
+            ["variants", "samples"],
+            False,
+        ),
+        (
+            "variant_contig",
+            (num_rows,),
+            variant_chunks,
+            contig_dtype or "|i1",
+            ["variants"],
+            0,
+        ),
+        # Arrays with the same value everywhere are only metadata, all their chunks
+        # read as the fill value
+        (
+            "variant_filter",
+            (num_rows, 1),
+            (variants_chunk_size, 1),
+            "|b1",
+            ["variants", "filters"],
+            True,
+        ),
+        ("variant_id_mask", (num_rows,), variant_chunks, "|b1", ["variants"], False),
+        (
+            "call_genotype_mask",
+            (num_rows, num_samples, PLOIDY),
+            (variants_chunk_size, samples_chunk_size, PLOIDY),
+            "|b1",
+            ["variants", "samples", "ploidy"],
+            False,
+        ),
+    ]:
+        store.create_array(name, shape, chunks, dtype, dimensions, fill_value)
+    store.consolidate_metadata()
+
+    chunk_bounds = [
+        (start, min(start + variants_chunk_size, num_rows))
+        for start in range(0, num_rows, variants_chunk_size)
+    ]
+    import tqdm
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, tqdm.tqdm(
+        total=num_rows
+    ) as pbar:
+        chunk_futures = [
+            executor.submit(
+                write_variant_chunk,
+                store_path=store_path,
+                chunk_parts=_variant_chunk_parts(start, stop, contig_parts),
+                chunk=chunk,
+                variants_chunk_size=variants_chunk_size,
+                samples_chunk_size=samples_chunk_size,
+                compress_level=compress_level,
+                contig_dtype=contig_dtype,
+            )
+            for chunk, (start, stop) in enumerate(chunk_bounds)
+        ]
+        for chunk_future in chunk_futures:
+            chunk_rows = chunk_future.result()
+            pbar.update(chunk_rows)
+            if metrics is not None:
+                metrics.update(chunk_rows)
+
+    print(f"Done, data written to {store_path}")
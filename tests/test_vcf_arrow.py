@@ -0,0 +1,201 @@
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from fake_vcf import vcf_arrow
+from fake_vcf.vcf_arrow import (
+    ArrowVcfWriter,
+    GenotypeLayout,
+    allele_array,
+    arrow_blocks,
+    is_arrow_path,
+)
+from fake_vcf.vcf_faker import VirtualVCF
+from fake_vcf.vcf_generator import fake_vcf_data
+
+test_data_dir = Path(__file__).resolve().parent / "test_data"
+reference_dir = test_data_dir / "reference" / "bytes"
+
+
+def read_table(file_path):
+    if Path(file_path).suffix == ".parquet":
+        return pq.read_table(file_path)
+    with pa.ipc.open_file(file_path) as arrow_file:
+        return arrow_file.read_all()
+
+
+def vcf_columns(vcf_args):
+    """Parses the rendered VCF rows of a VirtualVCF into the columnar values."""
+    rows = [
+        row.rstrip("\n").split("\t")
+        for row in "".join(VirtualVCF(**vcf_args).blocks()).splitlines()
+        if not row.startswith("#")
+    ]
+    return {
+        "CHROM": [row[0] for row in rows],
+        "POS": [int(row[1]) for row in rows],
+        "ID": [row[2] for row in rows],
+        "REF": [row[3] for row in rows],
+        "ALT": [row[4] for row in rows],
+        "QUAL": [float(row[5]) for row in rows],
+        "GT": [[sample.split(":")[0] for sample in row[9:]] for row in rows],
+    }
+
+
+def write_arrow_file(file_path, vcf_args, layout):
+    with VirtualVCF(**vcf_args) as v_vcf, ArrowVcfWriter(
+        file_path, v_vcf, layout=layout
+    ) as arrow_file:
+        for row_values in arrow_blocks(v_vcf):
+            arrow_file.write(row_values)
+    return arrow_file
+
+
+@pytest.mark.generate_vcf
+def test_is_arrow_path():
+    assert is_arrow_path("test.parquet")
+    assert is_arrow_path(Path("test.arrow"))
+    assert not is_arrow_path("test.vcf.gz")
+    assert not is_arrow_path(None)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("alleles", ["ACGT", ["A", "C"], ["AC", "G", "TTA"], []])
+def test_allele_array(alleles):
+    assert allele_array(alleles).to_pylist() == list(alleles)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+@pytest.mark.parametrize("phased", [True, False])
+@pytest.mark.parametrize("num_samples", [1, 10, 200])
+@pytest.mark.parametrize("ref_dir", [None, reference_dir])
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_arrow_long_matches_vcf(
+    tmp_path, suffix, phased, num_samples, ref_dir, genotype_model
+):
+    vcf_args = dict(
+        genotype_model=genotype_model,
+        # The test reference only fits the positions of a few rows
+        num_rows=300 if ref_dir is None else 10,
+        num_samples=num_samples,
+        chromosome="chr1",
+        random_seed=5,
+        phased=phased,
+        reference_dir=ref_dir,
+        block_size=64 if ref_dir is None else 3,
+    )
+    write_arrow_file(tmp_path / f"test{suffix}", vcf_args, GenotypeLayout.LONG)
+
+    table = read_table(tmp_path / f"test{suffix}")
+    assert table.column_names == ["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "GT"]
+    assert table.to_pydict() == vcf_columns(vcf_args)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_arrow_wide_matches_vcf(tmp_path, suffix, genotype_model):
+    vcf_args = dict(
+        genotype_model=genotype_model,
+        num_rows=300,
+        num_samples=25,
+        chromosome="chr2",
+        random_seed=9,
+        sample_prefix="S",
+        block_size=64,
+    )
+    write_arrow_file(tmp_path / f"test{suffix}", vcf_args, GenotypeLayout.WIDE)
+
+    table = read_table(tmp_path / f"test{suffix}")
+    sample_names = [f"S{i:07d}" for i in range(1, 26)]
+    assert table.column_names[6:] == sample_names
+    expected = vcf_columns(vcf_args)
+    genotypes = expected.pop("GT")
+    assert table.select(list(expected)).to_pydict() == expected
+    assert [
+        list(row) for row in zip(*table.select(sample_names).to_pydict().values())
+    ] == genotypes
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("layout", [GenotypeLayout.LONG, GenotypeLayout.WIDE])
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_arrow_multiallelic_indels_match_vcf(tmp_path, layout, genotype_model):
+    vcf_args = dict(
+        genotype_model=genotype_model,
+        num_rows=200,
+        num_samples=10,
+        chromosome="chr1",
+        random_seed=5,
+        block_size=64,
+        multiallelic_rate=0.3,
+        insertion_rate=0.2,
+        deletion_rate=0.2,
+    )
+    write_arrow_file(tmp_path / "test.parquet", vcf_args, layout)
+
+    table = read_table(tmp_path / "test.parquet")
+    expected = vcf_columns(vcf_args)
+    genotypes = expected.pop("GT")
+    assert table.select(list(expected)).to_pydict() == expected
+    if layout == GenotypeLayout.LONG:
+        assert table.column("GT").to_pylist() == genotypes
+    else:
+        sample_columns = table.select(table.column_names[6:]).to_pydict().values()
+        assert [list(row) for row in zip(*sample_columns)] == genotypes
+
+
+@pytest.mark.generate_vcf
+def test_parquet_row_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr(vcf_arrow, "ROW_GROUP_GENOTYPES", 1000)
+    vcf_args = dict(
+        num_rows=1000, num_samples=10, chromosome="chr1", random_seed=1, block_size=30
+    )
+    arrow_file = write_arrow_file(
+        tmp_path / "test.parquet", vcf_args, GenotypeLayout.LONG
+    )
+
+    assert arrow_file.row_group_rows == 100
+    metadata = pq.ParquetFile(tmp_path / "test.parquet").metadata
+    # Blocks of 30 rows are collected until there are at least 100 rows
+    assert metadata.num_rows == 1000
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [
+        120
+    ] * 8 + [40]
+
+
+@pytest.mark.generate_vcf
+def test_arrow_writer_unknown_suffix(tmp_path):
+    with pytest.raises(ValueError):
+        ArrowVcfWriter(
+            tmp_path / "test.vcf",
+            VirtualVCF(num_rows=1, num_samples=1, chromosome="chr1"),
+        )
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("layout", ["long", "wide"])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_fake_vcf_data_parquet(tmp_path, layout, workers):
+    output_path = tmp_path / "test.parquet"
+    fake_vcf_data(
+        fake_vcf_path=output_path,
+        num_rows=50,
+        num_samples=4,
+        chromosome="chr3",
+        seed=2,
+        sample_prefix="S",
+        phased=True,
+        large_format=True,
+        reference_dir_path=None,
+        workers=workers,
+        genotype_layout=layout,
+    )
+
+    table = pq.read_table(output_path)
+    assert table.num_rows == 50
+    assert table.num_columns == (7 if layout == "long" else 10)
+    assert set(table.column("CHROM").to_pylist()) == {"chr3"}
@@ -0,0 +1,338 @@
+import gzip
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fake_vcf import vcf_faker
+from fake_vcf.vcf_bcf import (
+    BCF_MAGIC,
+    BCF_MAX_POSITION,
+    bcf_blocks,
+    bcf_fragment_blocks,
+    check_bcf_position,
+    encode_genotype,
+    parse_header_dictionaries,
+    typed_ints,
+    typed_string,
+)
+from fake_vcf.vcf_bgzf import BgzfWriter
+from fake_vcf.vcf_faker import VirtualVCF
+
+test_data_dir = Path(__file__).resolve().parent / "test_data"
+reference_dir = test_data_dir / "reference"
+
+TYPE_DTYPES = {1: "<i1", 2: "<i2", 3: "<i4", 5: "<f4", 7: "S1"}
+INT_END_OF_VECTOR = {1: -127, 2: -32767, 3: -2147483647}
+
+
+def read_typed_value(data, offset):
+    descriptor = data[offset]
+    offset += 1
+    value_type, count = descriptor & 0xF, descriptor >> 4
+    if count == 15:
+        count, offset = read_typed_value(data, offset)
+        count = count[0]
+    values = np.frombuffer(
+        data, dtype=TYPE_DTYPES[value_type], count=count, offset=offset
+    )
+    offset += count * values.itemsize
+    if value_type == 7:
+        return values.tobytes().decode(), offset
+    return values.tolist(), offset
+
+
+def decode_genotype(values):
+    genotype = str((values[0] >> 1) - 1)
+    for value in values[1:]:
+        genotype += ("|" if value & 1 else "/") + str((value >> 1) - 1)
+    return genotype
+
+
+def read_bcf(data):
+    """Decodes a BCF file to VCF text rows, enough for the fields fake-vcf writes."""
+    assert data[:5] == BCF_MAGIC
+    header_length = struct.unpack_from("<I", data, 5)[0]
+    header = data[9 : 9 + header_length - 1].decode()
+    assert data[9 + header_length - 1] == 0
+    strings, contigs, _ = parse_header_dictionaries(header)
+    strings = {index: key for key, index in strings.items()}
+    contigs = {index: contig for contig, index in contigs.items()}
+
+    rows = []
+    offset = 9 + header_length
+    while offset < len(data):
+        shared_length, individual_length = struct.unpack_from("<II", data, offset)
+        shared = data[offset + 8 : offset + 8 + shared_length]
+        individual = data[
+            offset + 8 + shared_length : offset + 8 + shared_length + individual_length
+        ]
+        offset += 8 + shared_length + individual_length
+
+        contig, position, rlen, qual, allele_info, format_samples = struct.unpack_from(
+            "<iiifII", shared
+        )
+        num_alleles, num_info = allele_info >> 16, allele_info & 0xFFFF
+        num_formats, num_samples = format_samples >> 24, format_samples & 0xFFFFFF
+        shared_offset = 24
+        vid, shared_offset = read_typed_value(shared, shared_offset)
+        alleles = []
+        for _ in range(num_alleles):
+            allele, shared_offset = read_typed_value(shared, shared_offset)
+            alleles.append(allele)
+        assert rlen == len(alleles[0])
+        filters, shared_offset = read_typed_value(shared, shared_offset)
+        info = []
+        for _ in range(num_info):
+            key, shared_offset = read_typed_value(shared, shared_offset)
+            value, shared_offset = read_typed_value(shared, shared_offset)
+            if isinstance(value, list):
+                value = ",".join(f"{v:g}" for v in value)
+            info.append(f"{strings[key[0]]}={value}")
+        assert shared_offset == len(shared)
+
+        format_keys = []
+        sample_values = [[] for _ in range(num_samples)]
+        individual_offset = 0
+        for _ in range(num_formats):
+            key, individual_offset = read_typed_value(individual, individual_offset)
+            format_keys.append(strings[key[0]])
+            descriptor = individual[individual_offset]
+            individual_offset += 1
+            value_type, count = descriptor & 0xF, descriptor >> 4
+            values = np.frombuffer(
+                individual,
+                dtype=TYPE_DTYPES[value_type],
+                count=count * num_samples,
+                offset=individual_offset,
+            ).reshape(num_samples, count)
+            individual_offset += values.nbytes
+            for sample, sample_value in enumerate(values.tolist()):
+                sample_value = [
+                    v for v in sample_value if v != INT_END_OF_VECTOR[value_type]
+                ]
+                sample_values[sample].append(
+                    decode_genotype(sample_value)
+                    if format_keys[-1] == "GT"
+                    else ",".join(str(v) for v in sample_value)
+                )
+        assert individual_offset == len(individual)
+
+        rows.append(
+            "\t".join(
+                [
+                    contigs[contig],
+                    str(position + 1),
+                    vid,
+                    alleles[0],
+                    ",".join(alleles[1:]),
+                    f"{qual:g}",
+                    ";".join(strings[f] for f in filters),
+                    ";".join(info),
+                    ":".join(format_keys),
+                ]
+                + [":".join(values) for values in sample_values]
+            )
+            + "\n"
+        )
+    return header, rows
+
+
+def normalize_vcf_row(row):
+    # The DP value 00 of the large format is written as 0 in BCF
+    return row.replace(":00:", ":0:")
+
+
+@pytest.mark.generate_vcf
+def test_typed_values():
+    assert typed_ints([0]) == b"\x11\x00"
+    assert typed_ints([1, 2]) == b"\x21\x01\x02"
+    assert typed_ints([1000]) == b"\x12\xe8\x03"
+    assert typed_ints([100_000]) == b"\x13\xa0\x86\x01\x00"
+    assert typed_ints(list(range(15))) == b"\xf1\x11\x0f" + bytes(range(15))
+    assert typed_string("rs1") == b"\x37rs1"
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("genotype", "expected"),
+    [
+        ("0|0", [2, 3]),
+        ("0|1", [2, 5]),
+        ("1|0", [4, 3]),
+        ("0/1", [2, 4]),
+        ("1/1", [4, 4]),
+    ],
+)
+def test_encode_genotype(genotype, expected):
+    assert encode_genotype(genotype) == expected
+
+
+@pytest.mark.generate_vcf
+def test_parse_header_dictionaries():
+    virtual_vcf = VirtualVCF(num_rows=1, num_samples=1, chromosome="chr5")
+    strings, contigs, value_types = parse_header_dictionaries(virtual_vcf.header)
+
+    assert strings == {
+        "PASS": 0,
+        "NS": 1,
+        "AF": 2,
+        "DP": 3,
+        "GT": 4,
+        "AD": 5,
+        "GQ": 6,
+        "PL": 7,
+    }
+    assert contigs == {"chr5": 0}
+    assert value_types["INFO/AF"] == "Float"
+    assert value_types["FORMAT/PL"] == "Integer"
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("large_format", [True, False])
+@pytest.mark.parametrize("phased", [True, False])
+@pytest.mark.parametrize("num_samples", [1, 10, 1000])
+@pytest.mark.parametrize("ref_dir", [None, reference_dir / "bytes"])
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_bcf_blocks_match_vcf(
+    large_format, phased, num_samples, ref_dir, genotype_model
+):
+    vcf_args = dict(
+        genotype_model=genotype_model,
+        # The test reference only fits the positions of a few rows
+        num_rows=200 if ref_dir is None else 10,
+        num_samples=num_samples,
+        chromosome="chr1",
+        random_seed=42,
+        phased=phased,
+        large_format=large_format,
+        reference_dir=ref_dir,
+        block_size=33 if ref_dir is None else 3,
+    )
+    vcf_text = "".join(VirtualVCF(**vcf_args).blocks())
+    with VirtualVCF(**vcf_args) as v_vcf:
+        bcf_data = b"".join(bcf_blocks(v_vcf))
+
+    header, rows = read_bcf(bcf_data)
+    vcf_lines = vcf_text.splitlines(keepends=True)
+    assert header == "".join(line for line in vcf_lines if line.startswith("#"))
+    assert rows == [
+        normalize_vcf_row(line) for line in vcf_lines if not line.startswith("#")
+    ]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("phased", [True, False])
+@pytest.mark.parametrize("ref_dir", [None, reference_dir / "bytes"])
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_bcf_blocks_multiallelic_indels(phased, ref_dir, genotype_model):
+    vcf_args = dict(
+        genotype_model=genotype_model,
+        # The test reference only fits the positions of a few rows
+        num_rows=200 if ref_dir is None else 10,
+        num_samples=13,
+        chromosome="chr1",
+        random_seed=4,
+        phased=phased,
+        reference_dir=ref_dir,
+        block_size=9,
+        multiallelic_rate=0.3,
+        insertion_rate=0.2,
+        deletion_rate=0.3,
+    )
+    vcf_text = "".join(VirtualVCF(**vcf_args).blocks())
+    with VirtualVCF(**vcf_args) as v_vcf:
+        _, rows = read_bcf(b"".join(bcf_blocks(v_vcf)))
+
+    assert rows == [
+        normalize_vcf_row(line)
+        for line in vcf_text.splitlines(keepends=True)
+        if not line.startswith("#")
+    ]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_bcf_blocks_sample_chunks(monkeypatch, genotype_model):
+    vcf_args = dict(
+        num_rows=20,
+        num_samples=10,
+        chromosome="chr1",
+        random_seed=3,
+        genotype_model=genotype_model,
+    )
+    expected = b"".join(bcf_blocks(VirtualVCF(**vcf_args)))
+
+    monkeypatch.setattr(vcf_faker, "SAMPLE_CHUNK_SIZE", 3)
+    header_fragments = list(next(bcf_fragment_blocks(VirtualVCF(**vcf_args))))
+    # The magic and size, the fixed columns, 4 chunks of sample names, the end of
+    # the line and the terminating NUL
+    assert len(header_fragments) == 8
+    assert b"".join(bcf_blocks(VirtualVCF(**vcf_args))) == expected
+
+
+@pytest.mark.generate_vcf
+def test_bcf_blocks_without_header():
+    with VirtualVCF(
+        num_rows=10, num_samples=5, chromosome="chr1", include_header=False
+    ) as v_vcf:
+        blocks = list(bcf_blocks(v_vcf))
+
+    assert not any(block.startswith(BCF_MAGIC) for block in blocks)
+
+
+@pytest.mark.generate_vcf
+def test_bcf_max_position():
+    check_bcf_position(BCF_MAX_POSITION)
+    with pytest.raises(ValueError, match="too large for BCF"):
+        check_bcf_position(BCF_MAX_POSITION + 1)
+
+    # Positions go past 2^31 at about 21.5M rows
+    v_vcf = VirtualVCF(num_rows=30_000_000, num_samples=5, chromosome="chr1")
+    assert v_vcf.max_position > BCF_MAX_POSITION
+    with pytest.raises(ValueError, match="too large for BCF"):
+        next(bcf_fragment_blocks(v_vcf))
+
+
+@pytest.mark.generate_vcf
+def test_bcf_blocks_after_rows():
+    with VirtualVCF(num_rows=10, num_samples=5, chromosome="chr1") as v_vcf:
+        next(v_vcf)
+        next(v_vcf)
+        with pytest.raises(ValueError):
+            list(bcf_blocks(v_vcf))
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+@pytest.mark.parametrize("variant_rate", [0.0, 0.3])
+@pytest.mark.parametrize("format_model", ["fixed", "reads"])
+def test_bcf_read_with_pysam(tmp_path, genotype_model, variant_rate, format_model):
+    pysam = pytest.importorskip("pysam")
+    vcf_args = dict(
+        num_rows=100,
+        num_samples=20,
+        chromosome="chr1",
+        random_seed=1,
+        genotype_model=genotype_model,
+        multiallelic_rate=variant_rate,
+        insertion_rate=variant_rate,
+        deletion_rate=variant_rate,
+        format_model=format_model,
+    )
+
+    (tmp_path / "test.vcf").write_text("".join(VirtualVCF(**vcf_args).blocks()))
+    with BgzfWriter(tmp_path / "test.bcf") as bcf_file, VirtualVCF(**vcf_args) as v_vcf:
+        for block in bcf_blocks(v_vcf):
+            bcf_file.write(block)
+
+    with pysam.VariantFile(tmp_path / "test.bcf") as bcf_file, pysam.VariantFile(
+        tmp_path / "test.vcf"
+    ) as vcf_file:
+        assert [str(r) for r in bcf_file] == [str(r) for r in vcf_file]
+
+
+def read_bcf_file(file_path):
+    with gzip.open(file_path, "rb") as bcf_file:
+        return read_bcf(bcf_file.read())
@@ -0,0 +1,231 @@
+import gzip
+import random
+import struct
+
+import pytest
+
+from fake_vcf.vcf_bgzf import (
+    BGZF_EOF,
+    MAX_BLOCK_DATA_SIZE,
+    MAX_BLOCK_SIZE,
+    BgzfReader,
+    BgzfWriter,
+    build_gzi_index,
+    compress_block,
+    is_bgzf,
+    is_gzipped,
+    read_gzi_index,
+    write_gzi_index,
+)
+
+
+def read_bgzf_blocks(file_path):
+    with open(file_path, "rb") as bgzf_file:
+        data = bgzf_file.read()
+
+    blocks = []
+    offset = 0
+    while offset < len(data):
+        assert data[offset : offset + 4] == b"\x1f\x8b\x08\x04"
+        assert data[offset + 12 : offset + 16] == b"BC\x02\x00"
+        block_size = struct.unpack_from("<H", data, offset + 16)[0] + 1
+        blocks.append(data[offset : offset + block_size])
+        offset += block_size
+    return blocks
+
+
+def random_data(size, seed=42):
+    rng = random.Random(seed)
+    return "".join(rng.choice("ACGT\t|/01\n") for _ in range(size)).encode()
+
+
+@pytest.mark.generate_vcf
+def test_compress_block_eof():
+    assert compress_block(b"") == BGZF_EOF
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("compress_level", range(10))
+def test_compress_block_incompressible(compress_level):
+    data = random.Random(1).randbytes(MAX_BLOCK_DATA_SIZE)
+    block = compress_block(data, compress_level=compress_level)
+    assert len(block) <= MAX_BLOCK_SIZE
+    assert gzip.decompress(block) == data
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("size", "threads", "compress_level"),
+    [
+        (0, 1, 6),
+        (10, 1, 6),
+        (MAX_BLOCK_DATA_SIZE, 1, 6),
+        (MAX_BLOCK_DATA_SIZE + 1, 1, 6),
+        (1_000_000, 1, 1),
+        (1_000_000, 4, 1),
+        (1_000_000, 4, 9),
+    ],
+)
+def test_bgzf_writer(tmp_path, size, threads, compress_level):
+    bgzf_path = tmp_path / "test.gz"
+    data = random_data(size)
+
+    with BgzfWriter(
+        bgzf_path, compress_level=compress_level, threads=threads
+    ) as bgzf_file:
+        for start in range(0, size, 12345):
+            bgzf_file.write(data[start : start + 12345])
+
+    blocks = read_bgzf_blocks(bgzf_path)
+    assert blocks[-1] == BGZF_EOF
+    assert all(len(block) <= MAX_BLOCK_SIZE for block in blocks)
+    assert len(blocks) == 1 + -(-size // MAX_BLOCK_DATA_SIZE)
+    with gzip.open(bgzf_path, "rb") as bgzf_file:
+        assert bgzf_file.read() == data
+
+
+@pytest.mark.generate_vcf
+def test_bgzf_writer_threads_same_output(tmp_path):
+    data = random_data(500_000).decode()
+
+    for threads in [1, 2, 8]:
+        with BgzfWriter(tmp_path / f"test_{threads}.gz", threads=threads) as bgzf_file:
+            bgzf_file.write(data)
+
+    single_thread_data = (tmp_path / "test_1.gz").read_bytes()
+    assert (tmp_path / "test_2.gz").read_bytes() == single_thread_data
+    assert (tmp_path / "test_8.gz").read_bytes() == single_thread_data
+
+
+@pytest.mark.generate_vcf
+def test_bgzf_writer_writelines(tmp_path):
+    data = random_data(200_000)
+    fragments = [
+        memoryview(data)[start : start + 7000] for start in range(0, 200_000, 7000)
+    ]
+
+    with BgzfWriter(tmp_path / "write.gz") as bgzf_file:
+        bgzf_file.write(data)
+    with BgzfWriter(tmp_path / "writelines.gz") as bgzf_file:
+        bgzf_file.writelines(fragments[:10])
+        assert bgzf_file.tell() == 70_000
+        bgzf_file.writelines(fragments[10:])
+
+    assert (tmp_path / "writelines.gz").read_bytes() == (
+        tmp_path / "write.gz"
+    ).read_bytes()
+
+
+@pytest.mark.generate_vcf
+def test_bgzf_writer_writelines_large_fragments(tmp_path):
+    data = random_data(3 * MAX_BLOCK_DATA_SIZE + 100)
+
+    with BgzfWriter(tmp_path / "write.gz") as bgzf_file:
+        bgzf_file.write(data)
+    with BgzfWriter(tmp_path / "writelines.gz") as bgzf_file:
+        # Large fragments and iterators are compressed as they are buffered
+        bgzf_file.writelines(iter([data[:10], memoryview(data)[10:]]))
+        assert bgzf_file.tell() == len(data)
+        assert len(bgzf_file.block_offsets.compressed_starts) == 3
+
+    assert (tmp_path / "writelines.gz").read_bytes() == (
+        tmp_path / "write.gz"
+    ).read_bytes()
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("compress_level", "threads"),
+    [(-1, 1), (10, 1), (6, 0)],
+)
+def test_bgzf_writer_invalid_args(tmp_path, compress_level, threads):
+    with pytest.raises(ValueError):
+        BgzfWriter(tmp_path / "test.gz", compress_level=compress_level, threads=threads)
+
+
+def write_small_blocks(bgzf_path, data, block_data_size):
+    with open(bgzf_path, "wb") as bgzf_file:
+        for start in range(0, len(data), block_data_size):
+            bgzf_file.write(compress_block(data[start : start + block_data_size]))
+        bgzf_file.write(BGZF_EOF)
+
+
+@pytest.mark.reference_import
+def test_is_bgzf(tmp_path):
+    data = random_data(1000)
+    (tmp_path / "plain.txt").write_bytes(data)
+    (tmp_path / "test.gz").write_bytes(gzip.compress(data))
+    with BgzfWriter(tmp_path / "test.bgz") as bgzf_file:
+        bgzf_file.write(data)
+
+    assert not is_gzipped(tmp_path / "plain.txt")
+    assert not is_bgzf(tmp_path / "plain.txt")
+    assert is_gzipped(tmp_path / "test.gz")
+    assert not is_bgzf(tmp_path / "test.gz")
+    assert is_gzipped(tmp_path / "test.bgz")
+    assert is_bgzf(tmp_path / "test.bgz")
+
+
+@pytest.mark.reference_import
+def test_gzi_index(tmp_path):
+    bgzf_path = tmp_path / "test.gz"
+    write_small_blocks(bgzf_path, random_data(10_000), block_data_size=1000)
+
+    block_offsets = build_gzi_index(bgzf_path)
+    blocks = read_bgzf_blocks(bgzf_path)
+    assert len(block_offsets) == 10
+    assert block_offsets[0] == (0, 0)
+    assert block_offsets[3] == (sum(len(block) for block in blocks[:3]), 3000)
+
+    write_gzi_index(block_offsets, tmp_path / "test.gz.gzi")
+    assert (tmp_path / "test.gz.gzi").stat().st_size == 8 + 9 * 16
+    assert read_gzi_index(tmp_path / "test.gz.gzi") == block_offsets
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("block_data_size", [100, 1000, MAX_BLOCK_DATA_SIZE])
+def test_bgzf_reader(tmp_path, block_data_size):
+    bgzf_path = tmp_path / "test.gz"
+    data = random_data(20_000)
+    write_small_blocks(bgzf_path, data, block_data_size=block_data_size)
+
+    rng = random.Random(7)
+    with BgzfReader(bgzf_path) as bgzf_file:
+        assert bgzf_file.read() == data
+        for _ in range(100):
+            offset = rng.randrange(len(data) + 10)
+            size = rng.randrange(3000)
+            bgzf_file.seek(offset)
+            assert bgzf_file.read(size) == data[offset : offset + size]
+
+    assert (tmp_path / "test.gz.gzi").exists()
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("threads", [1, 3])
+def test_bgzf_writer_block_offsets(tmp_path, threads):
+    bgzf_path = tmp_path / "test.gz"
+    data = random_data(300_000)
+
+    offsets = []
+    with BgzfWriter(bgzf_path, threads=threads) as bgzf_file:
+        for start in range(0, len(data), 10_000):
+            offsets.append(bgzf_file.tell())
+            bgzf_file.write(data[start : start + 10_000])
+
+    assert offsets == list(range(0, len(data), 10_000))
+    block_offsets = bgzf_file.block_offsets
+    assert list(
+        zip(block_offsets.compressed_starts, block_offsets.uncompressed_starts)
+    ) == build_gzi_index(bgzf_path)
+    assert block_offsets.compressed_size == bgzf_path.stat().st_size - len(BGZF_EOF)
+    assert (
+        block_offsets.virtual_offset(len(data)) == block_offsets.compressed_size << 16
+    )
+
+    with BgzfReader(bgzf_path) as bgzf_file:
+        for offset in [0, 1, MAX_BLOCK_DATA_SIZE - 1, MAX_BLOCK_DATA_SIZE, 123_456]:
+            virtual_offset = block_offsets.virtual_offset(offset)
+            bgzf_file._file.seek(virtual_offset >> 16)
+            bgzf_file._read_block()
+            assert bgzf_file._block_data[virtual_offset & 0xFFFF] == data[offset]
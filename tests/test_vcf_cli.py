@@ -1,3 +1,8 @@
+import gzip
+import json
+import pstats
+import subprocess
+import sys
 from pathlib import Path
 
 import pytest
@@ -5,6 +10,7 @@ from typer.testing import CliRunner
 
 from fake_vcf import version
 from fake_vcf.__main__ import app
+from tests.test_vcf_bcf import normalize_vcf_row, read_bcf_file
 from tests.test_vcf_fake import NR_NON_SAMPLE_COL
 
 runner = CliRunner()
@@ -13,6 +19,10 @@ GENERATE_CMD = "generate"
 IMPORT_REFERENCE_CMD = "import-reference"
 test_data_dir = Path(__file__).resolve().parent / "test_data"
 reference_dir = test_data_dir / "reference/parquet"
+# Imported only by the code paths that need them, never at startup
+LAZY_MODULES = {"pyarrow", "tqdm", "Bio"}
+# Imported only by the generate and import-reference commands
+COMMAND_MODULES = {"numpy"}
 
 
 def is_gz_file(filepath):
@@ -110,6 +120,8 @@ def test_face_vcf_generation_compression(tmp_path):
     assert result.exit_code == 0
     assert output_file.exists()
     assert "Using compression" in result.stdout
+    assert "Stage times: generate" in result.stdout
+    assert ", compress " in result.stdout
 
     # If biopython is installed check that we wrote a bgzip file
     try:
@@ -253,3 +265,610 @@ def test_face_vcf_generation_nr_samples_with_reference(expected_sample_count):
     )
     assert result.exit_code == 0
     assert sample_count == expected_sample_count + NR_NON_SAMPLE_COL
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("expected_rows", "workers"),
+    [
+        (1, 2),
+        (10, 2),
+        (10, 3),
+        (101, 4),
+    ],
+)
+def test_face_vcf_generation_workers_nr_rows(expected_rows, workers):
+    result = runner.invoke(
+        app, [GENERATE_CMD, "-r", f"{expected_rows}", "-w", f"{workers}"]
+    )
+    rows = [r for r in result.stdout.split("\n") if r.startswith("chr1")]
+    positions = [int(r.split("\t")[1]) for r in rows]
+    assert result.exit_code == 0
+    assert len(rows) == expected_rows
+    assert positions == sorted(set(positions))
+    assert result.stdout.count("#CHROM") == 1
+
+
+@pytest.mark.generate_vcf
+def test_face_vcf_generation_workers_seed_same(tmp_path):
+    args = [GENERATE_CMD, "--seed", "42", "-r", "100", "-w", "3"]
+
+    result_1 = runner.invoke(app, args)
+    result_2 = runner.invoke(app, args)
+    assert result_1.exit_code == 0
+    assert result_2.exit_code == 0
+    assert result_1.stdout == result_2.stdout
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("file_name", ["example.vcf", "example.vcf.gz"])
+def test_face_vcf_generation_workers_output(tmp_path, file_name):
+    output_file = tmp_path / file_name
+    args = [GENERATE_CMD, "--seed", "42", "-r", "100", "-w", "3"]
+    result = runner.invoke(app, args + ["-o", output_file])
+    std_out_result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    assert list(tmp_path.iterdir()) == [output_file]
+
+    if output_file.suffix == ".gz":
+        assert is_gz_file(output_file)
+        with gzip.open(output_file, "rt") as vcf_file:
+            vcf_data = vcf_file.read()
+    else:
+        vcf_data = output_file.read_text()
+    assert vcf_data == std_out_result.stdout
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("compress_args", "workers"),
+    [
+        (["--compress-threads", "1"], "1"),
+        (["--compress-threads", "4"], "1"),
+        (["--compress-level", "0"], "1"),
+        (["--compress-level", "9", "--compress-threads", "2"], "1"),
+        (["--compress-threads", "2"], "2"),
+    ],
+)
+def test_face_vcf_generation_compression_args(tmp_path, compress_args, workers):
+    output_file = tmp_path / "example.vcf.gz"
+    args = [GENERATE_CMD, "--seed", "42", "-r", "1000", "-s", "100", "-w", workers]
+    result = runner.invoke(app, args + compress_args + ["-o", output_file])
+    std_out_result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    assert is_bgzip_compressed(output_file)
+
+    with gzip.open(output_file, "rt") as vcf_file:
+        assert vcf_file.read() == std_out_result.stdout
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("reference_format", ["bytes", "parquet"])
+def test_fake_vcf_reference_import_format(tmp_path, reference_format):
+    small_reference_path = test_data_dir / "reference/reference_small.fa"
+
+    result = runner.invoke(
+        app,
+        [
+            IMPORT_REFERENCE_CMD,
+            "--reference-format",
+            reference_format,
+            small_reference_path.as_posix(),
+            tmp_path.as_posix(),
+        ],
+    )
+    assert result.exit_code == 0
+
+    result = runner.invoke(app, [GENERATE_CMD, "-r", "5", "-f", tmp_path.as_posix()])
+    row_count = len([r for r in result.stdout.split("\n") if r.startswith("chr1")])
+    assert result.exit_code == 0
+    assert row_count == 5
+
+
+@pytest.mark.reference_import
+def test_fake_vcf_reference_import_chunk_size(tmp_path):
+    small_reference_path = test_data_dir / "reference/reference_small.fa"
+
+    result = runner.invoke(
+        app,
+        [
+            IMPORT_REFERENCE_CMD,
+            "--chunk-size",
+            "100",
+            small_reference_path.as_posix(),
+            tmp_path.as_posix(),
+        ],
+    )
+    assert result.exit_code == 0
+    assert (tmp_path / "reference_chr1.bases").stat().st_size == 1066
+
+
+@pytest.mark.reference_import
+def test_fake_vcf_reference_import_workers(tmp_path):
+    small_reference_path = tmp_path / "reference_small.fa"
+    small_reference_path.write_bytes(
+        (test_data_dir / "reference/reference_small.fa").read_bytes()
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            IMPORT_REFERENCE_CMD,
+            "-w",
+            "2",
+            small_reference_path.as_posix(),
+            (tmp_path / "reference").as_posix(),
+        ],
+    )
+    assert result.exit_code == 0
+    assert (tmp_path / "reference_small.fa.fai").exists()
+    assert (tmp_path / "reference" / "reference_chr1.bases").stat().st_size == 1066
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", ["1", "3"])
+def test_face_vcf_generation_bcf(tmp_path, workers):
+    output_file = tmp_path / "example.bcf"
+    args = [GENERATE_CMD, "--seed", "42", "-r", "100", "-s", "20", "-w", workers]
+    result = runner.invoke(app, args + ["-o", output_file])
+    std_out_result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    assert list(tmp_path.iterdir()) == [output_file]
+    assert is_bgzip_compressed(output_file)
+
+    header, rows = read_bcf_file(output_file)
+    vcf_lines = std_out_result.stdout.splitlines(keepends=True)
+    assert header.count("#CHROM") == 1
+    assert rows == [
+        normalize_vcf_row(line) for line in vcf_lines if not line.startswith("#")
+    ]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("file_name", "index_format", "workers"),
+    [
+        ("example.vcf.gz", "tbi", "1"),
+        ("example.vcf.gz", "csi", "1"),
+        ("example.bcf", "csi", "1"),
+        ("example.vcf.gz", "tbi", "2"),
+        ("example.bcf", "csi", "2"),
+    ],
+)
+def test_face_vcf_generation_index(tmp_path, file_name, index_format, workers):
+    output_file = tmp_path / file_name
+    result = runner.invoke(
+        app,
+        [GENERATE_CMD, "-r", "100", "-w", workers, "--index", index_format]
+        + ["-o", output_file],
+    )
+    assert result.exit_code == 0
+    assert sorted(tmp_path.iterdir()) == [
+        output_file,
+        tmp_path / f"{file_name}.{index_format}",
+    ]
+    with gzip.open(tmp_path / f"{file_name}.{index_format}", "rb") as index_file:
+        assert index_file.read(4) == f"{index_format.upper()}\1".encode()
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("file_name", "index_format"),
+    [(None, "tbi"), ("example.vcf", "tbi"), ("example.bcf", "tbi")],
+)
+def test_face_vcf_generation_index_invalid(tmp_path, file_name, index_format):
+    args = [GENERATE_CMD, "-r", "10", "--index", index_format]
+    if file_name is not None:
+        args += ["-o", tmp_path / file_name]
+    result = runner.invoke(app, args)
+    assert result.exit_code == 1
+    assert isinstance(result.exception, ValueError)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("file_name", ["example.parquet", "example.arrow"])
+@pytest.mark.parametrize("genotype_layout", ["long", "wide"])
+def test_face_vcf_generation_arrow(tmp_path, file_name, genotype_layout):
+    output_file = tmp_path / file_name
+    result = runner.invoke(
+        app,
+        [GENERATE_CMD, "-r", "20", "-s", "3", "-o", output_file]
+        + ["--genotype-layout", genotype_layout],
+    )
+    assert result.exit_code == 0
+    assert output_file.exists()
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_face_vcf_generation_zarr(tmp_path, workers):
+    output_store = tmp_path / "example.zarr"
+    result = runner.invoke(
+        app,
+        [GENERATE_CMD, "-r", "30", "-s", "5", "-w", workers, "-o", output_store]
+        + ["--variants-chunk-size", "10", "--samples-chunk-size", "2"],
+    )
+    assert result.exit_code == 0
+    assert (output_store / ".zmetadata").exists()
+    assert sorted(p.name for p in (output_store / "call_genotype").iterdir()) == [
+        ".zarray",
+        ".zattrs",
+    ] + [f"{v}.{s}.0" for v in range(3) for s in range(3)]
+
+
+def contig_header_and_rows(vcf_text):
+    lines = vcf_text.splitlines()
+    contig_lines = [line for line in lines if line.startswith("##contig")]
+    rows = [line.split("\t") for line in lines if line and not line.startswith("#")]
+    return contig_lines, rows
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", ["1", "3"])
+def test_face_vcf_generation_chromosomes(workers):
+    result = runner.invoke(
+        app,
+        [GENERATE_CMD, "-r", "31", "-c", "chr2", "-c", "chrX", "-c", "chr1"]
+        + ["-w", workers],
+    )
+    assert result.exit_code == 0
+    contig_lines, rows = contig_header_and_rows(result.stdout)
+    assert contig_lines == [
+        "##contig=<ID=chr2>",
+        "##contig=<ID=chrX>",
+        "##contig=<ID=chr1>",
+    ]
+    assert result.stdout.count("#CHROM") == 1
+    # Without a reference the rows are split evenly
+    assert [row[0] for row in rows] == ["chr2"] * 11 + ["chrX"] * 10 + ["chr1"] * 10
+    for chromosome in ["chr2", "chrX", "chr1"]:
+        positions = [int(row[1]) for row in rows if row[0] == chromosome]
+        assert positions == sorted(set(positions))
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", ["1", "4"])
+@pytest.mark.parametrize("file_name", ["example.vcf", "example.vcf.gz"])
+def test_face_vcf_generation_all_contigs(tmp_path, workers, file_name):
+    output_file = tmp_path / file_name
+    bytes_reference_dir = test_data_dir / "reference/bytes"
+    result = runner.invoke(
+        app,
+        [GENERATE_CMD, "-r", "100", "-c", "all", "-f", bytes_reference_dir]
+        + ["-w", workers, "--seed", "3", "-o", output_file],
+    )
+    assert result.exit_code == 0
+    with (gzip.open if file_name.endswith(".gz") else open)(
+        output_file, "rt"
+    ) as vcf_file:
+        contig_lines, rows = contig_header_and_rows(vcf_file.read())
+
+    assert contig_lines[:2] == [
+        "##contig=<ID=chr1,length=1066>",
+        "##contig=<ID=chr2,length=1314>",
+    ]
+    assert len(contig_lines) == 10
+    chromosomes = [row[0] for row in rows]
+    assert len(rows) == 100
+    # The rows are split by contig length and the contigs are in reference order
+    assert chromosomes.count("chr4") == 14
+    assert chromosomes.count("chr10") == 7
+    assert list(dict.fromkeys(chromosomes)) == [f"chr{c}" for c in range(1, 11)]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_face_vcf_generation_chromosomes_bcf_index(tmp_path, workers):
+    pysam = pytest.importorskip("pysam")
+    output_file = tmp_path / "example.bcf"
+    result = runner.invoke(
+        app,
+        [GENERATE_CMD, "-r", "300", "-c", "chr3", "-c", "chr1", "-w", workers]
+        + ["--index", "csi", "-o", output_file],
+    )
+    assert result.exit_code == 0
+    with pysam.VariantFile(output_file) as bcf_file:
+        assert list(bcf_file.header.contigs) == ["chr3", "chr1"]
+        records = [(record.chrom, record.pos) for record in bcf_file]
+        assert [chrom for chrom, _ in records] == ["chr3"] * 150 + ["chr1"] * 150
+        for chromosome in ["chr3", "chr1"]:
+            assert [
+                (record.chrom, record.pos) for record in bcf_file.fetch(chromosome)
+            ] == [record for record in records if record[0] == chromosome]
+
+
+@pytest.mark.generate_vcf
+def test_face_vcf_generation_chromosomes_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output_file = tmp_path / "example.parquet"
+    result = runner.invoke(
+        app,
+        [GENERATE_CMD, "-r", "20", "-c", "chr5", "-c", "chr6", "-o", output_file],
+    )
+    assert result.exit_code == 0
+    assert (
+        pq.read_table(output_file).column("CHROM").to_pylist()
+        == ["chr5"] * 10 + ["chr6"] * 10
+    )
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    "chromosome_args", [["-c", "all"], ["-c", "chr1", "-c", "chr1"]]
+)
+def test_face_vcf_generation_chromosomes_invalid(chromosome_args):
+    result = runner.invoke(app, [GENERATE_CMD, "-r", "10"] + chromosome_args)
+    assert result.exit_code == 1
+    assert isinstance(result.exception, ValueError)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_face_vcf_generation_genotype_model(workers):
+    result = runner.invoke(
+        app,
+        [GENERATE_CMD, "-r", "40", "-s", "20", "--seed", "5", "-w", workers]
+        + ["--genotype-model", "af"],
+    )
+    assert result.exit_code == 0
+    rows = [row.split("\t") for row in result.stdout.splitlines() if row[0] != "#"]
+    assert len(rows) == 40
+    for row in rows:
+        allele_count = sum(sample[:3].count("1") for sample in row[9:])
+        assert f";AC={allele_count};AN=40;" in row[7]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_face_vcf_generation_format_model(workers):
+    args = [GENERATE_CMD, "-r", "40", "-s", "20", "--seed", "5", "-w", workers]
+    result = runner.invoke(app, args + ["--format-model", "reads"])
+    assert result.exit_code == 0
+    rows = [row.split("\t") for row in result.stdout.splitlines() if row[0] != "#"]
+    assert len(rows) == 40
+    for row in rows:
+        for sample in row[9:]:
+            _, allele_depths, depth, _, _ = sample.split(":")
+            assert sum(int(v) for v in allele_depths.split(",")) == int(depth)
+    assert len({sample for row in rows for sample in row[9:]}) > 40
+
+    # The default fixed values
+    default_result = runner.invoke(app, args)
+    fixed_result = runner.invoke(app, args + ["--format-model", "fixed"])
+    assert fixed_result.stdout == default_result.stdout
+    assert runner.invoke(app, args + ["--format-model", "depth"]).exit_code == 2
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_face_vcf_generation_variant_rates(workers):
+    args = [GENERATE_CMD, "-r", "100", "-s", "5", "--seed", "3", "-w", workers]
+    result = runner.invoke(
+        app,
+        args
+        + ["--multiallelic-rate", "0.3"]
+        + ["--insertion-rate", "0.2", "--deletion-rate", "0.2"],
+    )
+    assert result.exit_code == 0
+    rows = [row.split("\t") for row in result.stdout.splitlines() if row[0] != "#"]
+    assert len(rows) == 100
+    assert any("," in row[4] for row in rows)
+    assert any(len(row[3]) > 1 for row in rows)
+    assert any(len(row[4].split(",")[0]) > 1 for row in rows)
+
+    # The same rows as without the options when the rates are 0
+    default_result = runner.invoke(app, args)
+    zero_result = runner.invoke(app, args + ["--multiallelic-rate", "0"])
+    assert zero_result.stdout == default_result.stdout
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("rate_args", "exit_code"),
+    [
+        (["--multiallelic-rate", "1.5"], 2),
+        (["--deletion-rate", "-0.1"], 2),
+        (["--insertion-rate", "0.6", "--deletion-rate", "0.6"], 1),
+    ],
+)
+def test_face_vcf_generation_variant_rates_invalid(rate_args, exit_code):
+    result = runner.invoke(app, [GENERATE_CMD, "-r", "10"] + rate_args)
+    assert result.exit_code == exit_code
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_face_vcf_generation_same_for_any_workers(genotype_model):
+    args = [GENERATE_CMD, "-r", "200", "-s", "6", "--seed", "8", "-c", "chr1"]
+    args += ["-c", "chr2", "--genotype-model", genotype_model]
+    args += ["--multiallelic-rate", "0.2", "--deletion-rate", "0.1"]
+    outputs = [runner.invoke(app, args + ["-w", w]).stdout for w in ["1", "2", "5"]]
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", ["1", "3"])
+@pytest.mark.parametrize(
+    ("region", "chromosome", "start", "end"),
+    [
+        ("chr2:2,001-6000", "chr2", 2001, 6000),
+        ("chr1:9000", "chr1", 9000, None),
+        ("chr2", "chr2", 1, None),
+        ("chr1:1-1", "chr1", 1, 1),
+    ],
+)
+def test_face_vcf_generation_region(workers, region, chromosome, start, end):
+    args = [GENERATE_CMD, "-r", "200", "-s", "4", "--seed", "6"]
+    args += ["-c", "chr1", "-c", "chr2"]
+    full_result = runner.invoke(app, args)
+    result = runner.invoke(app, args + ["--region", region, "-w", workers])
+    assert result.exit_code == 0
+
+    _, full_rows = contig_header_and_rows(full_result.stdout)
+    contig_lines, rows = contig_header_and_rows(result.stdout)
+    assert len(contig_lines) == 2
+    assert result.stdout.count("#CHROM") == 1
+    assert rows == [
+        row
+        for row in full_rows
+        if row[0] == chromosome
+        and start <= int(row[1])
+        and (end is None or int(row[1]) <= end)
+    ]
+
+
+@pytest.mark.generate_vcf
+def test_face_vcf_generation_region_file(tmp_path):
+    output_file = tmp_path / "example.vcf.gz"
+    args = [GENERATE_CMD, "-r", "300", "--seed", "2", "--region", "chr1:5000-9999"]
+    result = runner.invoke(app, args + ["-o", output_file, "--index", "tbi"])
+    assert result.exit_code == 0
+    with gzip.open(output_file, "rt") as vcf_file:
+        _, rows = contig_header_and_rows(vcf_file.read())
+    assert rows == contig_header_and_rows(runner.invoke(app, args).stdout)[1]
+    assert rows and all(5000 <= int(row[1]) <= 9999 for row in rows)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    "region_args",
+    [
+        ["--region", "chr1:200-100"],
+        ["--region", "chr3:1-100"],
+        ["--region", "chr1:1-100", "-o", "example.zarr"],
+    ],
+)
+def test_face_vcf_generation_region_invalid(tmp_path, region_args):
+    region_args = [
+        str(tmp_path / arg) if arg.endswith(".zarr") else arg for arg in region_args
+    ]
+    result = runner.invoke(app, [GENERATE_CMD, "-r", "10"] + region_args)
+    assert result.exit_code == 1
+    assert isinstance(result.exception, ValueError)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    "output_name, workers",
+    [
+        (None, "1"),
+        ("example.vcf", "1"),
+        ("example.vcf.gz", "2"),
+        ("example.parquet", "1"),
+        ("example.zarr", "2"),
+    ],
+)
+def test_face_vcf_generation_metrics_file(tmp_path, output_name, workers):
+    metrics_file = tmp_path / "metrics.jsonl"
+    args = [GENERATE_CMD, "-r", "250", "-w", workers, "--metrics-file", metrics_file]
+    if output_name is not None:
+        args += ["-o", tmp_path / output_name]
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0
+
+    report = json.loads(metrics_file.read_text().splitlines()[-1])
+    assert report["command"] == "generate"
+    assert report["done"]
+    assert report["rows"] == 250
+    if output_name == "example.vcf":
+        assert report["bytes"] == (tmp_path / output_name).stat().st_size
+        assert set(report["stages"]) == {"generate", "write"}
+    if output_name == "example.vcf.gz":
+        assert set(report["stages"]) == {"generate", "compress", "write"}
+
+
+@pytest.mark.generate_vcf
+def test_face_vcf_generation_profile(tmp_path):
+    profile_file = tmp_path / "generate.prof"
+    args = [GENERATE_CMD, "-r", "20", "--seed", "1"]
+    result = CliRunner(mix_stderr=False).invoke(
+        app, args + ["--profile", "cprofile", "--profile-file", profile_file]
+    )
+    assert result.exit_code == 0
+    # The profile is not written to standard output with the VCF data
+    assert result.stdout == runner.invoke(app, args).stdout
+    assert "fake_vcf_data" in result.stderr
+    stats = pstats.Stats(str(profile_file))
+    assert stats.total_calls > 0
+    # The writes on the writer thread of the pipeline are profiled too
+    assert any(function == "_write_batches" for _, _, function in stats.stats)
+
+
+@pytest.mark.reference_import
+def test_fake_vcf_reference_import_metrics(tmp_path):
+    small_reference_path = test_data_dir / "reference/reference_small.fa"
+    metrics_file = tmp_path / "fake_vcf.prom"
+    profile_file = tmp_path / "import.txt"
+
+    result = runner.invoke(
+        app,
+        [
+            IMPORT_REFERENCE_CMD,
+            "--metrics-file",
+            metrics_file.as_posix(),
+            "--metrics-format",
+            "prometheus",
+            "--profile",
+            "tracemalloc",
+            "--profile-file",
+            profile_file.as_posix(),
+            small_reference_path.as_posix(),
+            (tmp_path / "reference").as_posix(),
+        ],
+    )
+    assert result.exit_code == 0
+    sequence_metadata = json.loads(
+        (tmp_path / "reference" / "sequence_metadata.json").read_text()
+    )
+    num_bases = sum(sequence_metadata["sequence_lengths"].values())
+    metrics = metrics_file.read_text()
+    assert f'fake_vcf_bases_total{{command="import-reference"}} {num_bases}' in metrics
+    assert 'fake_vcf_done{command="import-reference"} 1' in metrics
+    assert profile_file.read_text().startswith("Peak traced memory: ")
+
+
+def test_fake_vcf_import_time():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import fake_vcf.__main__"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines of "import time: self [us] | cumulative | name", indented by nesting
+    cumulative_us = {}
+    for line in result.stderr.splitlines():
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            cumulative_us.setdefault(name.strip(), int(cumulative))
+
+    imported = {name.split(".")[0] for name in cumulative_us}
+    assert not imported & (LAZY_MODULES | COMMAND_MODULES)
+    # The time of fake-vcf itself, typer is needed by every command
+    import_us = cumulative_us["fake_vcf.__main__"] - cumulative_us["typer"]
+    assert import_us < 100_000
+
+
+@pytest.mark.parametrize(
+    "args, lazy_modules",
+    [
+        ([GENERATE_CMD, "-v"], LAZY_MODULES | COMMAND_MODULES),
+        ([GENERATE_CMD, "-r", "10", "-s", "3"], LAZY_MODULES),
+    ],
+)
+def test_fake_vcf_lazy_imports(args, lazy_modules):
+    code = (
+        "import sys\n"
+        "from fake_vcf.__main__ import app\n"
+        "try:\n"
+        "    app(sys.argv[1:])\n"
+        "except SystemExit as error:\n"
+        "    assert not error.code\n"
+        "print(' '.join(sorted(sys.modules)), file=sys.stderr)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, *args], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    imported = {name.split(".")[0] for name in result.stderr.split()}
+    assert "fake_vcf" in imported
+    assert not imported & lazy_modules
@@ -4,8 +4,10 @@ import typing
 
 from pathlib import Path
 
+import numpy as np
 import pytest
 
+from fake_vcf import vcf_faker, vcf_reference
 from fake_vcf.vcf_faker import VirtualVCF
 
 NR_NON_SAMPLE_COL = 9
@@ -236,7 +238,7 @@ def test_fake_vcf_chromosome(chromosome):
 @pytest.mark.generate_vcf
 @pytest.mark.parametrize(
     "ref_dir",
-    [(None), (reference_dir / "parquet")],
+    [(None), (reference_dir / "parquet"), (reference_dir / "bytes")],
 )
 def test_fake_vcf_reproducibility(ref_dir):
     seed_value = 42
@@ -290,3 +292,645 @@ def test_fake_vcf_novel_data(ref_dir):
     orig_data = get_vcf_data(virtual_vcf=orig_virtual_vcf)
     new_data = get_vcf_data(virtual_vcf=new_virtual_vcf)
     assert orig_data != new_data
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("num_rows", "block_size", "ref_dir"),
+    [
+        (1, 1, None),
+        (10, 1, None),
+        (10, 3, None),
+        (1337, 100, None),
+        (1337, 5000, None),
+        (10, 1, reference_dir / "parquet"),
+        (10, 4, reference_dir / "parquet"),
+        (10, 4, reference_dir / "bytes"),
+    ],
+)
+def test_fake_vcf_blocks_match_rows(num_rows, block_size, ref_dir):
+    row_vcf = VirtualVCF(
+        num_rows=num_rows,
+        num_samples=10,
+        chromosome="chr1",
+        random_seed=42,
+        reference_dir=ref_dir,
+    )
+    block_vcf = VirtualVCF(
+        num_rows=num_rows,
+        num_samples=10,
+        chromosome="chr1",
+        random_seed=42,
+        reference_dir=ref_dir,
+        block_size=block_size,
+    )
+
+    with row_vcf as r_vcf, block_vcf as b_vcf:
+        blocks = list(b_vcf.blocks())
+        assert "".join(r_vcf) == "".join(blocks)
+
+    # Header plus the rows split in blocks of at most block_size rows
+    assert len(blocks) == 1 + -(-num_rows // block_size)
+
+
+@pytest.mark.generate_vcf
+def test_encode_doubled_samples():
+    encoded, offsets = vcf_faker.encode_doubled_samples(["0|0", "1|0:ö", "0|1"])
+    assert encoded == "0|0\t1|0:ö\t0|1\t0|0\t1|0:ö\t0|1\t".encode()
+    assert offsets.tolist() == [0, 4, 11, 15, 19, 26, 30]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("num_samples", [1, 2, 10, 1000])
+@pytest.mark.parametrize("large_format", [True, False])
+def test_fake_vcf_encoded_blocks(num_samples, large_format):
+    vcf_args = dict(
+        num_rows=50,
+        num_samples=num_samples,
+        chromosome="chr1",
+        random_seed=3,
+        large_format=large_format,
+        block_size=7,
+    )
+    encoded_blocks = list(VirtualVCF(**vcf_args).blocks(encoded=True))
+
+    assert all(isinstance(block, bytes) for block in encoded_blocks)
+    assert [block.decode() for block in encoded_blocks] == list(
+        VirtualVCF(**vcf_args).blocks()
+    )
+    rows = b"".join(encoded_blocks).decode().splitlines()[-50:]
+    assert all(len(row.split("\t")) == 9 + num_samples for row in rows)
+
+
+@pytest.mark.generate_vcf
+def test_encode_sample_values():
+    table = vcf_faker.encode_sample_values(["0|0", "1|0"])
+    assert table.tobytes() == b"0|0\t1|0\t"
+    assert table.shape == (2, 4)
+    with pytest.raises(ValueError):
+        vcf_faker.encode_sample_values(["0|0", "1|0:1"])
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("phased", [True, False])
+@pytest.mark.parametrize("large_format", [True, False])
+@pytest.mark.parametrize("num_samples", [1, 7, 300])
+def test_fake_vcf_allele_frequency_model(phased, large_format, num_samples):
+    vcf_args = dict(
+        num_rows=200,
+        num_samples=num_samples,
+        chromosome="chr1",
+        random_seed=6,
+        phased=phased,
+        large_format=large_format,
+        genotype_model="af",
+    )
+    vcf_text = "".join(VirtualVCF(**vcf_args, block_size=9).blocks())
+    # The genotypes don't depend on the block size or how the rows are iterated
+    assert vcf_text == "".join(VirtualVCF(**vcf_args))
+
+    header = [line for line in vcf_text.splitlines() if line.startswith("##INFO")]
+    assert any(line.startswith("##INFO=<ID=AC,Number=A") for line in header)
+    assert any(line.startswith("##INFO=<ID=AN,Number=1") for line in header)
+
+    rows = [line.split("\t") for line in vcf_text.splitlines() if line[0] != "#"]
+    separator = "|" if phased else "/"
+    allele_counts = []
+    for row in rows:
+        genotypes = [sample.split(":")[0] for sample in row[NR_NON_SAMPLE_COL:]]
+        assert len(genotypes) == num_samples
+        assert all(genotype[1] == separator for genotype in genotypes)
+        if not phased:
+            assert "1/0" not in genotypes
+        allele_count = sum(genotype.count("1") for genotype in genotypes)
+        info = dict(field.split("=") for field in row[7].split(";"))
+        assert int(info["AC"]) == allele_count >= 1
+        assert int(info["AN"]) == 2 * num_samples
+        assert float(info["AF"]) == pytest.approx(
+            allele_count / (2 * num_samples), rel=1e-3
+        )
+        allele_counts.append(allele_count)
+
+    if num_samples > 1:
+        # The sites have different allele frequencies
+        assert len(set(allele_counts)) > 1
+
+
+@pytest.mark.generate_vcf
+def test_fake_vcf_allele_frequency_spectrum():
+    virtual_vcf = VirtualVCF(
+        num_rows=2000,
+        num_samples=500,
+        chromosome="chr1",
+        random_seed=1,
+        genotype_model="af",
+    )
+    allele_counts = np.concatenate(
+        [
+            block.allele_counts
+            for block in virtual_vcf.blocks(row_values=True)
+            if not isinstance(block, str)
+        ]
+    )
+    allele_frequencies = allele_counts / 1000
+    # Most sites are rare, but there are common sites too
+    assert np.median(allele_frequencies) < 0.05
+    assert (allele_frequencies > 0.5).any()
+
+
+@pytest.mark.generate_vcf
+def test_fake_vcf_rotation_model_unchanged():
+    virtual_vcf = VirtualVCF(num_rows=5, num_samples=5, chromosome="chr1")
+    assert "##INFO=<ID=AC" not in virtual_vcf.header
+    rows = "".join(virtual_vcf).splitlines()[-5:]
+    assert all("\tDP=10;AF=0.5;NS=5\t" in row for row in rows)
+
+
+@pytest.mark.generate_vcf
+def test_fake_vcf_blocks_after_rows():
+    virtual_vcf = VirtualVCF(
+        num_rows=10, num_samples=10, chromosome="chr1", random_seed=42, block_size=4
+    )
+    expected = "".join(
+        VirtualVCF(num_rows=10, num_samples=10, chromosome="chr1", random_seed=42)
+    )
+
+    with virtual_vcf as v_vcf:
+        first_rows = [next(v_vcf) for _ in range(3)]
+        assert "".join(first_rows + list(v_vcf.blocks())) == expected
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("num_rows", "contigs", "expected"),
+    [
+        (10, {"chr1": None}, {"chr1": 10}),
+        (
+            10,
+            {"chr1": None, "chr2": None, "chr3": None},
+            {"chr1": 4, "chr2": 3, "chr3": 3},
+        ),
+        (10, {"chr1": 100, "chr2": None}, {"chr1": 5, "chr2": 5}),
+        (
+            1000,
+            {"chr1": 248, "chr2": 242, "chrY": 57},
+            {"chr1": 453, "chr2": 443, "chrY": 104},
+        ),
+        (1, {"chr1": 2, "chr2": 1}, {"chr1": 1, "chr2": 0}),
+    ],
+)
+def test_contig_rows(num_rows, contigs, expected):
+    assert vcf_faker.contig_rows(num_rows, contigs) == expected
+
+
+@pytest.mark.generate_vcf
+def test_fake_vcf_contigs_header():
+    virtual_vcf = VirtualVCF(
+        num_rows=1,
+        num_samples=1,
+        chromosome="chr2",
+        contigs={"chr1": 1066, "chr2": None},
+    )
+    contig_lines = [
+        line for line in virtual_vcf.header.splitlines() if line.startswith("##contig")
+    ]
+    assert contig_lines == ["##contig=<ID=chr1,length=1066>", "##contig=<ID=chr2>"]
+    assert VirtualVCF(num_rows=1, num_samples=1, chromosome="chr3").contigs == {
+        "chr3": None
+    }
+
+
+@pytest.mark.generate_vcf
+def test_fake_vcf_shard():
+    virtual_vcf = VirtualVCF(
+        num_rows=10,
+        num_samples=10,
+        chromosome="chr1",
+        random_seed=42,
+        position_offset=1000,
+        include_header=False,
+        row_seed=1,
+    )
+
+    with virtual_vcf as v_vcf:
+        vcf_rows = list(v_vcf)
+
+    positions = [int(row.split("\t")[1]) for row in vcf_rows]
+    assert len(vcf_rows) == 10
+    assert all(1000 < position < 2000 for position in positions)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("num_rows", [1, 99, 100, 101, 1000])
+def test_fake_vcf_position_windows(monkeypatch, num_rows):
+    monkeypatch.setattr(vcf_faker, "ROW_WINDOW_ROWS", 100)
+
+    def get_positions(block_size):
+        virtual_vcf = VirtualVCF(
+            num_rows=num_rows,
+            num_samples=1,
+            chromosome="chr1",
+            random_seed=42,
+            block_size=block_size,
+        )
+        with virtual_vcf as v_vcf:
+            data_rows = list(v_vcf)[1:]
+        return [int(row.split("\t")[1]) for row in data_rows]
+
+    positions = get_positions(block_size=7)
+
+    assert len(positions) == num_rows
+    assert positions == sorted(set(positions))
+    assert 1 <= positions[0] and positions[-1] <= num_rows * 100
+    assert positions == get_positions(block_size=64)
+    # Each window of rows gets its own range of positions
+    for window_start in range(0, num_rows, 100):
+        window_positions = positions[window_start : window_start + 100]
+        assert window_start * 100 < window_positions[0]
+        assert window_positions[-1] <= (window_start + 100) * 100
+
+
+@pytest.mark.generate_vcf
+def test_fake_vcf_max_position(monkeypatch):
+    monkeypatch.setattr(vcf_faker, "ROW_WINDOW_ROWS", 100)
+    virtual_vcf = VirtualVCF(
+        num_rows=250, num_samples=1, chromosome="chr1", random_seed=42
+    )
+
+    with virtual_vcf as v_vcf:
+        max_position = v_vcf.max_position
+        last_row = list(v_vcf)[-1]
+
+    assert int(last_row.split("\t")[1]) == max_position
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("first", "second", "num_alleles", "phased", "expected"),
+    [
+        (0, 0, 2, True, 0),
+        (1, 0, 2, True, 1),
+        (0, 1, 2, True, 2),
+        (2, 1, 3, True, 5),
+        (0, 0, 3, False, 0),
+        (1, 0, 3, False, 1),
+        (1, 1, 3, False, 2),
+        (0, 2, 3, False, 3),
+        (3, 3, 4, False, 9),
+    ],
+)
+def test_genotype_index(first, second, num_alleles, phased, expected):
+    assert vcf_faker.genotype_index(first, second, num_alleles, phased) == expected
+
+
+@pytest.mark.generate_vcf
+def test_expand_sample_value():
+    assert vcf_faker.expand_sample_value("0|1", 3) == "0|1"
+    assert (
+        vcf_faker.expand_sample_value("0|1:0,30:30:89:913,89,0", 2)
+        == "0|1:0,30:30:89:913,89,0"
+    )
+    assert (
+        vcf_faker.expand_sample_value("0|1:0,30:30:89:913,89,0", 3)
+        == "0|1:0,30,0:30:89:913,89,0,913,913,913"
+    )
+    assert (
+        vcf_faker.expand_sample_value("0/2:1,30:30:89:913,89,0", 3, alt_allele=2)
+        == "0/2:1,0,30:30:89:913,913,913,89,913,0"
+    )
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    "rates",
+    [
+        dict(multiallelic_rate=-0.1),
+        dict(multiallelic_rate=1.1),
+        dict(insertion_rate=-0.1),
+        dict(insertion_rate=0.6, deletion_rate=0.5),
+    ],
+)
+def test_fake_vcf_invalid_variant_rates(rates):
+    with pytest.raises(ValueError):
+        VirtualVCF(num_rows=1, num_samples=1, chromosome="chr1", **rates)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("phased", [True, False])
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+@pytest.mark.parametrize("ref_dir", [None, reference_dir / "parquet"])
+def test_fake_vcf_multiallelic_indels(phased, genotype_model, ref_dir):
+    vcf_args = dict(
+        # The test reference only fits the positions of a few rows
+        num_rows=300 if ref_dir is None else 10,
+        num_samples=6,
+        chromosome="chr1",
+        random_seed=7,
+        phased=phased,
+        genotype_model=genotype_model,
+        reference_dir=ref_dir,
+        multiallelic_rate=0.3,
+        insertion_rate=0.2,
+        deletion_rate=0.4,
+    )
+    virtual_vcf = VirtualVCF(**vcf_args, block_size=3)
+    vcf_text = "".join(virtual_vcf.blocks())
+    # The variants don't depend on the block size or how the rows are iterated
+    assert vcf_text == "".join(VirtualVCF(**vcf_args))
+
+    rows = [line.split("\t") for line in vcf_text.splitlines() if line[0] != "#"]
+    variant_types = set()
+    for row in rows:
+        ref, alts = row[3], row[4].split(",")
+        num_alleles = 1 + len(alts)
+        assert 2 <= num_alleles <= vcf_faker.MAX_ALLELES
+        assert len(set([ref] + alts)) == num_alleles
+        assert all(allele[0] in "ACGTN" for allele in [ref] + alts)
+        if len(ref) > 1:
+            variant_types.add("deletion")
+            assert alts[0] == ref[0]
+            assert len(ref) <= 1 + vcf_faker.MAX_INDEL_LENGTH
+        elif len(alts[0]) > 1:
+            variant_types.add("insertion")
+            assert alts[0][0] == ref
+        if ref_dir is not None:
+            position = int(row[1])
+            assert ref == (
+                vcf_reference.get_ref_at_positions(
+                    virtual_vcf.reference_data,
+                    np.arange(position - 1, position - 1 + len(ref)),
+                )
+                .tobytes()
+                .decode()
+            )
+
+        info = dict(field.split("=") for field in row[7].split(";"))
+        assert len(info["AF"].split(",")) == num_alleles - 1
+        allele_counts = [0] * num_alleles
+        for sample in row[NR_NON_SAMPLE_COL:]:
+            genotype, allele_depths, _, _, likelihoods = sample.split(":")
+            assert len(allele_depths.split(",")) == num_alleles
+            assert len(likelihoods.split(",")) == num_alleles * (num_alleles + 1) // 2
+            for allele in genotype.replace("|", "/").split("/"):
+                allele_counts[int(allele)] += 1
+        if genotype_model == "af":
+            assert [int(count) for count in info["AC"].split(",")] == allele_counts[1:]
+    if ref_dir is None:
+        assert variant_types == {"deletion", "insertion"}
+        assert {len(row[4].split(",")) for row in rows} == {1, 2, 3}
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+@pytest.mark.parametrize(("start", "stop"), [(0, 250), (37, 38), (99, 201), (0, 0)])
+def test_fake_vcf_rows_range(monkeypatch, genotype_model, start, stop):
+    monkeypatch.setattr(vcf_faker, "ROW_WINDOW_ROWS", 50)
+    vcf_args = dict(
+        num_rows=250,
+        num_samples=5,
+        chromosome="chr1",
+        random_seed=3,
+        genotype_model=genotype_model,
+        multiallelic_rate=0.3,
+        insertion_rate=0.1,
+        deletion_rate=0.1,
+        block_size=16,
+    )
+    all_rows = list(VirtualVCF(**vcf_args))[1:]
+
+    # Row i only depends on the seed and i
+    virtual_vcf = VirtualVCF(**vcf_args)
+    assert list(virtual_vcf.rows(start, stop)) == all_rows[start:stop]
+    assert "".join(virtual_vcf.blocks()) == "".join(
+        list(virtual_vcf.header_chunks()) + all_rows
+    )
+    range_vcf = VirtualVCF(
+        **vcf_args, start_row=start, stop_row=stop, include_header=False
+    )
+    assert list(range_vcf) == all_rows[start:stop]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("start_row", "stop_row"), [(-1, 5), (6, 5), (0, 11), (11, None)]
+)
+def test_fake_vcf_invalid_row_range(start_row, stop_row):
+    with pytest.raises(ValueError):
+        VirtualVCF(
+            num_rows=10,
+            num_samples=1,
+            chromosome="chr1",
+            start_row=start_row,
+            stop_row=stop_row,
+        )
+    with pytest.raises(ValueError):
+        list(
+            VirtualVCF(num_rows=10, num_samples=1, chromosome="chr1").rows(
+                start_row, 11 if stop_row is None else stop_row
+            )
+        )
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("start_position", "stop_position"),
+    [(1, 10**9), (5000, 5000), (4000, 12000), (9990, 10100), (30000, 40000)],
+)
+def test_fake_vcf_region_rows(monkeypatch, start_position, stop_position):
+    monkeypatch.setattr(vcf_faker, "ROW_WINDOW_ROWS", 50)
+    virtual_vcf = VirtualVCF(
+        num_rows=200, num_samples=1, chromosome="chr1", random_seed=9
+    )
+    positions = [int(row.split("\t")[1]) for row in virtual_vcf.rows(0, 200)]
+
+    start_row, stop_row = virtual_vcf.region_rows(start_position, stop_position)
+    assert list(range(start_row, stop_row)) == [
+        row
+        for row, position in enumerate(positions)
+        if start_position <= position <= stop_position
+    ]
+
+
+@pytest.mark.generate_vcf
+def test_contig_vcf_args():
+    vcf_args = dict(
+        chromosome="chr2",
+        contigs={"chr2": None, "chrM": None, "chr1": None},
+        num_samples=3,
+        random_seed=4,
+    )
+    contigs = vcf_faker.contig_vcf_args(vcf_args, 2)
+
+    assert [
+        (contig_index, first_row, args["chromosome"], args["num_rows"])
+        for contig_index, first_row, args in contigs
+    ] == [(0, 0, "chr2", 1), (1, 1, "chrM", 1)]
+    # The first contig has the rows of a VCF with only that contig
+    assert contigs[0][2]["row_seed"] is None
+    assert contigs[1][2]["row_seed"] is not None
+    assert vcf_faker.contig_vcf_args(vcf_args, 2) == contigs
+
+
+@pytest.mark.generate_vcf
+def test_fake_vcf_header_chunks(monkeypatch):
+    monkeypatch.setattr(vcf_faker, "SAMPLE_CHUNK_SIZE", 4)
+    virtual_vcf = VirtualVCF(num_rows=1, num_samples=10, chromosome="chr1")
+    chunks = list(virtual_vcf.header_chunks())
+
+    # The fixed columns, three chunks of sample names and the end of the line
+    assert len(chunks) == 5
+    assert chunks[0].startswith(virtual_vcf.header)
+    assert chunks[0].endswith("\tINFO\tFORMAT")
+    assert chunks[-1] == "\n"
+    assert "".join(chunks) == next(virtual_vcf.blocks())
+    assert "".join(chunks).splitlines()[-1].split("\t")[9:] == (
+        virtual_vcf.sample_names()
+    )
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+@pytest.mark.parametrize("multiallelic_rate", [0.0, 0.5])
+def test_fake_vcf_sample_chunks(monkeypatch, genotype_model, multiallelic_rate):
+    vcf_args = dict(
+        num_rows=30,
+        num_samples=10,
+        chromosome="chr1",
+        random_seed=6,
+        genotype_model=genotype_model,
+        multiallelic_rate=multiallelic_rate,
+        block_size=7,
+    )
+    expected = "".join(VirtualVCF(**vcf_args).blocks()).encode()
+
+    # Wide rows are rendered a chunk of samples at a time
+    monkeypatch.setattr(vcf_faker, "SAMPLE_CHUNK_SIZE", 4)
+    blocks = [list(block) for block in VirtualVCF(**vcf_args).fragment_blocks()]
+    assert b"".join(b"".join(block) for block in blocks) == expected
+    assert b"".join(VirtualVCF(**vcf_args).blocks(encoded=True)) == expected
+    assert "".join(VirtualVCF(**vcf_args)).encode() == expected
+    num_row_fragments = sum(len(block) for block in blocks[1:])
+    assert num_row_fragments == 30 * (3 if genotype_model == "rotation" else 5)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("num_samples, samples_chunk_size", [(3, 1), (7, 2), (5, 8)])
+@pytest.mark.parametrize("multiallelic_rate", [0.0, 0.5])
+def test_fake_vcf_genotype_code_chunks(
+    num_samples, samples_chunk_size, multiallelic_rate
+):
+    # Rows on both sides of a window, few samples so some sites get their alt
+    # allele from their lowest draw
+    start, stop = vcf_faker.ROW_WINDOW_ROWS - 200, vcf_faker.ROW_WINDOW_ROWS + 100
+    vcf_args = dict(
+        num_rows=stop,
+        num_samples=num_samples,
+        chromosome="chr1",
+        random_seed=8,
+        genotype_model="af",
+        multiallelic_rate=multiallelic_rate,
+        start_row=start,
+        block_size=stop - start,
+        include_header=False,
+    )
+    expected = next(VirtualVCF(**vcf_args).blocks(row_values=True))
+
+    virtual_vcf = VirtualVCF(**vcf_args)
+    row_values = next(virtual_vcf.blocks(row_values=True, genotypes=False))
+    assert row_values.genotype_codes is None
+    code_chunks = list(
+        virtual_vcf.genotype_code_chunks(
+            start, stop, row_values.num_alleles, samples_chunk_size
+        )
+    )
+    assert len(code_chunks) == -(-num_samples // samples_chunk_size)
+    assert np.array_equal(np.concatenate(code_chunks, axis=1), expected.genotype_codes)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+@pytest.mark.parametrize("phased", [True, False])
+@pytest.mark.parametrize("multiallelic_rate", [0.0, 0.4])
+def test_fake_vcf_format_model_reads(genotype_model, phased, multiallelic_rate):
+    vcf_args = dict(
+        num_rows=80,
+        num_samples=15,
+        chromosome="chr1",
+        random_seed=2,
+        phased=phased,
+        genotype_model=genotype_model,
+        multiallelic_rate=multiallelic_rate,
+        block_size=9,
+    )
+    fixed_rows = [
+        row.split("\t")
+        for row in "".join(VirtualVCF(**vcf_args).blocks()).splitlines()
+        if not row.startswith("#")
+    ]
+    vcf_text = "".join(VirtualVCF(**vcf_args, format_model="reads").blocks())
+    rows = [row.split("\t") for row in vcf_text.splitlines() if not row.startswith("#")]
+
+    # The same rows and genotypes as with fixed FORMAT values
+    assert [row[:9] for row in rows] == [row[:9] for row in fixed_rows]
+    assert [[sample[:3] for sample in row[9:]] for row in rows] == [
+        [sample[:3] for sample in row[9:]] for row in fixed_rows
+    ]
+    sample_values = set()
+    for row in rows:
+        num_alleles = len(row[4].split(",")) + 1
+        for sample in row[NR_NON_SAMPLE_COL:]:
+            genotype, allele_depths, depth, quality, likelihoods = sample.split(":")
+            allele_depths = [int(v) for v in allele_depths.split(",")]
+            likelihoods = [int(v) for v in likelihoods.split(",")]
+            assert len(allele_depths) == num_alleles
+            assert len(likelihoods) == num_alleles * (num_alleles + 1) // 2
+            assert sum(allele_depths) == int(depth)
+            first, second = int(genotype[0]), int(genotype[2])
+            low, high = min(first, second), max(first, second)
+            assert likelihoods[high * (high + 1) // 2 + low] == 0
+            assert 0 <= int(quality) <= 99
+            sample_values.add(sample[4:])
+    assert len(sample_values) > len(rows)
+
+    # The values don't depend on the block size or the rows generated before
+    assert (
+        "".join(
+            VirtualVCF(**{**vcf_args, "block_size": 80}, format_model="reads").blocks()
+        )
+        == vcf_text
+    )
+    assert "".join(VirtualVCF(**vcf_args, format_model="reads").rows(31, 57)) == (
+        "".join(f"{row}\n" for row in vcf_text.splitlines()[-80:][31:57])
+    )
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_fake_vcf_format_model_reads_sample_chunks(monkeypatch, genotype_model):
+    vcf_args = dict(
+        num_rows=30,
+        num_samples=10,
+        chromosome="chr1",
+        random_seed=6,
+        genotype_model=genotype_model,
+        multiallelic_rate=0.3,
+        block_size=7,
+        format_model="reads",
+    )
+    expected = "".join(VirtualVCF(**vcf_args).blocks()).encode()
+
+    monkeypatch.setattr(vcf_faker, "SAMPLE_CHUNK_SIZE", 4)
+    blocks = [list(block) for block in VirtualVCF(**vcf_args).fragment_blocks()]
+    assert b"".join(b"".join(block) for block in blocks) == expected
+    # The fixed columns, 3 chunks of samples and the end of each row
+    assert sum(len(block) for block in blocks[1:]) == 30 * 5
+
+
+@pytest.mark.generate_vcf
+def test_fake_vcf_format_model_small_format():
+    vcf_args = dict(
+        num_rows=20, num_samples=5, chromosome="chr1", random_seed=1, large_format=False
+    )
+    assert "".join(VirtualVCF(**vcf_args, format_model="reads")) == "".join(
+        VirtualVCF(**vcf_args)
+    )
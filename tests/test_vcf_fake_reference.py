@@ -1,10 +1,13 @@
+import gzip
 import json
 from pathlib import Path
 
+import numpy as np
 import pytest
 
 import fake_vcf
 import fake_vcf.vcf_reference as reference
+from fake_vcf.vcf_bgzf import BGZF_EOF, compress_block
 from fake_vcf.vcf_faker import VirtualVCF
 from tests.test_vcf_fake import get_vcf_data
 
@@ -13,6 +16,24 @@ reference_dir = test_data_dir / "reference"
 small_reference_file = reference_dir / "reference_small.fa"
 
 
+def read_fasta_sequences(fasta_file):
+    """Parses a plain fasta file in memory, to check the chunked readers against."""
+    sequences = {}
+    for record in Path(fasta_file).read_text().split(">")[1:]:
+        header, *lines = record.splitlines()
+        sequences[header.split()[0]] = "".join(lines).upper()
+    return sequences
+
+
+def join_fasta_chunks(fasta_file, include_sequences=None, chunk_size=1000):
+    sequences = {}
+    for sequence_id, bases in reference.iter_fasta_chunks(
+        fasta_file, include_sequences=include_sequences, chunk_size=chunk_size
+    ):
+        sequences[sequence_id] = sequences.get(sequence_id, "") + bases.decode()
+    return sequences
+
+
 @pytest.mark.reference_import
 @pytest.mark.parametrize(
     "include_sequences, expected_count, fasta_file",
@@ -35,21 +56,19 @@ small_reference_file = reference_dir / "reference_small.fa"
         ),
     ),
 )
-def test_parse_sequences(include_sequences, expected_count, fasta_file):
-    sequences = reference.parse_fasta(
-        include_sequences=include_sequences, file_path=fasta_file
-    )
+def test_iter_fasta_chunks_include_sequences(
+    include_sequences, expected_count, fasta_file
+):
+    sequences = join_fasta_chunks(fasta_file, include_sequences=include_sequences)
 
     include_sequences = [] if include_sequences is None else include_sequences
-    sequences = list(sequences)
     assert len(sequences) == expected_count
     assert (
-        all(seq["id"] in include_sequences for seq in sequences)
+        all(sequence_id in include_sequences for sequence_id in sequences)
         if include_sequences
         else True
     )
-    assert all(len(seq["sequence"]) > 0 for seq in sequences)
-    assert all(seq["sequence"] for seq in sequences)
+    assert all(len(sequence) > 0 for sequence in sequences.values())
 
 
 @pytest.mark.reference_import
@@ -61,12 +80,9 @@ def test_parse_sequences(include_sequences, expected_count, fasta_file):
         ("chr5", small_reference_file, 129915),
     ),
 )
-def test_parse_sequences_content_sum(sequence_id, fasta_file, expected_sequence_sum):
-    sequences = reference.parse_fasta(
-        include_sequences=[sequence_id], file_path=fasta_file
-    )
-    sequences = list(sequences)
-    assert sum([ord(s) for s in sequences[0]["sequence"]]) == expected_sequence_sum
+def test_iter_fasta_chunks_content_sum(sequence_id, fasta_file, expected_sequence_sum):
+    sequences = join_fasta_chunks(fasta_file, include_sequences=[sequence_id])
+    assert sum([ord(s) for s in sequences[sequence_id]]) == expected_sequence_sum
 
 
 @pytest.mark.reference_import
@@ -226,3 +242,388 @@ def test_import_reference(tmp_path):
         assert (output_dir / reference_path).exists()
 
     assert metadata["fake-vcf-version"] == fake_vcf.version
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("memory_map", [True, False])
+@pytest.mark.parametrize(
+    "chrom, position, expected_reference_value",
+    (
+        ("chr1", 0, "N"),
+        ("chr1", 100, "N"),
+        ("chr1", 460, "T"),
+        ("chr1", 500, "C"),
+        ("chr1", 1000, "G"),
+        ("chr2", 0, "N"),
+        ("chr2", 100, "A"),
+        ("chr2", 460, "C"),
+        ("chr2", 500, "T"),
+        ("chr2", 1000, "T"),
+    ),
+)
+def test_reading_reference_bytes_files(
+    chrom, position, expected_reference_value, memory_map
+):
+    reference_bytes_file = reference_dir / "bytes" / f"reference_{chrom}.bases"
+    reference_data = reference.load_reference_data(
+        reference_bytes_file, memory_map=memory_map
+    )
+    reference_value = reference.get_ref_at_pos(
+        ref_data=reference_data, position=position
+    )
+
+    assert reference_value == expected_reference_value
+
+
+@pytest.mark.reference_import
+def test_bytes_reference():
+    virtual_vcf = VirtualVCF(
+        num_rows=10,
+        num_samples=10,
+        random_seed=42,
+        chromosome="chr1",
+        reference_dir=reference_dir / "bytes",
+    )
+    data_rows, metadata = get_vcf_data(virtual_vcf)
+
+    reference_data = reference.load_reference_data(
+        reference_dir / "bytes" / "reference_chr1.bases", memory_map=False
+    )
+    for data_row in data_rows:
+        columns = data_row.split("\t")
+        assert columns[3] == chr(reference_data[int(columns[1]) - 1])
+
+
+@pytest.mark.reference_import
+def test_bytes_reference_outside_reference():
+    with pytest.raises(ValueError):
+        VirtualVCF(
+            num_rows=100,
+            num_samples=10,
+            random_seed=42,
+            chromosome="chr1",
+            reference_dir=reference_dir / "bytes",
+        )
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize(
+    "reference_format", [reference.ReferenceFormat.BYTES, "bytes", "parquet"]
+)
+def test_import_reference_format(tmp_path, reference_format):
+    output_dir = tmp_path / "output"
+    reference.import_reference(
+        file_path=small_reference_file,
+        output_dir=output_dir,
+        reference_format=reference_format,
+    )
+
+    with open(output_dir / "sequence_metadata.json") as metadata_file:
+        metadata = json.load(metadata_file)
+
+    assert metadata["reference_format"] == reference.ReferenceFormat(reference_format)
+    assert len(metadata["reference_files"]) == 10
+    for seq_id, reference_path in metadata["reference_files"].items():
+        imported_data = reference.load_reference_data(
+            output_dir / reference_path, memory_map=True
+        )
+        expected_data = reference.load_reference_data(
+            reference_dir / "parquet" / f"fasta_{seq_id}.parquet", memory_map=False
+        )
+        assert len(imported_data) == metadata["sequence_lengths"][seq_id]
+        assert len(imported_data) == len(expected_data)
+        assert [
+            reference.get_ref_at_pos(imported_data, position)
+            for position in range(len(imported_data))
+        ] == expected_data.column(0).to_pylist()
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("memory_map", [True, False])
+@pytest.mark.parametrize(
+    "reference_file",
+    [
+        reference_dir / "parquet" / "fasta_chr2.parquet",
+        reference_dir / "bytes" / "reference_chr2.bases",
+    ],
+)
+def test_get_ref_at_positions(reference_file, memory_map):
+    reference_data = reference.load_reference_data(
+        reference_file, memory_map=memory_map
+    )
+    positions = np.array([0, 10, 100, 460, 500, 1000, 1000, 5, len(reference_data) - 1])
+
+    reference_bases = reference.get_ref_at_positions(reference_data, positions)
+
+    assert reference_bases.dtype == np.uint8
+    assert reference_bases.tobytes().decode() == "".join(
+        reference.get_ref_at_pos(reference_data, position) for position in positions
+    )
+    assert reference_bases[:6].tobytes() == b"NNACTT"
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("chunk_size", [1, 7, 60, 1000, 1 << 24])
+def test_iter_fasta_chunks(chunk_size):
+    sequence_chunks = list(
+        reference.iter_fasta_chunks(small_reference_file, chunk_size=chunk_size)
+    )
+
+    sequences = {}
+    for sequence_id, bases in sequence_chunks:
+        assert len(bases) <= chunk_size
+        sequences[sequence_id] = sequences.get(sequence_id, "") + bases.decode()
+
+    assert sequences == read_fasta_sequences(small_reference_file)
+    assert list(sequences) == [f"chr{c}" for c in range(1, 11)]
+
+
+@pytest.mark.reference_import
+def test_iter_fasta_chunks_single_line_sequences(tmp_path):
+    fasta_file = tmp_path / "single_line.fa"
+    fasta_file.write_bytes(
+        b">chr1 long contig\n" + b"acgt" * 2500 + b"\n>chr2\nAC\n>chr3\n>chr4"
+    )
+
+    sequence_chunks = list(reference.iter_fasta_chunks(fasta_file, chunk_size=1000))
+
+    # The 10000 bases on one line are split into chunks of chunk_size
+    assert [(sequence_id, len(bases)) for sequence_id, bases in sequence_chunks] == [
+        ("chr1", 1000)
+    ] * 10 + [("chr1", 0), ("chr2", 2), ("chr3", 0), ("chr4", 0)]
+    assert b"".join(bases for _, bases in sequence_chunks[:11]) == b"ACGT" * 2500
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("reference_format", ["bytes", "parquet"])
+@pytest.mark.parametrize("chunk_size", [1, 100, 1 << 24])
+def test_import_reference_chunk_size(tmp_path, reference_format, chunk_size):
+    reference.import_reference(
+        file_path=small_reference_file,
+        output_dir=tmp_path,
+        include_sequences=["chr2", "chr5"],
+        reference_format=reference_format,
+        chunk_size=chunk_size,
+    )
+
+    with open(tmp_path / "sequence_metadata.json") as metadata_file:
+        metadata = json.load(metadata_file)
+
+    assert list(metadata["reference_files"]) == ["chr2", "chr5"]
+    fasta_sequences = read_fasta_sequences(small_reference_file)
+    for sequence_id in ["chr2", "chr5"]:
+        reference_data = reference.load_reference_data(
+            tmp_path / metadata["reference_files"][sequence_id], memory_map=False
+        )
+        reference_bases = reference.get_ref_at_positions(
+            reference_data, np.arange(len(reference_data))
+        )
+        assert reference_bases.tobytes().decode() == fasta_sequences[sequence_id]
+        assert metadata["sequence_lengths"][sequence_id] == len(
+            fasta_sequences[sequence_id]
+        )
+
+
+@pytest.mark.reference_import
+def test_build_fasta_index(tmp_path):
+    fasta_index = reference.build_fasta_index(small_reference_file)
+
+    assert list(fasta_index) == [f"chr{c}" for c in range(1, 11)]
+    assert fasta_index["chr1"] == reference.FastaIndexEntry("chr1", 1066, 8, 60, 61)
+    assert fasta_index["chr2"] == reference.FastaIndexEntry("chr2", 1314, 1100, 60, 61)
+
+    index_path = tmp_path / "reference_small.fa.fai"
+    reference.write_fasta_index(fasta_index, index_path)
+    assert index_path.read_text().startswith("chr1\t1066\t8\t60\t61\n")
+    assert reference.read_fasta_index(index_path) == fasta_index
+
+
+@pytest.mark.reference_import
+def test_build_fasta_index_uneven_lines(tmp_path):
+    fasta_file = tmp_path / "uneven.fa"
+    fasta_file.write_text(">chr1\nACGT\nAC\nACGT\n")
+
+    with pytest.raises(ValueError):
+        reference.build_fasta_index(fasta_file)
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("chunk_size", [1, 60, 100, 1 << 24])
+def test_iter_indexed_sequence_chunks(chunk_size):
+    fasta_index = reference.build_fasta_index(small_reference_file)
+
+    with open(small_reference_file, "rb") as fasta_file:
+        for sequence_id, sequence in read_fasta_sequences(small_reference_file).items():
+            bases = b"".join(
+                reference.iter_indexed_sequence_chunks(
+                    fasta_file, fasta_index[sequence_id], chunk_size=chunk_size
+                )
+            )
+            assert bases.decode() == sequence
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("sequence_length", [19, 20])
+@pytest.mark.parametrize("chunk_size", [1, 10, 100])
+def test_iter_indexed_sequence_chunks_no_trailing_newline(
+    tmp_path, sequence_length, chunk_size
+):
+    sequence = ("ACGTACGTAC" * 2)[:sequence_length]
+    fasta_file = tmp_path / "no_newline.fa"
+    fasta_file.write_text(f">chr1\n{sequence[:10]}\n{sequence[10:]}")
+    fasta_index = reference.build_fasta_index(fasta_file)
+
+    with open(fasta_file, "rb") as fasta:
+        bases = b"".join(
+            reference.iter_indexed_sequence_chunks(
+                fasta, fasta_index["chr1"], chunk_size=chunk_size
+            )
+        )
+    assert bases.decode() == sequence
+
+    reference.import_reference(
+        file_path=fasta_file,
+        output_dir=tmp_path / "indexed",
+        reference_format="bytes",
+        workers=2,
+    )
+    with open(tmp_path / "indexed" / "sequence_metadata.json") as metadata_file:
+        reference_file = json.load(metadata_file)["reference_files"]["chr1"]
+    reference_data = reference.load_reference_data(
+        tmp_path / "indexed" / reference_file, memory_map=False
+    )
+    assert (
+        bytes(
+            reference.get_ref_at_positions(reference_data, np.arange(sequence_length))
+        )
+        == sequence.encode()
+    )
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("reference_format", ["bytes", "parquet"])
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("include_sequences", [None, ["chr5", "chr2"]])
+def test_import_reference_indexed(
+    tmp_path, reference_format, workers, include_sequences
+):
+    fasta_file = tmp_path / "reference_small.fa"
+    fasta_file.write_bytes(small_reference_file.read_bytes())
+    if workers == 1:
+        reference.write_fasta_index(
+            reference.build_fasta_index(fasta_file), f"{fasta_file}.fai"
+        )
+
+    reference.import_reference(
+        file_path=fasta_file,
+        output_dir=tmp_path / "indexed",
+        include_sequences=include_sequences,
+        reference_format=reference_format,
+        chunk_size=100,
+        workers=workers,
+    )
+    reference.import_reference(
+        file_path=small_reference_file,
+        output_dir=tmp_path / "streamed",
+        include_sequences=include_sequences,
+        reference_format=reference_format,
+    )
+
+    assert (tmp_path / "reference_small.fa.fai").exists()
+    with open(tmp_path / "indexed" / "sequence_metadata.json") as metadata_file:
+        indexed_metadata = json.load(metadata_file)
+    with open(tmp_path / "streamed" / "sequence_metadata.json") as metadata_file:
+        streamed_metadata = json.load(metadata_file)
+
+    assert indexed_metadata == streamed_metadata
+    for reference_file in streamed_metadata["reference_files"].values():
+        indexed_data = reference.load_reference_data(
+            tmp_path / "indexed" / reference_file, memory_map=False
+        )
+        streamed_data = reference.load_reference_data(
+            tmp_path / "streamed" / reference_file, memory_map=False
+        )
+        positions = np.arange(len(streamed_data))
+        assert np.array_equal(
+            reference.get_ref_at_positions(indexed_data, positions),
+            reference.get_ref_at_positions(streamed_data, positions),
+        )
+
+
+def compress_fasta(fasta_file, compression):
+    fasta_data = small_reference_file.read_bytes()
+    if compression == "gzip":
+        fasta_file.write_bytes(gzip.compress(fasta_data))
+    else:
+        with open(fasta_file, "wb") as bgzf_file:
+            for start in range(0, len(fasta_data), 1000):
+                bgzf_file.write(compress_block(fasta_data[start : start + 1000]))
+            bgzf_file.write(BGZF_EOF)
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("compression", ["gzip", "bgzf"])
+def test_compressed_fasta(tmp_path, compression):
+    fasta_file = tmp_path / "reference_small.fa.gz"
+    compress_fasta(fasta_file, compression)
+
+    assert reference.build_fasta_index(fasta_file) == reference.build_fasta_index(
+        small_reference_file
+    )
+    assert list(reference.iter_fasta_chunks(fasta_file, chunk_size=100)) == list(
+        reference.iter_fasta_chunks(small_reference_file, chunk_size=100)
+    )
+
+
+@pytest.mark.reference_import
+@pytest.mark.parametrize("compression", ["gzip", "bgzf"])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_import_reference_compressed(tmp_path, compression, workers):
+    fasta_file = tmp_path / "reference_small.fa.gz"
+    compress_fasta(fasta_file, compression)
+
+    reference.import_reference(
+        file_path=fasta_file,
+        output_dir=tmp_path / "compressed",
+        include_sequences=["chr7", "chr3"],
+        chunk_size=100,
+        workers=workers,
+    )
+    reference.import_reference(
+        file_path=small_reference_file,
+        output_dir=tmp_path / "plain",
+        include_sequences=["chr7", "chr3"],
+    )
+
+    indexed = compression == "bgzf" and workers > 1
+    assert (tmp_path / "reference_small.fa.gz.fai").exists() == indexed
+    assert (tmp_path / "reference_small.fa.gz.gzi").exists() == indexed
+    with open(tmp_path / "compressed" / "sequence_metadata.json") as metadata_file:
+        compressed_metadata = json.load(metadata_file)
+    assert compressed_metadata["reference_file"] == "reference_small.fa.gz"
+    assert compressed_metadata["sequence_lengths"] == {"chr3": 1132, "chr7": 1545}
+    for reference_file in compressed_metadata["reference_files"].values():
+        assert (tmp_path / "compressed" / reference_file).read_bytes() == (
+            tmp_path / "plain" / reference_file
+        ).read_bytes()
+
+
+@pytest.mark.reference_import
+def test_read_sequence_lengths(tmp_path):
+    assert reference.read_sequence_lengths(reference_dir / "bytes") == {
+        "chr1": 1066,
+        "chr2": 1314,
+        "chr3": 1132,
+        "chr4": 1906,
+        "chr5": 1790,
+        "chr6": 1672,
+        "chr7": 1545,
+        "chr8": 1130,
+        "chr9": 1238,
+        "chr10": 888,
+    }
+
+    reference.import_reference(
+        small_reference_file, tmp_path, include_sequences=["chr7", "chr3"]
+    )
+    assert reference.read_sequence_lengths(tmp_path) == {"chr3": 1132, "chr7": 1545}
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from fake_vcf.vcf_format import (
+    MAX_DEPTH,
+    MAX_GENOTYPE_QUALITY,
+    MEAN_DEPTH,
+    depth_distribution,
+    draw_format_values,
+    integer_lists,
+    inverse_cdf,
+    read_count_distributions,
+    render_sample_columns,
+)
+
+
+def genotype_alleles(num_alleles, num_rows, num_samples, seed):
+    rng = np.random.default_rng(seed)
+    alleles = rng.integers(0, num_alleles, size=(num_rows, num_samples, 2))
+    # Mostly homozygous reference samples like in a real cohort
+    alleles[rng.random((num_rows, num_samples)) < 0.6] = 0
+    return alleles.astype(np.int8)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("separator", [":", ","])
+def test_integer_lists(separator):
+    values = np.array([[[0, 7, 250]], [[9, 10, 99999]]])
+    text = integer_lists(values, separator)
+    assert text.dtype == np.uint8
+    assert [
+        text[row, sample].tobytes().replace(b"\0", b"").decode()
+        for row, sample in np.ndindex(values.shape[:2])
+    ] == [f"{separator}0,7,250", f"{separator}9,10,99999"]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("distribution", [depth_distribution, read_count_distributions])
+def test_inverse_cdf(distribution):
+    cdf, guide = distribution()
+    rng = np.random.default_rng(4)
+    rows = rng.integers(0, cdf.shape[0], size=20000)
+    draws = rng.random(20000, dtype=np.float32)
+    draws[:10] = 0
+    draws[10:20] = np.nextafter(np.float32(1), np.float32(0))
+
+    values = inverse_cdf(cdf, guide, rows, draws)
+    assert values.tolist() == [
+        int(np.searchsorted(cdf[row], draw, side="right"))
+        for row, draw in zip(rows.tolist(), draws)
+    ]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("num_alleles", [2, 3, 4])
+def test_draw_format_values(num_alleles):
+    alleles = genotype_alleles(num_alleles, 50, 400, seed=num_alleles)
+    draws = np.random.default_rng(1).random((50, 400, 2), dtype=np.float32)
+    values = draw_format_values(alleles, draws, num_alleles)
+
+    assert values.allele_depths.shape == (50, 400, num_alleles)
+    assert values.likelihoods.shape == (50, 400, num_alleles * (num_alleles + 1) // 2)
+    assert (values.allele_depths.sum(axis=-1) == values.depths).all()
+    assert (values.depths <= MAX_DEPTH).all()
+    assert abs(values.depths.mean() - MEAN_DEPTH) < 1
+
+    first, second = alleles[..., 0], alleles[..., 1]
+    heterozygous = first != second
+    # Heterozygous samples only have reads of their alleles
+    het_depths = np.take_along_axis(
+        values.allele_depths, alleles.astype(np.intp), axis=-1
+    ).sum(axis=-1)
+    assert (het_depths[heterozygous] == values.depths[heterozygous]).all()
+    # Most reads of homozygous samples are of their allele
+    hom_reads = np.take_along_axis(
+        values.allele_depths, first[..., np.newaxis].astype(np.intp), axis=-1
+    )[..., 0]
+    assert hom_reads[~heterozygous].sum() > 0.98 * values.depths[~heterozygous].sum()
+
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    called = (high.astype(np.intp) * (high + 1) // 2 + low)[..., np.newaxis]
+    assert (np.take_along_axis(values.likelihoods, called, axis=-1) == 0).all()
+    assert (values.likelihoods >= 0).all()
+    other_likelihoods = values.likelihoods.astype(float)
+    np.put_along_axis(other_likelihoods, called, np.inf, axis=-1)
+    assert (
+        values.genotype_qualities
+        == np.minimum(other_likelihoods.min(axis=-1), MAX_GENOTYPE_QUALITY)
+    ).all()
+    # Deep samples are called with confidence
+    assert (values.genotype_qualities[values.depths >= 30] > 20).mean() > 0.95
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("phased", [True, False])
+@pytest.mark.parametrize("num_alleles", [2, 4])
+def test_render_sample_columns(phased, num_alleles):
+    alleles = genotype_alleles(num_alleles, 6, 9, seed=2)
+    draws = np.random.default_rng(3).random((6, 9, 2), dtype=np.float32)
+    values = draw_format_values(alleles, draws, num_alleles)
+    # A PL value wider than the others
+    values.likelihoods[0, 0] = 12345
+
+    text, row_sizes = render_sample_columns(alleles, values, phased)
+
+    separator = "|" if phased else "/"
+    expected = [
+        "".join(
+            f"{alleles[row, sample, 0]}{separator}{alleles[row, sample, 1]}:"
+            + ",".join(str(v) for v in values.allele_depths[row, sample])
+            + f":{values.depths[row, sample]}:{values.genotype_qualities[row, sample]}:"
+            + ",".join(str(v) for v in values.likelihoods[row, sample])
+            + "\t"
+            for sample in range(9)
+        )
+        for row in range(6)
+    ]
+    assert text.decode() == "".join(expected)
+    assert row_sizes.tolist() == [len(row) for row in expected]
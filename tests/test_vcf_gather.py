@@ -0,0 +1,95 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from fake_vcf import vcf_gather
+from fake_vcf.vcf_faker import VirtualVCF
+from fake_vcf.vcf_gather import GatherWriter
+
+
+def fragments():
+    data = memoryview(b"0|0\t1|0\t0|1\t")
+    return [b"chr1\t10\t", data[4:11], b"\n", b"", b"chr1\t20\t", data[:3], b"\n"]
+
+
+@pytest.mark.generate_vcf
+def test_gather_writer_file(tmp_path):
+    with GatherWriter(open(tmp_path / "test.vcf", "wb"), gather_bytes=10) as writer:
+        writer.writelines(iter(fragments()))
+        # The fragments are written each time gather_bytes are gathered
+        assert (tmp_path / "test.vcf").stat().st_size == 27
+        writer.write(b"end\n")
+        assert writer.tell() == 32
+        assert (tmp_path / "test.vcf").stat().st_size == 27
+
+    assert (
+        tmp_path / "test.vcf"
+    ).read_bytes() == b"chr1\t10\t1|0\t0|1\nchr1\t20\t0|0\nend\n"
+
+
+@pytest.mark.generate_vcf
+def test_gather_writer_without_file_descriptor():
+    output = io.BytesIO()
+    with GatherWriter(output, close_file=False) as writer:
+        writer.writelines(fragments())
+        assert output.getvalue() == b""
+    assert output.getvalue() == b"chr1\t10\t1|0\t0|1\nchr1\t20\t0|0\n"
+    assert not output.closed
+
+
+@pytest.mark.generate_vcf
+def test_gather_writer_partial_writes(tmp_path, monkeypatch):
+    writev = os.writev
+    calls = []
+
+    def short_writev(fd, buffers):
+        # Write at most 5 bytes and 2 buffers per call
+        calls.append(len(buffers))
+        return writev(fd, [bytes(buffer)[:5] for buffer in buffers[:2]][:1])
+
+    monkeypatch.setattr(vcf_gather, "IOV_MAX", 3)
+    monkeypatch.setattr(vcf_gather.os, "writev", short_writev)
+    with GatherWriter(open(tmp_path / "test.vcf", "wb")) as writer:
+        writer.writelines(fragments())
+
+    assert (
+        tmp_path / "test.vcf"
+    ).read_bytes() == b"chr1\t10\t1|0\t0|1\nchr1\t20\t0|0\n"
+    assert max(calls) == 3
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("num_samples", [1, 100])
+def test_fragment_blocks(num_samples):
+    vcf_args = dict(
+        num_rows=20, num_samples=num_samples, chromosome="chr1", random_seed=2
+    )
+    blocks = list(VirtualVCF(**vcf_args, block_size=6).fragment_blocks())
+
+    assert len(blocks) == 1 + 4
+    assert [b"".join(block) for block in blocks] == list(
+        VirtualVCF(**vcf_args, block_size=6).blocks(encoded=True)
+    )
+
+
+@pytest.mark.generate_vcf
+def test_to_std_out_pipe():
+    # Writes to a real pipe, like when piping the output into bcftools
+    code = (
+        "from fake_vcf.vcf_faker import VirtualVCF;"
+        "from fake_vcf.vcf_generator import to_std_out;"
+        "print('first', flush=False);"
+        "to_std_out(VirtualVCF(num_rows=500, num_samples=30, chromosome='chr1',"
+        " random_seed=1))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, stdout=subprocess.PIPE
+    ).stdout
+
+    expected = "".join(
+        VirtualVCF(num_rows=500, num_samples=30, chromosome="chr1", random_seed=1)
+    )
+    assert output.decode() == "first\n" + expected
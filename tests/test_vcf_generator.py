@@ -0,0 +1,177 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from fake_vcf.vcf_faker import VirtualVCF
+from fake_vcf.vcf_generator import (
+    fake_vcf_data,
+    parse_region,
+    plan_shards,
+    resolve_contigs,
+    shard_bounds,
+)
+
+test_data_dir = Path(__file__).resolve().parent / "test_data"
+reference_dir = test_data_dir / "reference"
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("num_rows", "num_shards", "expected"),
+    [
+        (10, 1, [(0, 10)]),
+        (10, 3, [(0, 3), (3, 6), (6, 10)]),
+        (2, 5, [(0, 1), (1, 2)]),
+    ],
+)
+def test_shard_bounds(num_rows, num_shards, expected):
+    assert shard_bounds(num_rows, num_shards) == expected
+
+
+@pytest.mark.generate_vcf
+def test_resolve_contigs():
+    assert resolve_contigs("chr1") == {"chr1": None}
+    assert resolve_contigs(["chr2", "chr1"]) == {"chr2": None, "chr1": None}
+    assert resolve_contigs(["chr2", "chr1"], reference_dir / "bytes") == {
+        "chr2": 1314,
+        "chr1": 1066,
+    }
+    all_contigs = resolve_contigs(["all"], reference_dir / "bytes")
+    assert list(all_contigs) == [f"chr{c}" for c in range(1, 11)]
+    assert all_contigs["chr4"] == 1906
+    # References imported without lengths
+    assert set(resolve_contigs("all", reference_dir / "parquet").values()) == {None}
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    "chromosomes", [["all"], ["chr1", "chr2", "chr1"], ["all", "chr1"]]
+)
+def test_resolve_contigs_invalid(chromosomes):
+    with pytest.raises(ValueError):
+        resolve_contigs(chromosomes)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", [1, 2, 5])
+def test_plan_shards_single_contig(workers):
+    shards = plan_shards(
+        dict(chromosome="chr1", num_samples=3, random_seed=1), 100, workers
+    )
+
+    assert len(shards) == workers
+    assert [(shard["start_row"], shard["stop_row"]) for shard in shards] == (
+        shard_bounds(100, workers)
+    )
+    assert {shard["num_rows"] for shard in shards} == {100}
+    assert [shard["include_header"] for shard in shards] == [True] + [False] * (
+        workers - 1
+    )
+    # The shards are rows of the same VCF
+    assert {shard["row_seed"] for shard in shards} == {None}
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("workers", "expected"),
+    [
+        (1, [("chr2", 0, 40), ("chr1", 0, 40), ("chr3", 0, 20)]),
+        (
+            5,
+            [
+                ("chr2", 0, 20),
+                ("chr2", 20, 40),
+                ("chr1", 0, 20),
+                ("chr1", 20, 40),
+                ("chr3", 0, 20),
+            ],
+        ),
+    ],
+)
+def test_plan_shards_contigs(workers, expected):
+    vcf_args = dict(
+        chromosome="chr2",
+        contigs={"chr2": 2000, "chr1": 2000, "chr3": 1000, "chrM": 1},
+        num_samples=3,
+    )
+    shards = plan_shards(vcf_args, 100, workers)
+
+    assert [
+        (shard["chromosome"], shard["start_row"], shard["stop_row"]) for shard in shards
+    ] == expected
+    assert [shard["include_header"] for shard in shards] == [True] + [False] * (
+        len(expected) - 1
+    )
+    # The shards share the samples and the shards of a contig its rows
+    assert len({shard["random_seed"] for shard in shards}) == 1
+    assert len({(shard["chromosome"], shard["row_seed"]) for shard in shards}) == 3
+    assert all(shard["contigs"] == vcf_args["contigs"] for shard in shards)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", [1, 3])
+def test_plan_shards_region(workers):
+    vcf_args = dict(
+        chromosome="chr2",
+        contigs={"chr2": None, "chr1": None},
+        num_samples=3,
+        random_seed=2,
+    )
+    shards = plan_shards(vcf_args, 100, workers, region=("chr1", 1001, 3000))
+
+    assert {shard["chromosome"] for shard in shards} == {"chr1"}
+    assert shards[0]["include_header"]
+    rows = VirtualVCF(**{**shards[0], "start_row": 0, "stop_row": 50}).rows(0, 50)
+    positions = [int(row.split("\t")[1]) for row in rows]
+    assert [
+        row for shard in shards for row in range(shard["start_row"], shard["stop_row"])
+    ] == [row for row, position in enumerate(positions) if 1001 <= position <= 3000]
+
+    with pytest.raises(ValueError):
+        plan_shards(vcf_args, 100, workers, region=("chr3", 1, 100))
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("region", "expected"),
+    [
+        ("chr1:1000000-2000000", ("chr1", 1000000, 2000000)),
+        ("chr1:1,000,000-2,000,000", ("chr1", 1000000, 2000000)),
+        ("chrX:5", ("chrX", 5, sys.maxsize)),
+        ("chr2", ("chr2", 1, sys.maxsize)),
+    ],
+)
+def test_parse_region(region, expected):
+    assert parse_region(region) == expected
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    "region", ["", "chr1:", "chr1:200-100", "chr1:0-10", "chr1:a-b"]
+)
+def test_parse_region_invalid(region):
+    with pytest.raises(ValueError):
+        parse_region(region)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", [1, 2])
+def test_fake_vcf_data_bcf_max_position(tmp_path, workers):
+    fake_vcf_path = tmp_path / "test.bcf"
+    with pytest.raises(ValueError, match="too large for BCF"):
+        fake_vcf_data(
+            fake_vcf_path,
+            num_rows=30_000_000,
+            num_samples=5,
+            chromosome="chr1",
+            seed=1,
+            sample_prefix="S",
+            phased=True,
+            large_format=False,
+            reference_dir_path=None,
+            workers=workers,
+        )
+
+    # Nothing is written before the positions are checked
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,178 @@
+import gzip
+import random
+import struct
+
+import numpy as np
+import pytest
+
+from fake_vcf.vcf_bgzf import BgzfWriter
+from fake_vcf.vcf_faker import VirtualVCF
+from fake_vcf.vcf_generator import to_sharded_output, to_vcf_file
+from fake_vcf.vcf_index import (
+    IndexFormat,
+    VcfIndexer,
+    index_depth,
+    level_first_bin,
+    region_bins,
+)
+
+
+def reg2bin(begin, end, depth=5, min_shift=14):
+    # The reference implementation from the SAM specification
+    end -= 1
+    level, shift, first_bin = depth, min_shift, level_first_bin(depth)
+    while level > 0:
+        if begin >> shift == end >> shift:
+            return first_bin + (begin >> shift)
+        level -= 1
+        shift += 3
+        first_bin -= 1 << level * 3
+    return 0
+
+
+def read_tbi(index_path):
+    """Reads the bins and linear index of each sequence of a tabix index."""
+    with gzip.open(index_path, "rb") as index_file:
+        data = index_file.read()
+    assert data[:4] == b"TBI\x01"
+    num_refs = struct.unpack_from("<i", data, 4)[0]
+    names_length = struct.unpack_from("<i", data, 32)[0]
+    names = data[36 : 36 + names_length].split(b"\x00")[:-1]
+    offset = 36 + names_length
+    references = {}
+    for name in names[:num_refs]:
+        num_bins = struct.unpack_from("<i", data, offset)[0]
+        offset += 4
+        bins = {}
+        for _ in range(num_bins):
+            bin_number, num_chunks = struct.unpack_from("<Ii", data, offset)
+            offset += 8
+            bins[bin_number] = [
+                struct.unpack_from("<2Q", data, offset + 16 * i)
+                for i in range(num_chunks)
+            ]
+            offset += 16 * num_chunks
+        num_windows = struct.unpack_from("<i", data, offset)[0]
+        offset += 4
+        linear_index = struct.unpack_from(f"<{num_windows}Q", data, offset)
+        offset += 8 * num_windows
+        references[name.decode()] = (bins, linear_index)
+    assert data[offset:] == b"\x00" * 8
+    return references
+
+
+@pytest.mark.generate_vcf
+def test_region_bins():
+    rng = random.Random(3)
+    begins = [rng.randrange(1 << 29) for _ in range(1000)] + [0, 16383, 16384]
+    lengths = [rng.choice([1, 2, 100, 20000, 1 << 20]) for _ in begins]
+    ends = [min(begin + length, 1 << 29) for begin, length in zip(begins, lengths)]
+
+    bins = region_bins(np.array(begins), np.array(ends), depth=5)
+    assert bins.tolist() == [reg2bin(b, e) for b, e in zip(begins, ends)]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("max_position", "expected"),
+    [(0, 5), (1 << 29, 5), ((1 << 29) + 1, 6), (1 << 32, 6), ((1 << 32) + 1, 7)],
+)
+def test_index_depth(max_position, expected):
+    assert index_depth(max_position) == expected
+
+
+@pytest.mark.generate_vcf
+def test_tbi_max_position():
+    with pytest.raises(ValueError):
+        VcfIndexer(IndexFormat.TBI, max_position=(1 << 29) + 1)
+    with pytest.raises(ValueError):
+        VcfIndexer(IndexFormat.TBI, bcf_contigs=["chr1"])
+    VcfIndexer(IndexFormat.CSI, max_position=(1 << 29) + 1)
+
+
+@pytest.mark.generate_vcf
+def test_tbi_index(tmp_path):
+    vcf_path = tmp_path / "test.vcf.gz"
+    virtual_vcf = VirtualVCF(
+        num_rows=2000, num_samples=5, chromosome="chr7", random_seed=1, block_size=100
+    )
+    to_vcf_file(virtual_vcf, vcf_path, num_rows=2000, index_format=IndexFormat.TBI)
+
+    references = read_tbi(tmp_path / "test.vcf.gz.tbi")
+    assert list(references) == ["chr7"]
+    bins, linear_index = references["chr7"]
+
+    with gzip.open(vcf_path, "rb") as vcf_file:
+        rows = [row for row in vcf_file if not row.startswith(b"#")]
+    positions = [int(row.split(b"\t")[1]) for row in rows]
+    # Pseudo bin with the nr of records
+    assert bins[37450][1] == (2000, 0)
+    assert len(linear_index) == ((positions[-1] - 1) >> 14) + 1
+    ref_lengths = [len(row.split(b"\t")[3]) for row in rows]
+    assert set(bins) == {
+        reg2bin(position - 1, position - 1 + ref_length)
+        for position, ref_length in zip(positions, ref_lengths)
+    } | {37450}
+    assert linear_index == tuple(sorted(linear_index))
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize(
+    ("file_name", "index_format"),
+    [
+        ("test.vcf.gz", IndexFormat.TBI),
+        ("test.vcf.gz", IndexFormat.CSI),
+        ("test.bcf", IndexFormat.CSI),
+    ],
+)
+@pytest.mark.parametrize("workers", [1, 3])
+def test_index_fetch_with_pysam(tmp_path, file_name, index_format, workers):
+    pysam = pytest.importorskip("pysam")
+    vcf_path = tmp_path / file_name
+    vcf_args = dict(num_rows=20000, num_samples=3, chromosome="chr1", random_seed=7)
+    if workers == 1:
+        to_vcf_file(
+            VirtualVCF(**vcf_args, block_size=500),
+            vcf_path,
+            num_rows=20000,
+            index_format=index_format,
+        )
+    else:
+        to_sharded_output(
+            vcf_args, vcf_path, workers=workers, index_format=index_format
+        )
+
+    with pysam.VariantFile(vcf_path) as vcf_file:
+        records = [(record.start, record.stop) for record in vcf_file]
+    rng = random.Random(1)
+    with pysam.VariantFile(
+        vcf_path, index_filename=f"{vcf_path}.{index_format.value}"
+    ) as vcf_file:
+        for _ in range(50):
+            start = rng.randrange(records[-1][1] + 100)
+            stop = start + rng.choice([1, 100, 10000, 1000000])
+            assert [
+                (record.start, record.stop)
+                for record in vcf_file.fetch("chr1", start, stop)
+            ] == [
+                record for record in records if record[1] > start and record[0] < stop
+            ]
+
+
+@pytest.mark.generate_vcf
+def test_indexer_add_block_offsets(tmp_path):
+    indexer = VcfIndexer(IndexFormat.TBI)
+    with BgzfWriter(tmp_path / "test.vcf.gz") as vcf_file:
+        for block in [b"#header\n", b"chr1\t1\t.\tA\tC\n", b"chr1\t20000\t.\tAC\tC\n"]:
+            indexer.add_block(block, vcf_file.tell())
+            vcf_file.write(block)
+
+    reference_index = indexer.references["chr1"]
+    assert reference_index.num_records == 2
+    assert reference_index.start == 8
+    assert reference_index.end == 8 + 13 + 18
+    assert reference_index.linear == {0: 8, 1: 8 + 13}
+    assert reference_index.bins == {
+        reg2bin(0, 1): [[8, 21]],
+        reg2bin(19999, 20001): [[21, 39]],
+    }
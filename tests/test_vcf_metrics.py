@@ -0,0 +1,165 @@
+import json
+import pstats
+import threading
+import time
+
+import pytest
+
+from fake_vcf.vcf_metrics import (
+    MetricsFormat,
+    MetricsReporter,
+    ProfileMode,
+    default_profile_path,
+    peak_rss_bytes,
+    profiled,
+)
+from fake_vcf.vcf_pipeline import StageTimer
+
+
+def stage_timers():
+    stage = StageTimer("write")
+    stage.busy_seconds = 1.5
+    stage.wait_seconds = 0.25
+    stage.num_bytes = 300
+    return [stage]
+
+
+@pytest.mark.generate_vcf
+def test_metrics_reporter_json(tmp_path, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("fake_vcf.vcf_metrics.time.perf_counter", lambda: clock[0])
+    metrics_file = tmp_path / "metrics.jsonl"
+
+    with MetricsReporter(metrics_file, interval=10) as metrics:
+        metrics.update(100, 1000)
+        clock[0] += 5
+        metrics.update(100, 1000, stages=stage_timers)
+        # Nothing is reported before the interval has passed
+        assert metrics_file.read_text() == ""
+        clock[0] += 5
+        metrics.update(200)
+        clock[0] += 10
+
+    reports = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert [report["rows"] for report in reports] == [400, 400]
+    assert [report["done"] for report in reports] == [False, True]
+    assert reports[0]["elapsed_seconds"] == 10
+    assert reports[0]["rows_per_second"] == 40
+    assert reports[1]["bytes"] == 2000
+    assert reports[1]["bytes_per_second"] == 100
+    assert reports[1]["peak_rss_bytes"] > 0
+    assert reports[1]["stages"] == {
+        "write": {"busy_seconds": 1.5, "wait_seconds": 0.25, "bytes": 300}
+    }
+
+
+@pytest.mark.generate_vcf
+def test_metrics_reporter_prometheus(tmp_path):
+    metrics_file = tmp_path / "fake_vcf.prom"
+    with MetricsReporter(
+        metrics_file,
+        metrics_format=MetricsFormat.PROMETHEUS,
+        command="import-reference",
+        unit="bases",
+    ) as metrics:
+        metrics.update(5000, stages=stage_timers)
+
+    samples = {
+        line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+        for line in metrics_file.read_text().splitlines()
+        if not line.startswith("#")
+    }
+    assert samples['fake_vcf_bases_total{command="import-reference"}'] == 5000
+    assert samples['fake_vcf_done{command="import-reference"}'] == 1
+    assert (
+        samples['fake_vcf_stage_busy_seconds{command="import-reference",stage="write"}']
+        == 1.5
+    )
+    # No bytes were reported
+    assert 'fake_vcf_bytes_total{command="import-reference"}' not in samples
+    assert list(tmp_path.iterdir()) == [metrics_file]
+
+
+@pytest.mark.generate_vcf
+def test_metrics_reporter_interval(tmp_path):
+    with pytest.raises(ValueError):
+        MetricsReporter(tmp_path / "metrics.jsonl", interval=0)
+
+
+@pytest.mark.generate_vcf
+def test_peak_rss_bytes():
+    # More than the 1 MiB a Python process with numpy always uses
+    assert peak_rss_bytes() > 1 << 20
+
+
+@pytest.mark.generate_vcf
+def test_profiled_cprofile(tmp_path, capsys):
+    profile_file = tmp_path / "generate.prof"
+    with profiled(ProfileMode.CPROFILE, profile_file):
+        sorted(range(1000), key=lambda value: -value)
+
+    stats = pstats.Stats(str(profile_file))
+    assert any(function == "<lambda>" for _, _, function in stats.stats)
+    assert "Ordered by: cumulative time" in capsys.readouterr().err
+
+
+@pytest.mark.generate_vcf
+def test_profiled_cprofile_threads(tmp_path, capsys):
+    def sort_in_thread():
+        sorted(range(1000), key=lambda value: -value)
+
+    profile_file = tmp_path / "generate.prof"
+    with profiled(ProfileMode.CPROFILE, profile_file):
+        thread = threading.Thread(target=sort_in_thread)
+        thread.start()
+        thread.join()
+
+    stats = pstats.Stats(str(profile_file))
+    assert any(function == "sort_in_thread" for _, _, function in stats.stats)
+    assert "sort_in_thread" in capsys.readouterr().err
+
+
+@pytest.mark.generate_vcf
+def test_profiled_tracemalloc(tmp_path, capsys):
+    profile_file = tmp_path / "generate.txt"
+    with profiled(ProfileMode.TRACEMALLOC, profile_file):
+        data = [bytes(1000) for _ in range(1000)]
+
+    assert len(data) == 1000
+    profile = profile_file.read_text()
+    assert profile.startswith("Peak traced memory: ")
+    assert "test_vcf_metrics.py" in profile
+    assert profile in capsys.readouterr().err.replace("\r", "")
+
+
+@pytest.mark.generate_vcf
+def test_profiled_tracemalloc_peak(tmp_path, capsys):
+    profile_file = tmp_path / "generate.txt"
+    with profiled(ProfileMode.TRACEMALLOC, profile_file):
+        data = [bytes(1000) for _ in range(20_000)]
+        time.sleep(0.3)
+        del data
+
+    # The allocations freed before the end are reported from the peak
+    profile = profile_file.read_text().splitlines()
+    assert profile[1].startswith("Largest allocations at ")
+    assert float(profile[1].split()[3]) > 19
+    assert "test_vcf_metrics.py" in profile[2]
+    assert "tracemalloc.py" not in "\n".join(profile)
+
+
+@pytest.mark.generate_vcf
+def test_profiled_without_profile(tmp_path, capsys):
+    with profiled(None):
+        pass
+    assert capsys.readouterr().err == ""
+
+
+@pytest.mark.generate_vcf
+def test_default_profile_path():
+    assert default_profile_path(ProfileMode.CPROFILE, "generate").name == (
+        "fake-vcf-generate.prof"
+    )
+    assert default_profile_path("tracemalloc", "import-reference").name == (
+        "fake-vcf-import-reference.tracemalloc.txt"
+    )
@@ -0,0 +1,183 @@
+import gzip
+import io
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+from fake_vcf.vcf_bgzf import BgzfWriter
+from fake_vcf.vcf_faker import VirtualVCF
+from fake_vcf.vcf_gather import GatherWriter
+from fake_vcf.vcf_pipeline import BlockPipeline, format_stage_times
+
+
+class BlockedWriter:
+    """A writer that writes nothing until it is released."""
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.written = []
+
+    def writelines(self, fragments):
+        self.released.wait()
+        self.written.extend(fragments)
+
+    def tell(self):
+        return 0
+
+
+class FailingWriter(BlockedWriter):
+    def writelines(self, fragments):
+        raise OSError("No space left on device")
+
+
+class SlowWriter:
+    """A writer that counts the bytes written and takes its time for each batch."""
+
+    def __init__(self):
+        self.num_bytes = 0
+
+    def writelines(self, fragments):
+        time.sleep(0.002)
+        self.num_bytes += sum(map(len, fragments))
+
+    def tell(self):
+        return 0
+
+
+def vcf_fragment_blocks():
+    return VirtualVCF(
+        num_rows=300, num_samples=20, chromosome="chr1", random_seed=5
+    ).fragment_blocks()
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("batch_bytes", [1, 100, 1 << 20])
+def test_block_pipeline_output(batch_bytes):
+    expected = b"".join(
+        fragment for fragments in vcf_fragment_blocks() for fragment in fragments
+    )
+
+    output = io.BytesIO()
+    with GatherWriter(output, close_file=False) as writer, BlockPipeline(
+        writer, batch_bytes=batch_bytes, queue_batches=2
+    ) as pipeline:
+        pipeline.write(b"")
+        for fragments in vcf_fragment_blocks():
+            pipeline.writelines(fragments)
+            assert pipeline.tell() <= len(expected)
+        assert pipeline.tell() == len(expected)
+
+    assert output.getvalue() == expected
+    generate_stage, write_stage = pipeline.stages()
+    assert generate_stage.name == "generate" and write_stage.name == "write"
+    assert generate_stage.num_bytes == write_stage.num_bytes == len(expected)
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("threads", [1, 3])
+def test_block_pipeline_bgzf(tmp_path, threads):
+    data = [bytes([65 + i % 26]) * 1000 + b"\n" for i in range(500)]
+    with BgzfWriter(tmp_path / "test.txt.gz", threads=threads) as bgzf_file:
+        bgzf_file.write(b"header\n")
+        with BlockPipeline(bgzf_file, batch_bytes=10_000) as pipeline:
+            # The offsets follow the data already written by the writer
+            assert pipeline.tell() == 7
+            pipeline.writelines(data)
+
+    assert gzip.decompress((tmp_path / "test.txt.gz").read_bytes()) == (
+        b"header\n" + b"".join(data)
+    )
+    stages = pipeline.stages()
+    assert [stage.name for stage in stages] == ["generate", "compress", "write"]
+    assert stages[1].busy_seconds > 0
+    assert format_stage_times(stages).startswith("Stage times: generate ")
+
+
+@pytest.mark.generate_vcf
+def test_block_pipeline_back_pressure():
+    writer = BlockedWriter()
+    pipeline = BlockPipeline(writer, batch_bytes=1, queue_batches=2)
+    producer = threading.Thread(
+        target=lambda: [pipeline.write(fragment) for fragment in [b"x"] * 10]
+    )
+    producer.start()
+    producer.join(timeout=0.5)
+
+    # The writer holds one batch and the queue two, the producer waits for them
+    assert producer.is_alive()
+    assert pipeline.tell() == 4
+    writer.released.set()
+    producer.join()
+    pipeline.close()
+    assert writer.written == [b"x"] * 10
+    assert pipeline.stages()[0].wait_seconds > 0
+
+
+@pytest.mark.generate_vcf
+def test_block_pipeline_wide_rows_memory():
+    def peak_traced_bytes(write_blocks):
+        # Rows of more than SAMPLE_CHUNK_SIZE samples are rendered in chunks
+        v_vcf = VirtualVCF(
+            num_rows=4,
+            num_samples=200_000,
+            chromosome="chr1",
+            random_seed=5,
+            genotype_model="af",
+        )
+        writer = SlowWriter()
+        tracemalloc.start()
+        try:
+            write_blocks(v_vcf.fragment_blocks(), writer)
+            return tracemalloc.get_traced_memory()[1], writer.num_bytes
+        finally:
+            tracemalloc.stop()
+
+    def write_directly(blocks, writer):
+        for fragments in blocks:
+            writer.writelines(fragments)
+
+    def write_through_pipeline(blocks, writer):
+        with BlockPipeline(writer, batch_bytes=64 * 1024, queue_batches=2) as pipeline:
+            for fragments in blocks:
+                pipeline.writelines(fragments)
+
+    direct_peak, direct_bytes = peak_traced_bytes(write_directly)
+    pipeline_peak, pipeline_bytes = peak_traced_bytes(write_through_pipeline)
+
+    assert pipeline_bytes == direct_bytes > 16 * 1024 * 1024
+    # The pipeline holds a few batches, never the chunks of a whole row
+    assert pipeline_peak < direct_peak + 1024 * 1024
+
+
+@pytest.mark.generate_vcf
+def test_block_pipeline_writer_error():
+    with pytest.raises(OSError, match="No space left"):
+        with BlockPipeline(FailingWriter(), batch_bytes=1, queue_batches=1) as pipeline:
+            # The error is raised on a later write or when the pipeline is closed
+            for _ in range(10):
+                pipeline.write(b"x")
+
+
+@pytest.mark.generate_vcf
+def test_block_pipeline_generate_error():
+    writer = BlockedWriter()
+    with pytest.raises(ValueError, match="Bad row"):
+        with BlockPipeline(writer, batch_bytes=1, queue_batches=4) as pipeline:
+            pipeline.write(b"x")
+            pipeline.write(b"y")
+            threading.Timer(0.2, writer.released.set).start()
+            raise ValueError("Bad row")
+
+    # The writer thread stops without writing the batches it had not started
+    assert not pipeline._thread.is_alive()
+    assert writer.written in ([], [b"x"])
+
+
+@pytest.mark.generate_vcf
+def test_block_pipeline_arguments():
+    with pytest.raises(ValueError):
+        BlockPipeline(io.BytesIO(), batch_bytes=0)
+    with pytest.raises(ValueError):
+        BlockPipeline(io.BytesIO(), queue_batches=0)
@@ -0,0 +1,360 @@
+import contextlib
+import itertools
+import json
+import struct
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fake_vcf.vcf_faker import VirtualVCF, contig_vcf_args
+from fake_vcf.vcf_zarr import (
+    _variant_chunk_parts,
+    encode_vlen_utf8,
+    is_zarr_path,
+    parse_genotypes,
+    to_zarr_store,
+)
+
+test_data_dir = Path(__file__).resolve().parent / "test_data"
+reference_dir = test_data_dir / "reference" / "bytes"
+
+
+def decode_vlen_utf8(data):
+    num_values = struct.unpack_from("<I", data)[0]
+    values, offset = [], 4
+    for _ in range(num_values):
+        length = struct.unpack_from("<I", data, offset)[0]
+        values.append(data[offset + 4 : offset + 4 + length].decode())
+        offset += 4 + length
+    return values
+
+
+def read_zarr_array(store_path, name):
+    """Reads a Zarr v2 array written by fake-vcf, unwritten chunks are fill values."""
+    with open(store_path / name / ".zarray") as metadata_file:
+        metadata = json.load(metadata_file)
+    shape, chunks = metadata["shape"], metadata["chunks"]
+    dtype = object if metadata["dtype"] == "|O" else np.dtype(metadata["dtype"])
+    fill_value = metadata["fill_value"]
+    padded_shape = [-(-size // chunk) * chunk for size, chunk in zip(shape, chunks)]
+    values = np.full(padded_shape, np.nan if fill_value == "NaN" else fill_value, dtype)
+    for chunk_index in itertools.product(
+        *[range(-(-size // chunk)) for size, chunk in zip(shape, chunks)]
+    ):
+        chunk_path = store_path / name / ".".join(str(i) for i in chunk_index)
+        if not chunk_path.exists():
+            continue
+        data = zlib.decompress(chunk_path.read_bytes())
+        if dtype is object:
+            chunk_values = np.array(decode_vlen_utf8(data), dtype=object)
+        else:
+            chunk_values = np.frombuffer(data, dtype=dtype)
+        values[
+            tuple(
+                slice(i * chunk, (i + 1) * chunk)
+                for i, chunk in zip(chunk_index, chunks)
+            )
+        ] = chunk_values.reshape(chunks)
+    return values[tuple(slice(0, size) for size in shape)]
+
+
+def write_store(store_path, vcf_args, workers=1, **chunk_sizes):
+    with contextlib.redirect_stdout(None):
+        to_zarr_store(vcf_args, store_path, workers=workers, **chunk_sizes)
+
+
+def vcf_rows(vcf_args, variants_chunk_size):
+    """Renders the rows of the chunks of a store as VCF text."""
+    num_rows = vcf_args["num_rows"]
+    store_args = {key: value for key, value in vcf_args.items() if key != "num_rows"}
+    contigs = contig_vcf_args(store_args, num_rows)
+    rows = []
+    for start in range(0, num_rows, variants_chunk_size):
+        for _, part_args in _variant_chunk_parts(
+            start, min(start + variants_chunk_size, num_rows), contigs
+        ):
+            rows.extend(
+                row.split("\t")
+                for row in "".join(VirtualVCF(**part_args).blocks()).splitlines()
+            )
+    return rows
+
+
+@pytest.mark.generate_vcf
+def test_is_zarr_path():
+    assert is_zarr_path(Path("test.zarr"))
+    assert not is_zarr_path("test.vcf")
+    assert not is_zarr_path(None)
+
+
+@pytest.mark.generate_vcf
+def test_encode_vlen_utf8():
+    values = ["rs1", "", "ACGT", "ö"]
+    assert encode_vlen_utf8(values) == (
+        b"\x04\x00\x00\x00"
+        + b"\x03\x00\x00\x00rs1"
+        + b"\x00\x00\x00\x00"
+        + b"\x04\x00\x00\x00ACGT"
+        + b"\x02\x00\x00\x00\xc3\xb6"
+    )
+    assert decode_vlen_utf8(encode_vlen_utf8(values)) == values
+
+
+@pytest.mark.generate_vcf
+def test_parse_genotypes():
+    alleles, phased = parse_genotypes(["0|1:0,30:30:89:913,89,0", "1/1", "0|0"])
+    assert alleles.tolist() == [[0, 1], [1, 1], [0, 0]]
+    assert alleles.dtype == np.int8
+    assert phased.tolist() == [True, False, True]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("phased", [True, False])
+@pytest.mark.parametrize(
+    ("num_rows", "num_samples", "variants_chunk_size", "samples_chunk_size"),
+    [(25, 7, 10, 3), (30, 12, 30, 12), (5, 20, 2, 100)],
+)
+@pytest.mark.parametrize("ref_dir", [None, reference_dir])
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_zarr_store_matches_vcf(
+    tmp_path,
+    phased,
+    num_rows,
+    num_samples,
+    variants_chunk_size,
+    samples_chunk_size,
+    ref_dir,
+    genotype_model,
+):
+    store_path = tmp_path / "test.zarr"
+    vcf_args = dict(
+        genotype_model=genotype_model,
+        # The test reference only fits the positions of a few rows
+        num_rows=num_rows if ref_dir is None else min(num_rows, 8),
+        num_samples=num_samples,
+        chromosome="chr1",
+        random_seed=11,
+        sample_prefix="S",
+        phased=phased,
+        reference_dir=ref_dir,
+    )
+    write_store(
+        store_path,
+        vcf_args,
+        variants_chunk_size=variants_chunk_size,
+        samples_chunk_size=samples_chunk_size,
+    )
+
+    rows = vcf_rows(vcf_args, variants_chunk_size)
+    separator = "|" if phased else "/"
+    assert read_zarr_array(store_path, "variant_position").tolist() == [
+        int(row[1]) for row in rows
+    ]
+    assert read_zarr_array(store_path, "variant_id").tolist() == [
+        row[2] for row in rows
+    ]
+    assert read_zarr_array(store_path, "variant_allele").tolist() == [
+        [row[3], row[4]] for row in rows
+    ]
+    assert read_zarr_array(store_path, "variant_quality").tolist() == [
+        float(row[5]) for row in rows
+    ]
+    assert [
+        [separator.join(str(a) for a in genotype) for genotype in row]
+        for row in read_zarr_array(store_path, "call_genotype").tolist()
+    ] == [[sample.split(":")[0] for sample in row[9:]] for row in rows]
+    assert read_zarr_array(store_path, "call_genotype_phased").all() == phased
+    assert not read_zarr_array(store_path, "call_genotype_mask").any()
+    assert read_zarr_array(store_path, "variant_filter").all()
+    assert len(rows) == vcf_args["num_rows"]
+    assert read_zarr_array(store_path, "sample_id").tolist() == [
+        f"S{i:07d}" for i in range(1, num_samples + 1)
+    ]
+    assert read_zarr_array(store_path, "contig_id").tolist() == ["chr1"]
+    assert not read_zarr_array(store_path, "variant_contig").any()
+    assert not (store_path / "variant_contig" / "0").exists()
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("phased", [True, False])
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+def test_zarr_store_multiallelic_indels(tmp_path, phased, genotype_model):
+    store_path = tmp_path / "test.zarr"
+    vcf_args = dict(
+        genotype_model=genotype_model,
+        num_rows=25,
+        num_samples=7,
+        chromosome="chr1",
+        random_seed=11,
+        phased=phased,
+        multiallelic_rate=0.4,
+        insertion_rate=0.2,
+        deletion_rate=0.2,
+    )
+    write_store(store_path, vcf_args, variants_chunk_size=10, samples_chunk_size=3)
+
+    rows = vcf_rows(vcf_args, 10)
+    separator = "|" if phased else "/"
+    # Sites with fewer alleles are padded with empty alleles
+    assert read_zarr_array(store_path, "variant_allele").tolist() == [
+        ([row[3]] + row[4].split(",") + ["", ""])[:4] for row in rows
+    ]
+    assert {len(row[4].split(",")) for row in rows} == {1, 2, 3}
+    assert [
+        [separator.join(str(a) for a in genotype) for genotype in row]
+        for row in read_zarr_array(store_path, "call_genotype").tolist()
+    ] == [[sample.split(":")[0] for sample in row[9:]] for row in rows]
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("workers", [1, 2])
+def test_zarr_store_contigs(tmp_path, workers):
+    store_path = tmp_path / "test.zarr"
+    contigs = {"chr2": 1314, "chr1": 1066, "chr10": 888}
+    vcf_args = dict(
+        num_rows=30,
+        num_samples=4,
+        chromosome="chr2",
+        contigs=contigs,
+        random_seed=3,
+        reference_dir=reference_dir,
+    )
+    write_store(
+        store_path,
+        vcf_args,
+        workers=workers,
+        variants_chunk_size=7,
+        samples_chunk_size=3,
+    )
+
+    rows = vcf_rows(vcf_args, 7)
+    contig_ids = read_zarr_array(store_path, "contig_id").tolist()
+    assert contig_ids == ["chr2", "chr1", "chr10"]
+    assert read_zarr_array(store_path, "contig_length").tolist() == [1314, 1066, 888]
+    variant_contigs = read_zarr_array(store_path, "variant_contig").tolist()
+    assert [contig_ids[contig] for contig in variant_contigs] == [
+        row[0] for row in rows
+    ]
+    assert [contig_ids[contig] for contig in variant_contigs] == ["chr2"] * 12 + [
+        "chr1"
+    ] * 10 + ["chr10"] * 8
+    assert read_zarr_array(store_path, "variant_position").tolist() == [
+        int(row[1]) for row in rows
+    ]
+    assert read_zarr_array(store_path, "variant_allele")[:, 0].tolist() == [
+        row[3] for row in rows
+    ]
+
+
+@pytest.mark.generate_vcf
+def test_zarr_store_same_for_any_workers(tmp_path):
+    vcf_args = dict(num_rows=100, num_samples=9, chromosome="chr1", random_seed=4)
+    chunk_sizes = dict(variants_chunk_size=20, samples_chunk_size=4)
+    write_store(tmp_path / "one.zarr", vcf_args, workers=1, **chunk_sizes)
+    write_store(tmp_path / "three.zarr", vcf_args, workers=3, **chunk_sizes)
+
+    one_files = sorted(
+        p.relative_to(tmp_path / "one.zarr") for p in (tmp_path / "one.zarr").rglob("*")
+    )
+    three_files = sorted(
+        p.relative_to(tmp_path / "three.zarr")
+        for p in (tmp_path / "three.zarr").rglob("*")
+    )
+    assert one_files == three_files
+    for file_path in one_files:
+        if (tmp_path / "one.zarr" / file_path).is_file():
+            assert (tmp_path / "one.zarr" / file_path).read_bytes() == (
+                tmp_path / "three.zarr" / file_path
+            ).read_bytes()
+
+
+@pytest.mark.generate_vcf
+@pytest.mark.parametrize("genotype_model", ["rotation", "af"])
+@pytest.mark.parametrize("samples_chunk_size", [1, 2, 5])
+def test_zarr_store_same_for_any_samples_chunk_size(
+    tmp_path, genotype_model, samples_chunk_size
+):
+    # Few samples, so some sites get their alt allele from their lowest draw
+    vcf_args = dict(
+        num_rows=60,
+        num_samples=5,
+        chromosome="chr1",
+        contigs={"chr1": 1066, "chr2": 1314},
+        random_seed=6,
+        genotype_model=genotype_model,
+        multiallelic_rate=0.3,
+    )
+    write_store(
+        tmp_path / "whole.zarr",
+        vcf_args,
+        variants_chunk_size=25,
+        samples_chunk_size=5,
+    )
+    write_store(
+        tmp_path / "chunked.zarr",
+        vcf_args,
+        variants_chunk_size=25,
+        samples_chunk_size=samples_chunk_size,
+    )
+
+    for name in ["variant_position", "variant_allele", "call_genotype_phased"]:
+        assert np.array_equal(
+            read_zarr_array(tmp_path / "whole.zarr", name),
+            read_zarr_array(tmp_path / "chunked.zarr", name),
+        )
+    genotypes = read_zarr_array(tmp_path / "chunked.zarr", "call_genotype")
+    assert np.array_equal(
+        read_zarr_array(tmp_path / "whole.zarr", "call_genotype"), genotypes
+    )
+    if genotype_model == "af":
+        assert (genotypes > 1).any()
+
+
+@pytest.mark.generate_vcf
+def test_zarr_store_chunk_size_error(tmp_path):
+    with pytest.raises(ValueError):
+        to_zarr_store(
+            dict(num_rows=10, num_samples=2, chromosome="chr1"),
+            tmp_path / "test.zarr",
+            variants_chunk_size=0,
+        )
+
+
+@pytest.mark.generate_vcf
+def test_zarr_store_max_position_error(tmp_path):
+    # Positions go past the int32 variant_position at about 21.5M rows
+    with pytest.raises(ValueError, match="too large for a VCF Zarr store"):
+        to_zarr_store(
+            dict(num_rows=30_000_000, num_samples=2, chromosome="chr1"),
+            tmp_path / "test.zarr",
+        )
+    assert not (tmp_path / "test.zarr").exists()
+
+
+@pytest.mark.generate_vcf
+def test_zarr_store_read_with_zarr(tmp_path):
+    zarr = pytest.importorskip("zarr")
+    store_path = tmp_path / "test.zarr"
+    vcf_args = dict(num_rows=50, num_samples=15, chromosome="chr2", random_seed=8)
+    write_store(store_path, vcf_args, variants_chunk_size=16, samples_chunk_size=6)
+
+    root = zarr.open_consolidated(store_path, mode="r", zarr_format=2)
+    assert root.attrs["vcf_zarr_version"] == "0.2"
+    assert root.attrs["vcf_header"].splitlines()[-1].startswith("#CHROM")
+    for name in [
+        "variant_position",
+        "variant_allele",
+        "call_genotype",
+        "call_genotype_phased",
+        "call_genotype_mask",
+        "variant_contig",
+        "sample_id",
+    ]:
+        assert root[name].attrs["_ARRAY_DIMENSIONS"][0] in ["variants", "samples"]
+        np.testing.assert_array_equal(
+            root[name][...], read_zarr_array(store_path, name)
+        )
+    assert root["call_genotype"].shape == (50, 15, 2)
+    assert root["call_genotype"].chunks == (16, 6, 2)